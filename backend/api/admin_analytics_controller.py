@@ -1,10 +1,14 @@
+import uuid
 from datetime import datetime
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from utils.db import get_db
 from api.auth_controller import require_admin
 from services import admin_analytics_service as svc
+from services import latency_service
+from core import sql_metrics
 
 router = APIRouter(prefix="/admin", tags=["admin-analytics"])
 
@@ -23,3 +27,61 @@ def ts_latency(days: int = 30, db: Session = Depends(get_db), _ = Depends(requir
 @router.get("/timeseries/tokens_cost")
 def ts_tokens_cost(days: int = 30, db: Session = Depends(get_db), _ = Depends(require_admin)):
     return svc.ts_tokens_cost(db, days)
+
+# ---- Request latency sketches (per route / per user, any range) ----
+
+@router.get("/latency/requests")
+def latency_summary(
+    route: Optional[str] = None,
+    user_id: Optional[uuid.UUID] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    hours: int = 24,
+    db: Session = Depends(get_db),
+    _ = Depends(require_admin),
+):
+    try:
+        return latency_service.summary(db, route=route, user_id=user_id, start=start, end=end, hours=hours)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/latency/routes")
+def latency_by_route(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    hours: int = 24,
+    db: Session = Depends(get_db),
+    _ = Depends(require_admin),
+):
+    try:
+        return latency_service.by_route(db, start=start, end=end, hours=hours)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/latency/series")
+def latency_series(
+    route: Optional[str] = None,
+    user_id: Optional[uuid.UUID] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    hours: int = 24,
+    step_minutes: int = Query(60, ge=1, le=7 * 24 * 60),
+    db: Session = Depends(get_db),
+    _ = Depends(require_admin),
+):
+    try:
+        return latency_service.series(db, route=route, user_id=user_id, start=start, end=end,
+                                      hours=hours, step_minutes=step_minutes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ---- SQL per route (this worker, since startup or the last reset) ----
+@router.get("/sql/routes")
+def sql_routes(_ = Depends(require_admin)):
+    """Statements and DB time per request for each route, most queries per request first."""
+    return {"enabled": sql_metrics.SQL_METRICS, "routes": sql_metrics.route_stats()}
+
+@router.delete("/sql/routes")
+def sql_routes_reset(_ = Depends(require_admin)):
+    sql_metrics.reset()
+    return {"ok": True}
@@ -1,12 +1,14 @@
-from typing import List, Dict, Optional, Any
+import json
+from typing import List, Dict, Optional, Any, Literal
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from utils.db import get_db
 from api.auth_controller import require_admin
-from services import admin_service
+from services import admin_service, user_import_service
 from schemas.auth import UserOut  # only for type hints if needed
 from pydantic import BaseModel, Field, EmailStr
 
@@ -45,6 +47,32 @@ class UserUpdate(BaseModel):
 def update_user(user_id: str, payload: UserUpdate, db: Session = Depends(get_db)):
     return admin_service.update_user(db, user_id, payload)
 
+@router.post("/users/import", dependencies=[Depends(require_admin)])
+async def import_users(
+    file: UploadFile = File(...),
+    format: Optional[Literal["csv", "jsonl"]] = None,
+    default_roles: Optional[str] = None,
+    create_roles: bool = False,
+    dry_run: bool = False,
+):
+    """
+    Bulk-create users from CSV or JSONL (username, email, password, roles, is_active).
+    Streams NDJSON: an "error" line per rejected row, "progress" per batch, then "done".
+    """
+    name = (file.filename or "").lower()
+    fmt = format or ("jsonl" if name.endswith((".jsonl", ".ndjson", ".json")) else "csv")
+    data = await file.read()
+    try:
+        # parsing/validating up to USER_IMPORT_MAX_ROWS records is CPU work: keep it off the loop
+        events = await run_in_threadpool(
+            user_import_service.run, data, fmt,
+            default_roles=[r.strip() for r in (default_roles or "").split(",") if r.strip()],
+            create_roles=create_roles, dry_run=dry_run,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse((json.dumps(ev, default=str) + "\n" for ev in events), media_type="application/x-ndjson")
+
 # -------- Chat console --------
 class ChatRow(BaseModel):
     id: str
@@ -67,8 +95,18 @@ class AdminMsgRow(BaseModel):
 
 @router.get("/chats/{chat_id}/messages", response_model=List[AdminMsgRow],
             dependencies=[Depends(require_admin)])
-def chat_messages(chat_id: str, db: Session = Depends(get_db), limit: int = 500):
-    return admin_service.chat_messages(db, chat_id, limit)
+def chat_messages(
+    chat_id: str,
+    response: Response,
+    db: Session = Depends(get_db),
+    limit: int = Query(500, ge=1, le=2000),
+    before: Optional[str] = None,
+):
+    # newest `limit` messages, oldest first; older pages via X-Next-Cursor -> ?before=
+    page = admin_service.chat_messages(db, chat_id, limit, before)
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return page["items"]
 
 @router.post("/chats/{chat_id}/reply", dependencies=[Depends(require_admin)])
 def admin_reply(chat_id: str, payload: AdminMessage, db: Session = Depends(get_db)):
@@ -92,8 +130,9 @@ class ActivityOut(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
 
 class PagedActivities(BaseModel):
-    total: int
+    total: Optional[int] = None          # None when total=none
     items: List[ActivityOut]
+    next_cursor: Optional[str] = None    # pass back as ?cursor= for the next page
 
 @router.get("/logs", response_model=PagedActivities, dependencies=[Depends(require_admin)])
 def list_logs(
@@ -105,8 +144,10 @@ def list_logs(
     user_id: Optional[str] = None,
     date_from: Optional[datetime] = None,
     date_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    total: Literal["exact", "estimate", "none"] = "exact",
 ):
-    return admin_service.list_logs(db, limit, offset, q, level, user_id, date_from, date_to)
+    return admin_service.list_logs(db, limit, offset, q, level, user_id, date_from, date_to, cursor, total)
 
 @router.get("/logs/export", dependencies=[Depends(require_admin)])
 def export_logs_csv(
@@ -116,10 +157,11 @@ def export_logs_csv(
     user_id: Optional[str] = None,
     date_from: Optional[datetime] = None,
     date_to: Optional[datetime] = None,
+    format: Literal["csv", "parquet", "arrow"] = "csv",
+    gzip: bool = False,
 ):
-    gen = admin_service.export_logs_csv(db, q, level, user_id, date_from, date_to)
-    return StreamingResponse(gen, media_type="text/csv",
-                             headers={"Content-Disposition": "attachment; filename=logs.csv"})
+    gen, media_type, headers = admin_service.export_logs(db, q, level, user_id, date_from, date_to, format, gzip)
+    return StreamingResponse(gen, media_type=media_type, headers=headers)
 
 class BulkDelete(BaseModel):
     ids: List[int]
@@ -172,3 +214,21 @@ def get_agent_policies_admin(db: Session = Depends(get_db)) -> Dict[str, Any]:
 @router.put("/agent-policies", dependencies=[Depends(require_admin)])
 def put_agent_policies_admin(payload: AgentPolicies, db: Session = Depends(get_db)) -> Dict[str, Any]:
     return admin_service.put_agent_policies(db, payload.model_dump())
+
+# -------- Retrieval scopes (role -> tags/sources the role may search) --------
+class RetrievalScope(BaseModel):
+    tags: Optional[List[str]] = None
+    sources: Optional[List[str]] = None
+
+@router.get("/retrieval-scopes", dependencies=[Depends(require_admin)])
+def get_retrieval_scopes(db: Session = Depends(get_db)) -> Dict[str, Any]:
+    return admin_service.get_retrieval_scopes(db)
+
+@router.put("/retrieval-scopes", dependencies=[Depends(require_admin)])
+def put_retrieval_scopes(payload: Dict[str, RetrievalScope], db: Session = Depends(get_db)) -> Dict[str, Any]:
+    """
+    Replace the role -> scope map. Mapped roles always restrict: a user searches the union
+    of their mapped roles' scopes, whatever other roles they have. Users with no mapped
+    role, and admins, search everything.
+    """
+    return admin_service.put_retrieval_scopes(db, {k: v.model_dump(exclude_none=True) for k, v in payload.items()})
@@ -3,12 +3,12 @@ import uuid
 from typing import List
 
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt, JWTError
 
-from utils.db import get_db
-from utils.models import User
+from utils.db import get_db, get_async_db
 from schemas.auth import (
     UserCreate, UserOut, Token,
     RequestReset, VerifyCodeBody, ResetPasswordBody
@@ -44,7 +44,7 @@ def login_for_access_token(
 
 # ---- Token -> Current user dependency and admin guard ----
 
-def _fetch_user_from_token(db: Session, token: str) -> User:
+def _user_id_from_token(token: str) -> uuid.UUID:
     cred_exc = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -55,19 +55,23 @@ def _fetch_user_from_token(db: Session, token: str) -> User:
         sub = payload.get("sub")
         if not sub:
             raise cred_exc
-        user_id = uuid.UUID(sub)
-    except JWTError:
+        return uuid.UUID(sub)
+    except (JWTError, ValueError):
         raise cred_exc
-    user = db.get(User, user_id)
-    if not user:
-        raise cred_exc
-    return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserOut:
-    user = _fetch_user_from_token(db, token)
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> UserOut:
+    # runs on every authenticated request: async session, so the lookup never holds a threadpool thread
+    user = await auth_service.users_repo.get_by_id_async(db, _user_id_from_token(token))
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     if not user.is_active:
         raise HTTPException(status_code=401, detail="Inactive user")
-    roles = auth_service.users_repo.get_user_roles(db, user.id)  # type: ignore
+    request.state.user_id = user.id  # per-user latency (core/latency.py)
+    roles = await auth_service.users_repo.get_user_roles_async(db, user.id)
     return UserOut(
         id=user.id, username=user.username, email=user.email,
         is_active=user.is_active, roles=roles, is_admin=("admin" in roles)
@@ -1,14 +1,19 @@
+import time
+from datetime import datetime, timezone
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 
-from utils.db import get_db
+from utils.db import get_db, get_async_db
 from api.auth_controller import get_current_user, require_admin
 from schemas.auth import UserOut
 from repositories import chat_repository as repo
 from services import chat_service as svc
+from services import chat_writer
 
 router = APIRouter()
 __all__ = ["router", "init_rag_chain"]
@@ -28,6 +33,9 @@ class MessageOut(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     chat_id: Optional[str] = None
+    # optional retrieval scope; narrows whatever the user's roles already allow
+    tags: Optional[List[str]] = None
+    sources: Optional[List[str]] = None
 
 class NewChatIn(BaseModel):
     title: Optional[str] = "New chat"
@@ -51,33 +59,68 @@ def rename_chat(payload: RenameChatIn, user: UserOut = Depends(get_current_user)
     return {"id": str(c.id), "title": c.title}
 
 @router.get("/chats")
-def list_chats(user: UserOut = Depends(get_current_user), db: Session = Depends(get_db)):
-    rows = repo.list_user_chats(db, user.id)
-    return [{"id": str(c.id), "title": c.title, "created_at": c.created_at} for c in rows]
+async def list_chats(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    user: UserOut = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Newest first, with a last-message preview. More pages: pass X-Next-Cursor back as ?before=."""
+    try:
+        page = await repo.list_user_chats_async(db, user.id, limit, before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return [
+        {
+            "id": str(c.id), "title": c.title, "created_at": c.created_at,
+            "last_message": {"role": sender, "text": preview, "created_at": last_at} if last_at else None,
+        }
+        for c, sender, preview, last_at in page["items"]
+    ]
 
 @router.get("/chat/{chat_id}")
-def get_chat_history(chat_id: str, user: UserOut = Depends(get_current_user), db: Session = Depends(get_db)) -> List[MessageOut]:
-    c = repo.get_chat(db, chat_id)
+async def get_chat_history(
+    chat_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    before: Optional[str] = None,
+    user: UserOut = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+) -> List[MessageOut]:
+    """The latest `limit` messages, oldest first. Older ones: pass X-Next-Cursor back as ?before=."""
+    c = await repo.get_chat_async(db, chat_id)
     if not c or c.user_id != user.id:
         raise HTTPException(status_code=404, detail="Chat not found")
-    msgs = repo.list_messages(db, chat_id)
-    out: List[MessageOut] = []
-    for m in msgs:
-        role = getattr(m, "role", None) or getattr(m, "sender", "assistant")
-        out.append(MessageOut(role=role, content=[MessageContent(text=m.content)]))
-    return out
+    try:
+        page = await repo.list_messages_async(db, c.id, limit, before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return [
+        {"role": getattr(m, "role", None) or getattr(m, "sender", "assistant"), "content": [{"text": m.content}]}
+        for m in page["items"]
+    ]
 
 @router.post("/chat/stream")
 async def stream_chat(req: ChatRequest, user: UserOut = Depends(get_current_user), db: Session = Depends(get_db)):
-    chat_id = svc.ensure_chat_for_user(db, user.id, req.message, req.chat_id)
-
-    # save user message
-    repo.insert_message(db, chat_id, "user", req.message)
-
-    answer = svc.run_graph_once(db, user.id, req.message)
-
-    # save assistant message
-    repo.insert_message(db, chat_id, "assistant", answer)
+    # chat (if new) + user message: one commit. Both calls block (sync session, LLM),
+    # so they run in the threadpool instead of stalling the event loop.
+    chat_id = await run_in_threadpool(svc.start_turn, db, user.id, req.message, req.chat_id)
+
+    t0 = time.perf_counter()
+    answer = await run_in_threadpool(
+        svc.run_graph_once, db, user.id, req.message, roles=user.roles, tags=req.tags, sources=req.sources
+    )
+    answered_at = datetime.now(timezone.utc)
+    metrics = {"latency_ms": round((time.perf_counter() - t0) * 1000), "chars": len(answer)}
+
+    # assistant message: write-behind, batched with other turns. Handed over now, not when
+    # the body is sent, so it is kept even if the client leaves before reading the response.
+    chat_writer.submit(chat_id, answer, answered_at, metrics)
 
     async def gen():
         CHUNK = 512
@@ -1,8 +1,8 @@
 import os
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pathlib import Path
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, Response
 from sqlalchemy.orm import Session
 
 from utils.db import get_db
@@ -17,10 +17,11 @@ async def upload_docs(
     files: List[UploadFile] = File(...),
     source: Optional[str] = Form(None),
     tags: Optional[str] = Form(None),
+    chunk_profile: Optional[str] = Form(None),
     db: Session = Depends(get_db),
     user=Depends(get_current_user),
 ):
-    return await svc.upload_docs(db, files, source, tags, user)
+    return await svc.upload_docs(db, files, source, tags, user, chunk_profile)
 
 @router.get("/", response_model=DocumentList)
 def list_docs(
@@ -28,19 +29,42 @@ def list_docs(
     tag: Optional[str] = None,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
+    total: Literal["exact", "estimate", "none"] = "exact",
     db: Session = Depends(get_db),
 ):
-    return svc.list_docs(db, q, tag, skip, limit)
+    return svc.list_docs(db, q, tag, skip, limit, cursor, total)
 
 @router.delete("/{doc_id}")
 def delete_doc(doc_id: str, db: Session = Depends(get_db)):
     return svc.delete_doc(db, doc_id)
 
+@router.post("/reindex-all", status_code=202)
+def reindex_all(concurrency: Optional[int] = None, chunk_profile: Optional[str] = None, db: Session = Depends(get_db)):
+    # runs in the background; poll GET /docs/reindex-all/{run_id}
+    return svc.reindex_all(db, concurrency, chunk_profile)
+
+@router.get("/reindex-all/{run_id}")
+def reindex_status(run_id: str, db: Session = Depends(get_db)):
+    return svc.reindex_status(db, run_id)
+
 @router.post("/reindex/{doc_id}")
-def reindex_doc(doc_id: str, db: Session = Depends(get_db)):
-    return svc.reindex_doc(db, doc_id)
+def reindex_doc(doc_id: str, chunk_profile: Optional[str] = None, db: Session = Depends(get_db)):
+    return svc.reindex_doc(db, doc_id, chunk_profile)
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
 
 @router.get("/download/{doc_id}")
-def download_doc(doc_id: str, db: Session = Depends(get_db)):
-    path, filename = svc.download_path(db, doc_id)
-    return FileResponse(path=path, filename=filename)
+def download_doc(doc_id: str, request: Request, db: Session = Depends(get_db)):
+    path, filename, content_hash = svc.download_path(db, doc_id)
+    # Bytes are content-addressed, so the sha256 is a strong validator
+    etag = f'"{content_hash}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    # FileResponse answers Range / If-Range itself (206 / 416)
+    return FileResponse(path=path, filename=filename, headers=headers)
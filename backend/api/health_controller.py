@@ -0,0 +1,46 @@
+# api/health_controller.py
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from core import request_log, warmup
+from services import chat_writer
+from utils.db import pool_stats
+
+router = APIRouter(tags=["health"])
+
+@router.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving HTTP. Never touches dependencies."""
+    return {"status": "ok"}
+
+def _check_postgres() -> None:
+    from sqlalchemy import text
+    from utils.db import SessionLocal
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+    finally:
+        db.close()
+
+def _check_qdrant() -> None:
+    from utils.langchain_store import active_collection, get_client
+    get_client().get_collection(active_collection())
+
+@router.get("/readyz")
+def readyz():
+    """Readiness: warm-up finished and Postgres/Qdrant answer right now."""
+    checks = {"warmup": {"ok": warmup.warmed()}}
+    for name, fn in (("postgres", _check_postgres), ("qdrant", _check_qdrant)):
+        try:
+            fn()
+            checks[name] = {"ok": True}
+        except Exception as e:
+            checks[name] = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    ready = all(c["ok"] for c in checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready, "checks": checks, "warmup": warmup.status(),
+            "request_log": request_log.stats(), "chat_writer": chat_writer.stats(), "db_pools": pool_stats(),
+        },
+    )
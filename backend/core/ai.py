@@ -1,77 +1,54 @@
 import os
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance
+import threading
+from typing import Any, List, Optional
 
-try:
-    from langchain_qdrant import QdrantVectorStore
-except Exception:
-    from langchain_community.vectorstores import Qdrant as QdrantVectorStore
-
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_groq import ChatGroq
+# One embedding model and one Qdrant client per process, shared with ingestion.
+# Nothing is loaded or contacted at import (langchain/torch/groq included);
+# core.warmup does it in the background at startup.
+from utils.langchain_store import active_index, get_client, get_embeddings, search_params
 
 # ---- Config
 DATA_DIR = os.getenv("DATA_DIR", "data")
-QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
-QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "my_text_files_collection")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "meta-llama/llama-4-maverick-17b-128e-instruct")
-HF_TOKEN = os.getenv("HUGGINGFACE_HUB_TOKEN")
-EMBED_MODEL = os.getenv("EMBEDDINGS_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
-
-def _load_embeddings():
-    if HF_TOKEN:
-        os.environ["HUGGINGFACE_HUB_TOKEN"] = HF_TOKEN
-    # same fallback behavior as your original
-    try:
-        return HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-    except Exception:
-        for alt in [
-            "sentence-transformers/all-MiniLM-L6-v2",
-            "intfloat/e5-small-v2",
-            "BAAI/bge-small-en-v1.5",
-            "thenlper/gte-small",
-        ]:
-            try: return HuggingFaceEmbeddings(model_name=alt)
-            except Exception: continue
-        raise
-
-embeddings = _load_embeddings()
-
-qdrant_key = os.getenv("QDRANT_API_KEY")
-client = QdrantClient(url=QDRANT_URL, api_key=qdrant_key)
-
-def ensure_qdrant_collection_exists():
-    try:
-        names = {c.name for c in client.get_collections().collections}
-    except Exception:
-        names = set()
-    if QDRANT_COLLECTION_NAME in names:
-        return
-    try:
-        dim = len(embeddings.embed_query("dim-probe"))
-    except Exception:
-        dim = len(embeddings.embed_documents(["dim-probe"])[0])
-    client.recreate_collection(
-        collection_name=QDRANT_COLLECTION_NAME,
-        vectors_config=VectorParams(size=dim, distance=Distance.COSINE)
+RETRIEVE_K = int(os.getenv("RETRIEVE_K", "3"))
+
+
+def retrieve(question: str, qfilter=None, k: int = RETRIEVE_K) -> List[Any]:
+    """
+    Similarity search on the active index, with an optional Qdrant payload filter pushed
+    into the ANN search. Chunks are stored by utils.langchain_store as a flat payload
+    with the chunk in "text"; everything else becomes Document metadata.
+    """
+    from langchain_core.documents import Document
+
+    collection, model = active_index()
+    res = get_client().query_points(
+        collection_name=collection,
+        query=get_embeddings(model).embed_query(question),
+        query_filter=qfilter,
+        limit=k,
+        search_params=search_params(),
+        with_payload=True,
     )
-ensure_qdrant_collection_exists()
-
-def make_vectorstore():
-    for kwargs in [
-        dict(client=client, collection_name=QDRANT_COLLECTION_NAME, embedding=embeddings),
-        dict(client=client, collection_name=QDRANT_COLLECTION_NAME, embeddings=embeddings),
-        dict(qdrant_client=client, collection_name=QDRANT_COLLECTION_NAME, embedding=embeddings),
-        dict(qdrant_client=client, collection_name=QDRANT_COLLECTION_NAME, embeddings=embeddings),
-    ]:
-        try: return QdrantVectorStore(**kwargs)
-        except TypeError: continue
-    raise RuntimeError("Failed to initialize QdrantVectorStore")
-
-vectorstore = make_vectorstore()
-retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-
-groq_key = os.getenv("GROQ_API_KEY")
-if not groq_key:
-    raise RuntimeError("Missing GROQ_API_KEY")
-llm = ChatGroq(api_key=groq_key, model_name=GROQ_MODEL, temperature=0.2)
+    docs = []
+    for p in res.points:
+        payload = dict(p.payload or {})
+        text = payload.pop("text", None) or payload.pop("page_content", "") or ""
+        docs.append(Document(page_content=text, metadata={**payload, "score": p.score}))
+    return docs
+
+_llm: Optional[Any] = None
+_llm_lock = threading.Lock()
+
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                groq_key = os.getenv("GROQ_API_KEY")
+                if not groq_key:
+                    raise RuntimeError("Missing GROQ_API_KEY")
+                from langchain_groq import ChatGroq
+                _llm = ChatGroq(api_key=groq_key, model_name=GROQ_MODEL, temperature=0.2)
+    return _llm
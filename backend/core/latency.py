@@ -0,0 +1,183 @@
+# core/latency.py
+"""
+Per-route request latency, recorded in-process and flushed as sketches.
+
+LatencyMiddleware times every HTTP request until its last body chunk is sent (so
+streamed chat answers count in full) and adds the duration to this worker's sketch
+for the current minute, keyed by route template ("GET /docs/{doc_id}") and by the
+authenticated user (get_current_user puts it on request.state). A daemon thread
+writes closed minutes to latency_buckets every LATENCY_FLUSH_SECONDS and compacts
+old minutes into hours about once an hour. Recording is a lock, a dict lookup and
+a log(); nothing touches the database on the request path.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from utils.latency_sketch import LatencySketch
+
+log = logging.getLogger(__name__)
+
+# --------------------
+# Config
+# --------------------
+LATENCY_SKETCHES = os.getenv("LATENCY_SKETCHES", "1").lower() in {"1", "true", "yes"}
+LATENCY_FLUSH_SECONDS = int(os.getenv("LATENCY_FLUSH_SECONDS", "60"))
+LATENCY_EXCLUDE_PATHS = {
+    p.strip() for p in os.getenv("LATENCY_EXCLUDE_PATHS", "/healthz,/readyz").split(",") if p.strip()
+}
+COMPACT_EVERY_SECONDS = 3600
+
+UNMATCHED = "UNMATCHED"  # 404s etc.: never key on raw paths
+
+# (minute_start_epoch, route, user_id or None) -> [sketch, errors]
+_buf: Dict[Tuple[int, str, Optional[object]], list] = {}
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+
+
+def record(route: str, user_id, ms: float, error: bool = False, at: Optional[float] = None) -> None:
+    minute = int((at or time.time()) // 60) * 60
+    with _lock:
+        acc = _buf.get((minute, route, user_id))
+        if acc is None:
+            acc = _buf[(minute, route, user_id)] = [LatencySketch(), 0]
+        acc[0].add(ms)
+        if error:
+            acc[1] += 1
+
+
+def _take(closed_only: bool) -> Dict[Tuple[int, str, Optional[object]], list]:
+    global _buf
+    current = int(time.time() // 60) * 60
+    with _lock:
+        if not closed_only:
+            taken, _buf = _buf, {}
+            return taken
+        taken = {k: v for k, v in _buf.items() if k[0] < current}
+        for k in taken:
+            del _buf[k]
+    return taken
+
+
+def flush(closed_only: bool = True) -> int:
+    """Write buffered minutes (by default only finished ones) to the database."""
+    taken = _take(closed_only)
+    if not taken:
+        return 0
+    from utils.db import SessionLocal
+    from services import latency_service as svc
+
+    entries: Dict[tuple, Tuple[LatencySketch, int]] = {}
+
+    def add(key, sketch, errors):
+        cur = entries.get(key)
+        if cur is None:
+            entries[key] = (LatencySketch().merge(sketch), errors)
+        else:
+            entries[key] = (cur[0].merge(sketch), cur[1] + errors)
+
+    for (minute, route, user_id), (sketch, errors) in taken.items():
+        start = datetime.fromtimestamp(minute, timezone.utc)
+        add((svc.MINUTE, start, route, svc.ALL_USERS), sketch, errors)
+        add((svc.MINUTE, start, svc.ALL_ROUTES, svc.ALL_USERS), sketch, errors)
+        if user_id is not None:
+            add((svc.MINUTE, start, svc.ALL_ROUTES, user_id), sketch, errors)
+
+    db = SessionLocal()
+    try:
+        svc.merge_into(db, entries)
+        db.commit()
+    except Exception:
+        db.rollback()
+        # put them back so the next flush retries; a sketch merges, so nothing is lost
+        with _lock:
+            for key, (sketch, errors) in taken.items():
+                acc = _buf.setdefault(key, [LatencySketch(), 0])
+                acc[0].merge(sketch)
+                acc[1] += errors
+        raise
+    finally:
+        db.close()
+    return len(entries)
+
+
+def _compact() -> None:
+    from utils.db import SessionLocal
+    from services import latency_service as svc
+
+    db = SessionLocal()
+    try:
+        res = svc.compact(db)
+        if res.get("minute_rows"):
+            log.info("latency compaction: %s", res)
+    except Exception:
+        db.rollback()
+        log.exception("latency compaction failed")
+    finally:
+        db.close()
+
+
+def _loop() -> None:
+    next_compact = time.monotonic() + LATENCY_FLUSH_SECONDS
+    while True:
+        time.sleep(LATENCY_FLUSH_SECONDS)
+        try:
+            flush()
+        except Exception:
+            log.exception("latency flush failed")
+        if time.monotonic() >= next_compact:
+            _compact()
+            next_compact = time.monotonic() + COMPACT_EVERY_SECONDS
+
+
+def start_background() -> Optional[threading.Thread]:
+    global _thread
+    if not LATENCY_SKETCHES or LATENCY_FLUSH_SECONDS <= 0:
+        return None
+    if _thread is None or not _thread.is_alive():
+        _thread = threading.Thread(target=_loop, name="latency-flush", daemon=True)
+        _thread.start()
+    return _thread
+
+
+# --------------------
+# ASGI middleware
+# --------------------
+class LatencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not LATENCY_SKETCHES or scope.get("path") in LATENCY_EXCLUDE_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        t0 = time.perf_counter()
+        status = [500]
+        done = [False]
+
+        def finish():
+            if done[0]:
+                return
+            done[0] = True
+            route = scope.get("route")
+            path = getattr(route, "path_format", None) or getattr(route, "path", None)
+            user_id = (scope.get("state") or {}).get("user_id")
+            record(f"{scope['method']} {path}" if path else UNMATCHED, user_id,
+                   (time.perf_counter() - t0) * 1000.0, error=status[0] >= 500)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
@@ -0,0 +1,194 @@
+# core/request_log.py
+"""
+request_logs writer: buffered in memory, written in bulk off the request path.
+
+RequestLogMiddleware appends one tuple per request to a bounded ring buffer (a
+deque append, no I/O). A daemon thread drains it every REQUEST_LOG_FLUSH_MS, or
+as soon as REQUEST_LOG_BATCH rows are waiting, with one COPY per batch. If
+Postgres is slow or down the buffer fills and the oldest rows are overwritten:
+requests never wait on the log. A failed batch goes back into the buffer if it
+fits. stats() reports rows written, dropped (buffer full) and lost to failed flushes.
+"""
+import csv
+import io
+import os
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# --------------------
+# Config
+# --------------------
+REQUEST_LOG_ENABLED = os.getenv("REQUEST_LOG_ENABLED", "1").lower() in {"1", "true", "yes"}
+REQUEST_LOG_BUFFER = int(os.getenv("REQUEST_LOG_BUFFER", "50000"))       # rows held in memory, per worker
+REQUEST_LOG_BATCH = int(os.getenv("REQUEST_LOG_BATCH", "2000"))          # rows per COPY / early flush trigger
+REQUEST_LOG_FLUSH_MS = int(os.getenv("REQUEST_LOG_FLUSH_MS", "1000"))
+REQUEST_LOG_EXCLUDE_PATHS = {
+    p.strip() for p in os.getenv("REQUEST_LOG_EXCLUDE_PATHS", "/healthz,/readyz").split(",") if p.strip()
+}
+# Use the first X-Forwarded-For hop as the client IP (only behind a trusted proxy)
+REQUEST_LOG_TRUST_FORWARDED = os.getenv("REQUEST_LOG_TRUST_FORWARDED", "0").lower() in {"1", "true", "yes"}
+
+_COLUMNS = ("user_id", "method", "path", "status_code", "ip_address", "user_agent", "query_params",
+            "duration_ms", "created_at")
+_MAX_TEXT = 2048
+
+# (started_at_epoch, user_id, method, path, status, ip, user_agent, query, duration_ms)
+Row = Tuple[float, Any, str, str, int, Optional[str], Optional[str], Optional[str], float]
+
+_buf: Deque[Row] = deque(maxlen=max(REQUEST_LOG_BUFFER, 1))
+_wake = threading.Event()
+_flush_lock = threading.Lock()
+_stats: Dict[str, int] = {"recorded": 0, "written": 0, "dropped": 0, "failed": 0, "flushes": 0}
+_thread: Optional[threading.Thread] = None
+
+
+def record(row: Row) -> None:
+    # deque.append is atomic; at maxlen it silently evicts the oldest row, so count it
+    if len(_buf) >= _buf.maxlen:
+        _stats["dropped"] += 1
+    _buf.append(row)
+    _stats["recorded"] += 1
+    if len(_buf) >= REQUEST_LOG_BATCH:
+        _wake.set()
+
+
+def stats() -> Dict[str, int]:
+    return {**_stats, "buffered": len(_buf), "capacity": _buf.maxlen}
+
+
+def _drain(limit: int) -> List[Row]:
+    rows = []
+    try:
+        for _ in range(limit):
+            rows.append(_buf.popleft())
+    except IndexError:
+        pass
+    return rows
+
+
+def _copy(rows: List[Row]) -> None:
+    out = io.StringIO()
+    # None is written as an unquoted empty field, which COPY ... CSV reads as NULL
+    # (so are empty strings; none of the NOT NULL columns can be empty)
+    writer = csv.writer(out)
+    for ts, user_id, method, path, status, ip, ua, query, ms in rows:
+        writer.writerow([
+            str(user_id) if user_id else None, method, path, status, ip, ua, query, round(ms, 3),
+            datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+        ])
+    out.seek(0)
+
+    from utils.db import engine
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.copy_expert(f"COPY request_logs ({', '.join(_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", out)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def flush(max_rows: Optional[int] = None) -> int:
+    """Write buffered rows in REQUEST_LOG_BATCH-row COPYs; returns rows written."""
+    written = 0
+    with _flush_lock:
+        while _buf and (max_rows is None or written < max_rows):
+            rows = _drain(REQUEST_LOG_BATCH)
+            try:
+                _copy(rows)
+            except Exception:
+                # put back what fits (order is irrelevant, rows carry their timestamp)
+                space = max(_buf.maxlen - len(_buf), 0)
+                keep = rows[len(rows) - space:] if space else []
+                _buf.extendleft(keep)
+                _stats["failed"] += len(rows) - len(keep)
+                raise
+            written += len(rows)
+            _stats["written"] += len(rows)
+            _stats["flushes"] += 1
+    return written
+
+
+def _loop() -> None:
+    backoff = 0.0
+    while True:
+        _wake.wait(backoff or REQUEST_LOG_FLUSH_MS / 1000.0)
+        _wake.clear()
+        try:
+            # one buffer's worth at most, so a burst can't pin the thread
+            flush(max_rows=_buf.maxlen)
+            backoff = 0.0
+        except Exception:
+            backoff = min(max(backoff * 2, 1.0), 30.0)
+            log.exception("request log flush failed; retrying in %.0fs", backoff)
+
+
+def start_background() -> Optional[threading.Thread]:
+    global _thread
+    if not REQUEST_LOG_ENABLED:
+        return None
+    if _thread is None or not _thread.is_alive():
+        _thread = threading.Thread(target=_loop, name="request-log-flush", daemon=True)
+        _thread.start()
+    return _thread
+
+
+# --------------------
+# ASGI middleware
+# --------------------
+def _client_ip(scope) -> Optional[str]:
+    if REQUEST_LOG_TRUST_FORWARDED:
+        for k, v in scope.get("headers") or ():
+            if k == b"x-forwarded-for":
+                return v.decode("latin-1").split(",")[0].strip()[:64]
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+class RequestLogMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not REQUEST_LOG_ENABLED or scope.get("path") in REQUEST_LOG_EXCLUDE_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.time()
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            ua = None
+            for k, v in scope.get("headers") or ():
+                if k == b"user-agent":
+                    ua = v.decode("latin-1")[:_MAX_TEXT]
+                    break
+            query = scope.get("query_string") or b""
+            record((
+                started,
+                (scope.get("state") or {}).get("user_id"),
+                scope["method"],
+                scope.get("path", "")[:_MAX_TEXT],
+                status[0],
+                _client_ip(scope),
+                ua,
+                query.decode("latin-1")[:_MAX_TEXT] or None,
+                (time.perf_counter() - t0) * 1000.0,
+            ))
@@ -0,0 +1,213 @@
+# core/sql_metrics.py
+"""
+Per-request SQL instrumentation.
+
+install() hooks before/after_cursor_execute on every Engine (the sync engine and
+the async engine's sync_engine alike). While SqlMetricsMiddleware is handling a
+request, each statement adds to that request's count, total DB time and slowest
+statement, kept in a contextvar (starlette copies the context into threadpool
+threads, so sync routes count too). Statements outside a request (background
+writers, CLIs) are not recorded.
+
+A statement "shape" is its SQL with parameters and IN-lists collapsed. The same
+shape executed SQL_N_PLUS_ONE_THRESHOLD times in one request is logged once as a
+likely N+1. Per-route totals since startup (this worker) are served by
+GET /admin/sql/routes; with SQL_DEBUG_HEADERS the numbers are also sent back as
+X-DB-* and Server-Timing response headers.
+"""
+import os
+import re
+import time
+import logging
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+# --------------------
+# Config
+# --------------------
+SQL_METRICS = os.getenv("SQL_METRICS", "1").lower() in {"1", "true", "yes"}
+SQL_DEBUG_HEADERS = os.getenv("SQL_DEBUG_HEADERS", "0").lower() in {"1", "true", "yes"}
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))   # 0 = off
+SQL_METRICS_EXCLUDE_PATHS = {
+    p.strip() for p in os.getenv("SQL_METRICS_EXCLUDE_PATHS", "/healthz").split(",") if p.strip()
+}
+
+_MAX_SQL = 500          # chars of a statement kept for reports
+_MAX_SHAPES = 200       # N+1 shapes kept per worker
+
+_PARAM = re.compile(r"%\(\w+\)s|%s|\$\d+|\?")
+_LIST = re.compile(r"\?(\s*,\s*\?)+")
+_SPACE = re.compile(r"\s+")
+
+UNMATCHED = "UNMATCHED"
+
+
+def shape(statement: str) -> str:
+    s = _PARAM.sub("?", statement)
+    s = _LIST.sub("?", s)
+    return _SPACE.sub(" ", s).strip()
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_ms", "slowest_ms", "slowest_sql", "shapes", "flagged")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_sql: Optional[str] = None
+        self.shapes: Counter = Counter()
+        self.flagged: List[str] = []
+
+    def add(self, statement: str, ms: float) -> None:
+        self.queries += 1
+        self.db_ms += ms
+        s = shape(statement)
+        if ms > self.slowest_ms:
+            self.slowest_ms, self.slowest_sql = ms, s[:_MAX_SQL]
+        self.shapes[s] += 1
+        if SQL_N_PLUS_ONE_THRESHOLD and self.shapes[s] == SQL_N_PLUS_ONE_THRESHOLD:
+            self.flagged.append(s)
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("sql_request_stats", default=None)
+
+
+def current() -> Optional[RequestStats]:
+    return _current.get()
+
+
+# --------------------
+# SQLAlchemy hooks
+# --------------------
+_installed = False
+
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("_sql_t0", []).append(time.perf_counter())
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    starts = conn.info.get("_sql_t0")
+    if starts:
+        stats.add(statement, (time.perf_counter() - starts.pop()) * 1000.0)
+
+
+def install() -> None:
+    """Listen on all engines (idempotent)."""
+    global _installed
+    if _installed or not SQL_METRICS:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    event.listen(Engine, "before_cursor_execute", _before)
+    event.listen(Engine, "after_cursor_execute", _after)
+    _installed = True
+
+
+# --------------------
+# Per-route totals (this worker, since startup)
+# --------------------
+_lock = threading.Lock()
+_routes: Dict[str, Dict[str, Any]] = {}
+_n_plus_one: Dict[tuple, int] = {}   # (route, shape) -> requests where it was flagged
+
+
+def _record(route: str, stats: RequestStats) -> None:
+    with _lock:
+        acc = _routes.get(route)
+        if acc is None:
+            acc = _routes[route] = {"requests": 0, "queries": 0, "db_ms": 0.0, "max_queries": 0,
+                                    "slowest_ms": 0.0, "slowest_sql": None, "n_plus_one": 0}
+        acc["requests"] += 1
+        acc["queries"] += stats.queries
+        acc["db_ms"] += stats.db_ms
+        acc["max_queries"] = max(acc["max_queries"], stats.queries)
+        if stats.slowest_ms > acc["slowest_ms"]:
+            acc["slowest_ms"], acc["slowest_sql"] = stats.slowest_ms, stats.slowest_sql
+        if stats.flagged:
+            acc["n_plus_one"] += 1
+            for s in stats.flagged:
+                key = (route, s[:_MAX_SQL])
+                if key in _n_plus_one or len(_n_plus_one) < _MAX_SHAPES:
+                    _n_plus_one[key] = _n_plus_one.get(key, 0) + 1
+    for s in stats.flagged:
+        log.warning("possible N+1 on %s: %d executions of: %s", route, stats.shapes[s], s[:_MAX_SQL])
+
+
+def route_stats() -> List[Dict[str, Any]]:
+    """Per route: requests, queries per request (mean / max), DB ms per request, slowest statement."""
+    with _lock:
+        rows = [(r, dict(a)) for r, a in _routes.items()]
+        shapes = dict(_n_plus_one)
+    out = []
+    for route, a in rows:
+        n = a["requests"] or 1
+        out.append({
+            "route": route,
+            "requests": a["requests"],
+            "queries_per_request": round(a["queries"] / n, 2),
+            "max_queries": a["max_queries"],
+            "db_ms_per_request": round(a["db_ms"] / n, 3),
+            "slowest_ms": round(a["slowest_ms"], 3),
+            "slowest_sql": a["slowest_sql"],
+            "n_plus_one_requests": a["n_plus_one"],
+            "n_plus_one_shapes": sorted(
+                ({"sql": s, "requests": c} for (r, s), c in shapes.items() if r == route),
+                key=lambda d: -d["requests"],
+            ),
+        })
+    out.sort(key=lambda d: -d["queries_per_request"])
+    return out
+
+
+def reset() -> None:
+    with _lock:
+        _routes.clear()
+        _n_plus_one.clear()
+
+
+# --------------------
+# ASGI middleware
+# --------------------
+class SqlMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        install()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SQL_METRICS or scope.get("path") in SQL_METRICS_EXCLUDE_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+
+        async def send_wrapper(message):
+            if SQL_DEBUG_HEADERS and message["type"] == "http.response.start":
+                # what ran before the response started (a streamed body may query later)
+                headers = list(message.get("headers") or [])
+                headers += [
+                    (b"x-db-queries", str(stats.queries).encode()),
+                    (b"x-db-time-ms", f"{stats.db_ms:.1f}".encode()),
+                    (b"x-db-slowest-ms", f"{stats.slowest_ms:.1f}".encode()),
+                    (b"server-timing", f"db;dur={stats.db_ms:.1f};desc=\"{stats.queries} queries\"".encode()),
+                ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path_format", None) or getattr(route, "path", None)
+            _record(f"{scope['method']} {path}" if path else UNMATCHED, stats)
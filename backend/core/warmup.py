@@ -0,0 +1,91 @@
+# core/warmup.py
+"""
+Background warm-up: the process accepts connections immediately, while models,
+the LLM client, the chat graph and the Qdrant collection are initialised in a
+daemon thread. /readyz reports the outcome.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1").lower() in {"1", "true", "yes"}
+
+_state: Dict[str, Any] = {"started_at": None, "finished_at": None, "steps": {}}
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+
+
+def _qdrant():
+    from utils.langchain_store import ensure_collection
+    ensure_collection()
+
+
+def _embeddings():
+    from utils.langchain_store import get_embeddings
+    get_embeddings().embed_query("warm-up")
+
+
+def _tokenizer():
+    from utils import chunking
+    chunking.get_token_counter()(["warm-up"])
+
+
+def _llm():
+    from core.ai import get_llm
+    get_llm()
+
+
+def _graph():
+    from services.chat_service import get_graph
+    get_graph()
+
+
+STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("qdrant", _qdrant),
+    ("embeddings", _embeddings),
+    ("tokenizer", _tokenizer),
+    ("llm", _llm),
+    ("graph", _graph),
+]
+
+
+def run() -> Dict[str, Any]:
+    """Run every step in order (a failed step does not stop the others); returns status()."""
+    with _lock:
+        _state.update(started_at=time.time(), finished_at=None, steps={})
+    for name, fn in STEPS:
+        t0 = time.perf_counter()
+        try:
+            fn()
+            result = {"ok": True}
+        except Exception as e:
+            result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        result["seconds"] = round(time.perf_counter() - t0, 3)
+        with _lock:
+            _state["steps"][name] = result
+    with _lock:
+        _state["finished_at"] = time.time()
+    return status()
+
+
+def start_background() -> Optional[threading.Thread]:
+    global _thread
+    if not WARMUP_ON_STARTUP:
+        return None
+    if _thread is None or not _thread.is_alive():
+        _thread = threading.Thread(target=run, name="warmup", daemon=True)
+        _thread.start()
+    return _thread
+
+
+def status() -> Dict[str, Any]:
+    with _lock:
+        return {**_state, "steps": {k: dict(v) for k, v in _state["steps"].items()}}
+
+
+def warmed() -> bool:
+    s = status()
+    if not WARMUP_ON_STARTUP:
+        return True
+    return s["finished_at"] is not None and all(v["ok"] for v in s["steps"].values())
@@ -0,0 +1,89 @@
+# gunicorn_conf.py
+"""
+Production server: gunicorn master with uvicorn workers.
+
+    gunicorn -c gunicorn_conf.py main:app
+
+The app and the embedding model are loaded once in the master (preload_app) and
+workers are forked from it, so the torch weights are shared copy-on-write instead
+of being loaded once per worker. Connections (Postgres pool, Qdrant client) are
+never carried across the fork.
+"""
+import gc
+import os
+
+# --------------------
+# Config
+# --------------------
+def _env_flag(key: str, default: str) -> bool:
+    return os.getenv(key, default).lower() in {"1", "true", "yes"}
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: affinity mask, capped by a cgroup v2 quota (containers)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+CPUS = available_cpus()
+# Embedding inference is CPU-bound: one worker per CPU, not the usual 2n+1
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or CPUS
+# torch intra-op threads per worker, so workers don't oversubscribe the CPUs
+TORCH_THREADS = int(os.getenv("TORCH_THREADS_PER_WORKER", "0")) or max(1, CPUS // workers)
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = _env_flag("GUNICORN_PRELOAD", "1")
+PRELOAD_EMBEDDINGS = preload_app and _env_flag("PRELOAD_EMBEDDINGS", "1")
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+# Recycled workers are re-forked from the master, so they still share the weights
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+accesslog = "-"
+
+
+# --------------------
+# Hooks
+# --------------------
+def on_starting(server):
+    if not PRELOAD_EMBEDDINGS:
+        return
+    from utils import langchain_store
+
+    # Construct only: running inference here would start torch's thread pool,
+    # which does not survive fork. Workers warm up after forking (core.warmup).
+    model = langchain_store.active_model()
+    langchain_store.get_embeddings(model)
+    langchain_store.reset_client(close=True)
+    from utils.db import engine
+    engine.dispose()
+    server.log.info("Preloaded embedding model %s for %d workers", model, workers)
+
+    # Keep the collector from touching (and so copying) the preloaded objects in workers
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from utils import langchain_store
+    from utils.db import engine
+
+    langchain_store.reset_client(close=False)
+    engine.dispose(close=False)
+    try:
+        import torch
+        torch.set_num_threads(TORCH_THREADS)
+    except ImportError:
+        pass
@@ -9,8 +9,12 @@ from api.admin_controller import router as admin_router
 from api.admin_analytics_controller import router as admin_analytics_router
 from api.docs_controller import router as docs_router
 from api.chat_controller import router as chat_router, init_rag_chain
+from api.health_controller import router as health_router
 
-from utils.langchain_store import ensure_collection
+from core import warmup
+from core.latency import LatencyMiddleware, start_background as start_latency_flush, flush as flush_latency
+from core import request_log
+from core.sql_metrics import SqlMetricsMiddleware
 #from chat import router as chat_router, init_rag_chain
 #from admin import router as admin_router
 #from docs import router as docs_router
@@ -28,18 +32,66 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],   # keyset pagination of list endpoints
 )
+# Per-request statement counts / DB time, N+1 warnings (GET /admin/sql/routes)
+app.add_middleware(SqlMetricsMiddleware)
+# Buffered, written to request_logs in bulk. Inside LatencyMiddleware: its duration_ms
+# covers CORS, SQL metrics and the app, up to the end of the (streamed) response
+app.add_middleware(request_log.RequestLogMiddleware)
+# Outermost, so the recorded time covers every other middleware and the full (streamed) response
+app.add_middleware(LatencyMiddleware)
 """
 @app.on_event("startup")
 async def startup_event():
     await init_rag_chain()
 """
+# Threads for sync (`def`) routes and run_in_threadpool; anyio's default is 40.
+# Each one can hold a sync DB connection, so keep it in line with DB_POOL_SIZE + DB_MAX_OVERFLOW.
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "0"))   # 0 = keep the default
+
 @app.on_event("startup")
 async def startup():
-    import asyncio
-    await asyncio.to_thread(ensure_collection) 
+    if THREADPOOL_SIZE > 0:
+        import anyio.to_thread
+        anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    # Don't block accepting connections on model loading / Qdrant; /readyz tracks it
+    warmup.start_background()
+    # Fold new messages into the admin analytics rollups (one writer across workers)
+    from services.analytics_rollup_service import start_scheduler
+    start_scheduler()
+    start_latency_flush()
+    # Monthly log partitions: create upcoming months, retire expired ones
+    from services import partition_service
+    partition_service.start_scheduler()
+    request_log.start_background()
+    from services import chat_writer
+    chat_writer.start_background()
+
+@app.on_event("shutdown")
+def shutdown():
+    # Write this worker's unflushed minutes, including the current one
+    try:
+        flush_latency(closed_only=False)
+    except Exception:
+        pass
+    try:
+        request_log.flush()
+    except Exception:
+        pass
+    from services import chat_writer
+    chat_writer.flush()
+    from services import user_import_service
+    user_import_service.shutdown()
+
+@app.on_event("shutdown")
+async def close_db_pools():
+    from utils.db import dispose_async_engine
+    await dispose_async_engine()
+
 # Routers
 #app.include_router(docs_router, prefix="/docs", tags=["docs"])  # /docs now serves your API
+app.include_router(health_router)
 app.include_router(auth_router)
 app.include_router(admin_router)
 app.include_router(admin_analytics_router)
@@ -0,0 +1,3 @@
+-- 001: blobs are shared by every documents row with the same content_hash;
+-- reference counting and dedupe look rows up by hash.
+CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash);
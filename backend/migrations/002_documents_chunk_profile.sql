@@ -0,0 +1,3 @@
+-- 002: chunking profile used for each document (utils/chunking.py).
+-- NULL marks rows chunked by the original 1200/200 character splitter.
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS chunk_profile VARCHAR(64);
@@ -0,0 +1,13 @@
+-- 003: indexed document search + keyset pagination on (uploaded_at, id).
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE documents ALTER COLUMN tags TYPE JSONB USING tags::jsonb;
+
+-- tags @> '["hr"]'
+CREATE INDEX IF NOT EXISTS ix_documents_tags_gin ON documents USING gin (tags jsonb_path_ops);
+-- filename ILIKE '%q%'
+CREATE INDEX IF NOT EXISTS ix_documents_filename_trgm ON documents USING gin (filename gin_trgm_ops);
+-- ORDER BY uploaded_at DESC, id DESC with (uploaded_at, id) < cursor
+CREATE INDEX IF NOT EXISTS ix_documents_uploaded_at_id ON documents (uploaded_at DESC, id DESC);
+
+ANALYZE documents;
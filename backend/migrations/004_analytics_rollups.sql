@@ -0,0 +1,26 @@
+-- 004: daily analytics rollups, maintained incrementally by services/analytics_rollup_service.py
+CREATE TABLE IF NOT EXISTS analytics_daily (
+    day         date PRIMARY KEY,
+    messages    integer NOT NULL DEFAULT 0,
+    users       integer NOT NULL DEFAULT 0,
+    tokens      double precision NOT NULL DEFAULT 0,
+    latency     jsonb,
+    updated_at  timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS analytics_daily_users (
+    day       date NOT NULL,
+    user_id   uuid NOT NULL,
+    messages  integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    name        varchar(64) PRIMARY KEY,
+    last_id     bigint NOT NULL DEFAULT 0,
+    updated_at  timestamptz NOT NULL DEFAULT now()
+);
+
+-- previous message of a chat (turn latency) and backfill by day
+CREATE INDEX IF NOT EXISTS ix_messages_chat_id_created_at ON messages (chat_id, created_at);
+CREATE INDEX IF NOT EXISTS ix_messages_created_at ON messages (created_at);
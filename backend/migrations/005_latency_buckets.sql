@@ -0,0 +1,13 @@
+-- 005: per-route / per-user request latency sketches, written by core/latency.py
+CREATE TABLE IF NOT EXISTS latency_buckets (
+    granularity   varchar(1) NOT NULL,             -- 'm' minute, 'h' hour (compacted)
+    bucket_start  timestamptz NOT NULL,
+    route         varchar(255) NOT NULL,           -- '*' = all routes
+    user_id       uuid NOT NULL,                   -- 00000000-0000-0000-0000-000000000000 = all users
+    count         integer NOT NULL DEFAULT 0,
+    errors        integer NOT NULL DEFAULT 0,
+    sketch        jsonb NOT NULL,
+    PRIMARY KEY (granularity, bucket_start, route, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_latency_buckets_route_user_start ON latency_buckets (route, user_id, bucket_start);
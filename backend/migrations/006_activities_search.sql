@@ -0,0 +1,15 @@
+-- 006: full-text log search + keyset pagination on activities.
+-- Adding the generated column rewrites the table: run in a maintenance window on large installs.
+ALTER TABLE activities ADD COLUMN IF NOT EXISTS level varchar(16);
+
+ALTER TABLE activities ADD COLUMN IF NOT EXISTS search tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple', activity || ' ' || coalesce(metadata::text, ''))) STORED;
+
+-- search @@ to_tsquery('simple', ...)
+CREATE INDEX IF NOT EXISTS ix_activities_search ON activities USING gin (search);
+-- ORDER BY occurred_at DESC, id DESC with (occurred_at, id) < cursor, optionally per level / user
+CREATE INDEX IF NOT EXISTS ix_activities_occurred_at_id ON activities (occurred_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_activities_level_occurred_at_id ON activities (level, occurred_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_activities_user_occurred_at_id ON activities (user_id, occurred_at DESC, id DESC);
+
+ANALYZE activities;
@@ -0,0 +1,102 @@
+-- 007: monthly range partitions for activities (occurred_at) and request_logs (created_at).
+-- Partitions are named <table>_pYYYYMM and cover one UTC month; services/partition_service.py
+-- creates the coming months and drops/detaches expired ones. The <table>_default partition
+-- only catches rows outside every monthly range and should stay empty.
+--
+-- Rows are copied into the new tables: run in a maintenance window on large installs.
+-- The primary keys become (id, <time column>), as Postgres requires the partition key in them.
+BEGIN;
+
+-- ---------- activities ----------
+ALTER TABLE activities RENAME TO activities_unpartitioned;
+ALTER INDEX activities_pkey RENAME TO activities_unpartitioned_pkey;
+ALTER SEQUENCE activities_id_seq OWNED BY NONE;
+-- index names are global: free them for the partitioned table
+DROP INDEX IF EXISTS ix_activities_search;
+DROP INDEX IF EXISTS ix_activities_occurred_at_id;
+DROP INDEX IF EXISTS ix_activities_level_occurred_at_id;
+DROP INDEX IF EXISTS ix_activities_user_occurred_at_id;
+
+CREATE TABLE activities (
+    id           bigint NOT NULL DEFAULT nextval('activities_id_seq'),
+    user_id      uuid REFERENCES users(id) ON DELETE SET NULL,
+    activity     text NOT NULL,
+    level        varchar(16),
+    metadata     json,
+    occurred_at  timestamptz NOT NULL DEFAULT now(),
+    search       tsvector GENERATED ALWAYS AS (to_tsvector('simple', activity || ' ' || coalesce(metadata::text, ''))) STORED,
+    PRIMARY KEY (id, occurred_at)
+) PARTITION BY RANGE (occurred_at);
+
+CREATE INDEX ix_activities_search ON activities USING gin (search);
+CREATE INDEX ix_activities_occurred_at_id ON activities (occurred_at DESC, id DESC);
+CREATE INDEX ix_activities_level_occurred_at_id ON activities (level, occurred_at DESC, id DESC);
+CREATE INDEX ix_activities_user_occurred_at_id ON activities (user_id, occurred_at DESC, id DESC);
+
+CREATE TABLE activities_default PARTITION OF activities DEFAULT;
+
+-- ---------- request_logs ----------
+ALTER TABLE request_logs RENAME TO request_logs_unpartitioned;
+ALTER INDEX request_logs_pkey RENAME TO request_logs_unpartitioned_pkey;
+ALTER SEQUENCE request_logs_id_seq OWNED BY NONE;
+
+CREATE TABLE request_logs (
+    id             bigint NOT NULL DEFAULT nextval('request_logs_id_seq'),
+    user_id        uuid REFERENCES users(id) ON DELETE SET NULL,
+    method         text NOT NULL,
+    path           text NOT NULL,
+    status_code    integer NOT NULL,
+    ip_address     text,
+    user_agent     text,
+    query_params   text,
+    body           json,
+    created_at     timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE INDEX ix_request_logs_created_at_id ON request_logs (created_at DESC, id DESC);
+CREATE INDEX ix_request_logs_user_created_at ON request_logs (user_id, created_at DESC);
+
+CREATE TABLE request_logs_default PARTITION OF request_logs DEFAULT;
+
+-- ---------- monthly partitions: oldest existing row .. 3 months ahead ----------
+DO $$
+DECLARE
+    t record;
+    m date;
+    first_month date;
+BEGIN
+    FOR t IN SELECT * FROM (VALUES
+        ('activities', 'activities_unpartitioned', 'occurred_at'),
+        ('request_logs', 'request_logs_unpartitioned', 'created_at')
+    ) AS v(parent, legacy, col)
+    LOOP
+        EXECUTE format('SELECT date_trunc(''month'', min(%I) AT TIME ZONE ''UTC'')::date FROM %I', t.col, t.legacy)
+            INTO first_month;
+        m := coalesce(first_month, date_trunc('month', now() AT TIME ZONE 'UTC')::date);
+        WHILE m <= (date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months')::date LOOP
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                t.parent || '_p' || to_char(m, 'YYYYMM'), t.parent,
+                m::timestamp AT TIME ZONE 'UTC', (m + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+            );
+            m := (m + interval '1 month')::date;
+        END LOOP;
+    END LOOP;
+END $$;
+
+INSERT INTO activities (id, user_id, activity, level, metadata, occurred_at)
+SELECT id, user_id, activity, level, metadata, occurred_at FROM activities_unpartitioned;
+INSERT INTO request_logs (id, user_id, method, path, status_code, ip_address, user_agent, query_params, body, created_at)
+SELECT id, user_id, method, path, status_code, ip_address, user_agent, query_params, body, created_at
+FROM request_logs_unpartitioned;
+
+DROP TABLE activities_unpartitioned;
+DROP TABLE request_logs_unpartitioned;
+ALTER SEQUENCE activities_id_seq OWNED BY activities.id;
+ALTER SEQUENCE request_logs_id_seq OWNED BY request_logs.id;
+
+COMMIT;
+
+ANALYZE activities;
+ANALYZE request_logs;
@@ -0,0 +1,2 @@
+-- 008: request duration, written by core/request_log.py (propagates to every partition)
+ALTER TABLE request_logs ADD COLUMN IF NOT EXISTS duration_ms double precision;
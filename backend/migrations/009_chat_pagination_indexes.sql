@@ -0,0 +1,10 @@
+-- 009: keyset pagination of chat history and the chat list.
+-- WHERE chat_id = ? AND (created_at, id) < cursor ORDER BY created_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS ix_messages_chat_id_created_at_id ON messages (chat_id, created_at, id);
+-- superseded by the index above (004)
+DROP INDEX IF EXISTS ix_messages_chat_id_created_at;
+-- WHERE user_id = ? AND (created_at, id) < cursor ORDER BY created_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS ix_chats_user_id_created_at_id ON chats (user_id, created_at DESC, id DESC);
+
+ANALYZE messages;
+ANALYZE chats;
@@ -0,0 +1,2 @@
+-- 010: per-turn metrics on assistant messages, written by services/chat_writer.py
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS metrics jsonb;
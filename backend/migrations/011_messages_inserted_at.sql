@@ -0,0 +1,4 @@
+-- 011: server-side insert time of each message. created_at of a write-behind assistant message
+-- (services/chat_writer.py) is when it was produced, so services/analytics_rollup_service.py
+-- waits on inserted_at instead before folding past an id. Existing rows get the migration time.
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS inserted_at timestamptz NOT NULL DEFAULT now();
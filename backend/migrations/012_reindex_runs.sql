@@ -0,0 +1,15 @@
+-- 012: POST /docs/reindex-all runs in the background; progress is kept here so any worker can
+-- answer GET /docs/reindex-all/{id}. Written by services/docs_service.py.
+CREATE TABLE IF NOT EXISTS reindex_runs (
+    id             uuid PRIMARY KEY,
+    status         varchar(16) NOT NULL DEFAULT 'running',
+    chunk_profile  varchar(64),
+    documents      integer NOT NULL DEFAULT 0,
+    processed      integer NOT NULL DEFAULT 0,
+    totals         jsonb,
+    failed         jsonb,
+    error          text,
+    started_at     timestamptz NOT NULL DEFAULT now(),
+    updated_at     timestamptz NOT NULL DEFAULT now(),
+    finished_at    timestamptz
+);
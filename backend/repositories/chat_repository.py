@@ -1,8 +1,16 @@
-from typing import List, Optional
+import json
+import uuid
+import base64
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import select, true, tuple_
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import func
 from utils.models import Chat as ChatModel, Message as MessageModel
 
+PREVIEW_CHARS = 160
+
 def create_chat(db: Session, user_id, title: str) -> ChatModel:
     c = ChatModel(user_id=user_id, title=title)
     db.add(c); db.commit(); db.refresh(c)
@@ -18,11 +26,94 @@ def rename_chat(db: Session, chat_id: str, title: str) -> Optional[ChatModel]:
     db.commit(); db.refresh(c)
     return c
 
-def list_user_chats(db: Session, user_id) -> List[ChatModel]:
-    return db.query(ChatModel).filter(ChatModel.user_id == user_id).order_by(ChatModel.created_at.desc()).all()
+def encode_cursor(created_at, row_id) -> str:
+    raw = json.dumps([created_at.isoformat(), str(row_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, row_id = json.loads(raw)
+        return datetime.fromisoformat(ts), str(row_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+def _chats_page_stmt(user_id, limit: int, before: Optional[str]):
+    last = (
+        select(
+            MessageModel.sender.label("sender"),
+            func.left(MessageModel.content, PREVIEW_CHARS).label("preview"),
+            MessageModel.created_at.label("created_at"),
+        )
+        .where(MessageModel.chat_id == ChatModel.id)
+        .order_by(MessageModel.created_at.desc(), MessageModel.id.desc())
+        .limit(1)
+        .lateral("last_message")
+    )
+    stmt = (
+        select(ChatModel, last.c.sender, last.c.preview, last.c.created_at)
+        .outerjoin(last, true())
+        .where(ChatModel.user_id == user_id)
+    )
+    if before:
+        ts, chat_id = decode_cursor(before)
+        stmt = stmt.where(tuple_(ChatModel.created_at, ChatModel.id) < tuple_(ts, uuid.UUID(chat_id)))
+    return stmt.order_by(ChatModel.created_at.desc(), ChatModel.id.desc()).limit(limit + 1)
+
+def _chats_page(rows, limit: int) -> Dict[str, Any]:
+    items = [tuple(r) for r in rows[:limit]]
+    next_cursor = encode_cursor(items[-1][0].created_at, items[-1][0].id) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+def list_user_chats(db: Session, user_id, limit: int, before: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Newest chats first, each with its last message (one LATERAL index probe per chat,
+    same query). `before` is the next_cursor of the previous page.
+    Items: (ChatModel, last_sender, last_preview, last_at).
+    """
+    return _chats_page(db.execute(_chats_page_stmt(user_id, limit, before)).all(), limit)
+
+def _messages_page_stmt(chat_id, limit: int, before: Optional[str]):
+    stmt = select(MessageModel).where(MessageModel.chat_id == chat_id)
+    if before:
+        ts, msg_id = decode_cursor(before)
+        stmt = stmt.where(tuple_(MessageModel.created_at, MessageModel.id) < tuple_(ts, int(msg_id)))
+    return stmt.order_by(MessageModel.created_at.desc(), MessageModel.id.desc()).limit(limit + 1)
+
+def _messages_page(rows, limit: int) -> Dict[str, Any]:
+    items = list(rows[:limit])
+    next_cursor = encode_cursor(items[-1].created_at, items[-1].id) if len(rows) > limit else None
+    items.reverse()
+    return {"items": items, "next_cursor": next_cursor}
+
+def list_messages(db: Session, chat_id: str, limit: int, before: Optional[str] = None) -> Dict[str, Any]:
+    """
+    The newest `limit` messages older than `before` (index range scan on
+    (chat_id, created_at, id), newest first), returned oldest first for display.
+    next_cursor pages further back in time.
+    """
+    return _messages_page(db.execute(_messages_page_stmt(chat_id, limit, before)).scalars().all(), limit)
+
+# ---- AsyncSession variants (same statements), for async routes ----
+
+def _uuid(value) -> uuid.UUID:
+    # asyncpg binds uuid columns strictly; a malformed id is treated like a missing row
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+async def get_chat_async(db: AsyncSession, chat_id) -> Optional[ChatModel]:
+    try:
+        return await db.get(ChatModel, _uuid(chat_id))
+    except ValueError:
+        return None
+
+async def list_user_chats_async(db: AsyncSession, user_id, limit: int, before: Optional[str] = None) -> Dict[str, Any]:
+    rows = (await db.execute(_chats_page_stmt(user_id, limit, before))).all()
+    return _chats_page(rows, limit)
 
-def list_messages(db: Session, chat_id: str) -> List[MessageModel]:
-    return db.query(MessageModel).filter(MessageModel.chat_id == chat_id).order_by(MessageModel.created_at.asc()).all()
+async def list_messages_async(db: AsyncSession, chat_id, limit: int, before: Optional[str] = None) -> Dict[str, Any]:
+    rows = (await db.execute(_messages_page_stmt(_uuid(chat_id), limit, before))).scalars().all()
+    return _messages_page(rows, limit)
 
 def insert_message(db: Session, chat_id: str, role: str, content: str) -> MessageModel:
     m = MessageModel(chat_id=chat_id, content=content)
@@ -1,5 +1,10 @@
-from typing import Optional, List, Dict, Any
+import json
+import base64
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple
+from sqlalchemy import text, update, tuple_
 from sqlalchemy.orm import Session
+from utils.db import estimate_count
 from utils.models import Document
 
 def insert_document(db: Session, doc: Document) -> None:
@@ -11,16 +16,86 @@ def get(db: Session, doc_id: str) -> Optional[Document]:
 def delete(db: Session, doc: Document) -> None:
     db.delete(doc)
 
+def find_by_hash(db: Session, content_hash: str) -> Optional[Document]:
+    return (
+        db.query(Document)
+        .filter(Document.content_hash == content_hash, Document.status == "ready")
+        .order_by(Document.uploaded_at.asc())
+        .first()
+    )
+
+def lock_content_hash(db: Session, content_hash: str) -> None:
+    """Transaction-scoped lock on one content_hash (re-entrant); released at commit/rollback."""
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:h))"), {"h": content_hash})
+
+def count_by_hash(db: Session, content_hash: str) -> int:
+    return db.query(Document).filter(Document.content_hash == content_hash).count()
+
+def list_all(db: Session) -> List[Document]:
+    return db.query(Document).order_by(Document.uploaded_at.asc()).all()
+
+def set_chunk_profiles(db: Session, profiles: Dict[str, str]) -> None:
+    """profiles: doc_id -> chunk profile; one UPDATE per distinct profile."""
+    by_profile: Dict[str, List[str]] = {}
+    for doc_id, profile in profiles.items():
+        by_profile.setdefault(profile, []).append(doc_id)
+    for profile, ids in by_profile.items():
+        db.execute(update(Document).where(Document.id.in_(ids)).values(chunk_profile=profile))
+
 def list_recent(db: Session, count: int) -> List[Document]:
     return db.query(Document).order_by(Document.uploaded_at.desc()).limit(count).all()
 
-def list_docs(db: Session, q: Optional[str], tag: Optional[str], skip: int, limit: int):
+def encode_cursor(doc: Document) -> str:
+    raw = json.dumps([doc.uploaded_at.isoformat(), doc.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, doc_id = json.loads(raw)
+        return datetime.fromisoformat(ts), str(doc_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+def list_docs(
+    db: Session,
+    q: Optional[str],
+    tag: Optional[str],
+    skip: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    total: str = "exact",
+):
+    """
+    Newest first, ordered by (uploaded_at, id) so ties are stable.
+    With `cursor` the page starts right after that row (index range scan, no OFFSET);
+    without it `skip` is honoured for older clients. `total`: exact | estimate | none.
+    """
     qry = db.query(Document)
     if q:
-        like = f"%{q}%"
-        qry = qry.filter(Document.filename.ilike(like))
+        qry = qry.filter(Document.filename.ilike(f"%{q}%"))         # pg_trgm GIN
     if tag:
-        qry = qry.filter(Document.tags.like(f"%{tag}%"))
-    total = qry.count()
-    items = qry.order_by(Document.uploaded_at.desc()).offset(skip).limit(limit).all()
-    return {"items": items, "total": total}
+        qry = qry.filter(Document.tags.contains([tag]))             # tags @> '["tag"]', GIN
+    filtered = qry
+
+    if cursor:
+        ts, doc_id = decode_cursor(cursor)
+        qry = qry.filter(tuple_(Document.uploaded_at, Document.id) < tuple_(ts, doc_id))
+    elif skip:
+        qry = qry.offset(skip)
+    rows = (
+        qry.order_by(Document.uploaded_at.desc(), Document.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1]) if len(rows) > limit else None
+
+    if total == "none":
+        count = None
+    elif total == "estimate":
+        count = estimate_count(db, filtered)
+    else:
+        count = filtered.count()
+    return {"items": items, "total": count, "next_cursor": next_cursor}
@@ -2,7 +2,8 @@
 import uuid
 from typing import Optional, List
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, func, select
 
 from utils.models import User, Role, UserRole
 
@@ -40,14 +41,17 @@ def assign_role(db: Session, user_id: uuid.UUID, role_id: int) -> None:
     db.add(UserRole(user_id=user_id, role_id=role_id))
     db.commit()
 
+def _user_roles_stmt(user_id: uuid.UUID):
+    return select(Role.name).join(UserRole, Role.role_id == UserRole.role_id).where(UserRole.user_id == user_id)
+
 def get_user_roles(db: Session, user_id: uuid.UUID) -> List[str]:
-    rows = (
-        db.query(Role.name)
-        .join(UserRole, Role.role_id == UserRole.role_id)
-        .filter(UserRole.user_id == user_id)
-        .all()
-    )
-    return [r[0] for r in rows]
+    return list(db.execute(_user_roles_stmt(user_id)).scalars())
+
+async def get_by_id_async(db: AsyncSession, user_id: uuid.UUID) -> Optional[User]:
+    return await db.get(User, user_id)
+
+async def get_user_roles_async(db: AsyncSession, user_id: uuid.UUID) -> List[str]:
+    return list((await db.execute(_user_roles_stmt(user_id))).scalars())
 
 def update_last_login(db: Session, user: User) -> None:
     from datetime import datetime, timezone
@@ -17,12 +17,14 @@ class DocumentOut(BaseModel):
     tags: Optional[List[str]] = None
     uploaded_by: Optional[str] = None
     status: Optional[str] = None
+    chunk_profile: Optional[str] = None
     # If your SQLAlchemy model uses timezone-aware ts, pydantic handles datetime fine
     uploaded_at: Optional[datetime] = None
 
 class DocumentList(BaseModel):
     items: List[DocumentOut]
-    total: int
+    total: Optional[int] = None          # None when total=none; planner estimate when total=estimate
+    next_cursor: Optional[str] = None    # pass back as ?cursor= for the next page
 
 class UploadResponse(BaseModel):
     created: List[DocumentOut]
@@ -1,76 +1,33 @@
-from datetime import datetime, timedelta, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import text
 
-def _start_ts(days: int) -> datetime:
-    d = max(int(days or 0), 1)
-    return datetime.now(timezone.utc) - timedelta(days=d)
+from services import analytics_rollup_service as rollups
+
+# All series read the daily rollups (analytics_rollup_service), so cost depends on the
+# number of days asked for, not on the size of the messages table.
+
+def _day(d) -> str:
+    return d.strftime("%Y-%m-%d")
 
 def ts_messages(db: Session, days: int):
-    start = _start_ts(days)
-    sql = text("""
-        SELECT to_char(date_trunc('day', m.created_at AT TIME ZONE 'UTC'), 'YYYY-MM-DD') AS day,
-               COUNT(*)::int AS messages
-        FROM messages m
-        WHERE m.created_at >= :start
-        GROUP BY 1
-        ORDER BY 1
-    """)
-    rows = db.execute(sql, {"start": start}).fetchall()
-    return [dict(r._mapping) for r in rows]
+    return [{"day": _day(r["day"]), "messages": int(r["messages"])} for r in rollups.daily(db, days)]
 
 def ts_users(db: Session, days: int):
-    start = _start_ts(days)
-    sql = text("""
-        SELECT to_char(date_trunc('day', m.created_at AT TIME ZONE 'UTC'), 'YYYY-MM-DD') AS day,
-               COUNT(DISTINCT c.user_id)::int AS users
-        FROM messages m
-        JOIN chats c ON c.id = m.chat_id
-        WHERE m.created_at >= :start
-        GROUP BY 1
-        ORDER BY 1
-    """)
-    rows = db.execute(sql, {"start": start}).fetchall()
-    return [dict(r._mapping) for r in rows]
+    return [{"day": _day(r["day"]), "users": int(r["users"])} for r in rollups.daily(db, days)]
 
 def ts_latency(db: Session, days: int):
-    start = _start_ts(days)
-    sql = text("""
-        WITH seq AS (
-          SELECT
-            m.chat_id,
-            m.sender,
-            m.created_at,
-            lead(m.created_at) OVER (PARTITION BY m.chat_id ORDER BY m.created_at) AS next_ts,
-            lead(m.sender)     OVER (PARTITION BY m.chat_id ORDER BY m.created_at) AS next_sender
-          FROM messages m
-          WHERE m.created_at >= :start
-        ),
-        pairs AS (
-          SELECT created_at AS user_ts,
-                 EXTRACT(EPOCH FROM (next_ts - created_at)) * 1000.0 AS ms
-          FROM seq
-          WHERE sender = 'user' AND next_sender = 'assistant' AND next_ts IS NOT NULL
-        )
-        SELECT to_char(date_trunc('day', user_ts AT TIME ZONE 'UTC'), 'YYYY-MM-DD') AS day,
-               percentile_cont(0.5)  WITHIN GROUP (ORDER BY ms) AS p50_ms,
-               percentile_cont(0.95) WITHIN GROUP (ORDER BY ms) AS p95_ms
-        FROM pairs
-        GROUP BY 1
-        ORDER BY 1
-    """)
-    rows = db.execute(sql, {"start": start}).fetchall()
-    return [dict(r._mapping) for r in rows]
+    out = []
+    for r in rollups.daily(db, days):
+        sk = r["latency"]
+        if sk.count == 0:
+            continue
+        out.append({
+            "day": _day(r["day"]),
+            "p50_ms": sk.quantile(0.5),
+            "p95_ms": sk.quantile(0.95),
+            "p99_ms": sk.quantile(0.99),
+            "turns": sk.count,
+        })
+    return out
 
 def ts_tokens_cost(db: Session, days: int):
-    start = _start_ts(days)
-    sql = text("""
-        SELECT to_char(date_trunc('day', m.created_at AT TIME ZONE 'UTC'), 'YYYY-MM-DD') AS day,
-               SUM(length(m.content) / 4.0) AS tokens
-        FROM messages m
-        WHERE m.created_at >= :start
-        GROUP BY 1
-        ORDER BY 1
-    """)
-    rows = db.execute(sql, {"start": start}).fetchall()
-    return [dict(r._mapping) for r in rows]
+    return [{"day": _day(r["day"]), "tokens": float(r["tokens"])} for r in rollups.daily(db, days)]
@@ -1,11 +1,17 @@
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Iterator, Tuple
 from datetime import datetime, timedelta, timezone
+import io
+import os
 import json
+import zlib
+import uuid
+import base64
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql import func
-from sqlalchemy import or_, cast, String
+from sqlalchemy import select, tuple_
 
+from utils.db import estimate_count
 from utils.models import User, Role, UserRole, Chat, Message, File, Activity, ConfigKV, Setting
 
 # ---------- Dashboard ----------
@@ -17,21 +23,12 @@ def metrics(db: Session) -> Dict[str, int]:
     return {"Users": users_cnt, "Chats": chats_cnt, "Tokens": int(db_tokens), "Docs": docs_cnt}
 
 def token_usage(db: Session) -> List[Dict[str, int]]:
-    since = datetime.now(timezone.utc) - timedelta(days=7)
-    rows = (
-        db.query(
-            func.date_trunc('day', Message.created_at).label("d"),
-            (func.sum(func.length(Message.content)) / 4.0).label("tok"),
-        )
-        .filter(Message.created_at >= since)
-        .group_by(func.date_trunc('day', Message.created_at))
-        .order_by(func.date_trunc('day', Message.created_at))
-        .all()
-    )
+    from services.analytics_rollup_service import daily
     today = datetime.now(timezone.utc).date()
     series = {(today - timedelta(days=i)).strftime("%a"): 0 for i in range(6, -1, -1)}
-    for d, tok in rows:
-        series[d.date().strftime("%a")] = int(tok or 0)
+    for r in daily(db, 7):
+        if (today - r["day"]).days < 7:
+            series[r["day"].strftime("%a")] = int(r["tokens"] or 0)
     return [{"day": k, "tokens": v} for k, v in series.items()]
 
 # ---------- Users ----------
@@ -113,15 +110,18 @@ def user_chats(db: Session, user_id: str) -> List[Dict[str, Any]]:
     rows = db.query(Chat).filter(Chat.user_id == user_id).order_by(Chat.created_at.desc()).all()
     return [{"id": str(c.id), "title": c.title, "created_at": c.created_at} for c in rows]
 
-def chat_messages(db: Session, chat_id: str, limit: int) -> List[Dict[str, Any]]:
-    rows = (
-        db.query(Message)
-          .filter(Message.chat_id == chat_id)
-          .order_by(Message.created_at.asc())
-          .limit(limit)
-          .all()
-    )
-    return [{"id": str(m.id), "role": m.sender, "text": m.content, "created_at": m.created_at} for m in rows]
+def chat_messages(db: Session, chat_id: str, limit: int, before: Optional[str] = None) -> Dict[str, Any]:
+    """The newest `limit` messages (older than `before`), oldest first, plus next_cursor."""
+    from repositories import chat_repository
+    try:
+        page = chat_repository.list_messages(db, chat_id, limit, before)
+    except ValueError as e:
+        from fastapi import HTTPException
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "items": [{"id": str(m.id), "role": m.sender, "text": m.content, "created_at": m.created_at} for m in page["items"]],
+        "next_cursor": page["next_cursor"],
+    }
 
 def admin_reply(db: Session, chat_id: str, payload) -> Dict[str, bool]:
     chat = db.get(Chat, chat_id)
@@ -159,77 +159,236 @@ def admin_delete_message(db: Session, chat_id: str, message_id: str) -> Dict[str
     return {"ok": True}
 
 # ---------- Logs ----------
-def list_logs(
-    db: Session,
-    limit: int, offset: int,
+def _log_tsquery(q: str) -> Optional[str]:
+    """
+    Every whitespace-separated term must match, as a prefix ("err" finds "error").
+    Terms are quoted so Postgres splits them like the indexed text (emails, paths).
+    """
+    terms = [t for t in q.split() if any(ch.isalnum() for ch in t)]
+    if not terms:
+        return None
+    return " & ".join("'" + t.replace("\\", "\\\\").replace("'", "''") + "':*" for t in terms)
+
+def _log_filters(
     q: Optional[str], level: Optional[str], user_id: Optional[str],
     date_from: Optional[datetime], date_to: Optional[datetime],
-) -> Dict[str, Any]:
-    qry = db.query(Activity)
+) -> List[Any]:
+    """WHERE criteria for activities; raises ValueError on a malformed user id."""
+    crit: List[Any] = []
     if q:
-        qry = qry.filter(or_(Activity.activity.ilike(f"%{q}%"),
-                             cast(Activity.metadata, String).ilike(f"%{q}%")))
+        tsq = _log_tsquery(q)
+        if tsq:
+            crit.append(Activity.search.op("@@")(func.to_tsquery("simple", tsq)))   # GIN
     if level:
-        qry = qry.filter(Activity.level == level)
+        crit.append(Activity.level == level)
     if user_id:
-        qry = qry.filter(Activity.user_id == user_id)
+        crit.append(Activity.user_id == uuid.UUID(str(user_id)))
     if date_from:
-        qry = qry.filter(Activity.occurred_at >= date_from)
+        crit.append(Activity.occurred_at >= date_from)
     if date_to:
-        qry = qry.filter(Activity.occurred_at <= date_to)
-
-    total = qry.count()
-    rows = qry.order_by(Activity.occurred_at.desc()).offset(offset).limit(limit).all()
-
-    def to_out(r) -> Dict[str, Any]:
-        md = r.metadata if isinstance(r.metadata, dict) else None
-        return dict(
-            id=r.id,
-            user_id=str(r.user_id) if getattr(r, "user_id", None) else None,
-            activity=r.activity,
-            level=getattr(r, "level", None),
-            occurred_at=r.occurred_at,
-            metadata=md,
-        )
+        crit.append(Activity.occurred_at <= date_to)
+    return crit
 
-    return {"total": total, "items": [to_out(r) for r in rows]}
-
-def export_logs_csv(
+def _logs_query(
     db: Session,
     q: Optional[str], level: Optional[str], user_id: Optional[str],
     date_from: Optional[datetime], date_to: Optional[datetime],
 ):
-    qry = db.query(Activity)
-    if q:
-        qry = qry.filter(or_(Activity.activity.ilike(f"%{q}%"),
-                             cast(Activity.metadata, String).ilike(f"%{q}%")))
-    if level:
-        qry = qry.filter(Activity.level == level)
-    if user_id:
-        qry = qry.filter(Activity.user_id == user_id)
-    if date_from:
-        qry = qry.filter(Activity.occurred_at >= date_from)
-    if date_to:
-        qry = qry.filter(Activity.occurred_at <= date_to)
-    rows = qry.order_by(Activity.occurred_at.desc()).all()
-
-    def iter_csv():
-        import csv, io
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["id","occurred_at","level","user_id","activity","metadata"])
-        yield output.getvalue(); output.seek(0); output.truncate(0)
-        for r in rows:
-            writer.writerow([
-                r.id,
-                r.occurred_at.isoformat(),
-                getattr(r, "level", ""),
-                str(getattr(r, "user_id", "") or ""),
-                r.activity,
-                json.dumps(r.metadata or {}),
-            ])
-            yield output.getvalue(); output.seek(0); output.truncate(0)
-    return iter_csv()
+    return db.query(Activity).filter(*_log_filters(q, level, user_id, date_from, date_to))
+
+def _encode_log_cursor(r: Activity) -> str:
+    raw = json.dumps([r.occurred_at.isoformat(), r.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_log_cursor(cursor: str):
+    """Raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, log_id = json.loads(raw)
+        return datetime.fromisoformat(ts), int(log_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+def _log_out(r: Activity) -> Dict[str, Any]:
+    return dict(
+        id=r.id,
+        user_id=str(r.user_id) if r.user_id else None,
+        activity=r.activity,
+        level=r.level,
+        occurred_at=r.occurred_at,
+        metadata=r.meta if isinstance(r.meta, dict) else None,
+    )
+
+def list_logs(
+    db: Session,
+    limit: int, offset: int,
+    q: Optional[str], level: Optional[str], user_id: Optional[str],
+    date_from: Optional[datetime], date_to: Optional[datetime],
+    cursor: Optional[str] = None,
+    total: str = "exact",
+) -> Dict[str, Any]:
+    """
+    Newest first on (occurred_at, id). With `cursor` the page starts right after that
+    row (index range scan); without it `offset` is honoured for older clients.
+    `total`: exact | estimate (planner estimate) | none.
+    """
+    from fastapi import HTTPException
+    try:
+        filtered = _logs_query(db, q, level, user_id, date_from, date_to)
+        qry = filtered
+        if cursor:
+            ts, log_id = _decode_log_cursor(cursor)
+            # the plain bound lets the planner prune monthly partitions; the row comparison can't
+            qry = qry.filter(Activity.occurred_at <= ts,
+                             tuple_(Activity.occurred_at, Activity.id) < tuple_(ts, log_id))
+        elif offset:
+            qry = qry.offset(offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rows = qry.order_by(Activity.occurred_at.desc(), Activity.id.desc()).limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = _encode_log_cursor(items[-1]) if len(rows) > limit else None
+
+    if total == "none":
+        count = None
+    elif total == "estimate":
+        count = estimate_count(db, filtered)
+    else:
+        count = filtered.count()
+    return {"total": count, "items": [_log_out(r) for r in items], "next_cursor": next_cursor}
+
+# Export streams through a server-side cursor in LOG_EXPORT_BATCH-row batches, on its
+# own session: the request's session is closed before a StreamingResponse body runs.
+LOG_EXPORT_BATCH = int(os.getenv("LOG_EXPORT_BATCH", "5000"))
+LOG_EXPORT_FORMATS = {
+    # format: (media type, file extension)
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+_LOG_COLUMNS = ["id", "occurred_at", "level", "user_id", "activity", "metadata"]
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last take()."""
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def take(self) -> bytes:
+        out, self._chunks = b"".join(self._chunks), []
+        return out
+
+def _log_batches(criteria: List[Any]) -> Iterator[List[Any]]:
+    from utils.db import SessionLocal
+    db = SessionLocal()
+    try:
+        stmt = (
+            select(Activity.id, Activity.occurred_at, Activity.level, Activity.user_id, Activity.activity, Activity.meta)
+            .where(*criteria)
+            .order_by(Activity.occurred_at.desc(), Activity.id.desc())
+            .execution_options(yield_per=LOG_EXPORT_BATCH)   # stream_results: server-side cursor
+        )
+        for part in db.execute(stmt).partitions():
+            yield part
+    finally:
+        db.close()
+
+def _csv_chunks(criteria: List[Any]) -> Iterator[bytes]:
+    import csv
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(_LOG_COLUMNS)
+    yield out.getvalue().encode()   # first byte before the query runs
+    for part in _log_batches(criteria):
+        out.seek(0); out.truncate(0)
+        for r in part:
+            writer.writerow([r.id, r.occurred_at.isoformat(), r.level or "", str(r.user_id or ""),
+                             r.activity, json.dumps(r.meta or {})])
+        yield out.getvalue().encode()
+
+def _arrow_chunks(criteria: List[Any], fmt: str) -> Iterator[bytes]:
+    import pyarrow as pa
+    schema = pa.schema([
+        ("id", pa.int64()), ("occurred_at", pa.timestamp("us", tz="UTC")), ("level", pa.string()),
+        ("user_id", pa.string()), ("activity", pa.string()), ("metadata", pa.string()),
+    ])
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")   # one row group per batch
+        write = writer.write_batch
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+    yield sink.take()
+    for part in _log_batches(criteria):
+        write(pa.RecordBatch.from_pydict({
+            "id": [r.id for r in part],
+            "occurred_at": [r.occurred_at for r in part],
+            "level": [r.level for r in part],
+            "user_id": [str(r.user_id) if r.user_id else None for r in part],
+            "activity": [r.activity for r in part],
+            "metadata": [json.dumps(r.meta) if r.meta is not None else None for r in part],
+        }, schema=schema))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+def _gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits 31: gzip container
+    for chunk in chunks:
+        if chunk:
+            # sync flush per batch: the client gets bytes as soon as a batch is read
+            yield z.compress(chunk) + z.flush(zlib.Z_SYNC_FLUSH)
+    yield z.flush()
+
+def export_logs(
+    db: Session,
+    q: Optional[str], level: Optional[str], user_id: Optional[str],
+    date_from: Optional[datetime], date_to: Optional[datetime],
+    fmt: str = "csv",
+    gzip: bool = False,
+) -> Tuple[Iterator[bytes], str, Dict[str, str]]:
+    """
+    (body chunks, media type, headers) for a StreamingResponse. Memory stays at one
+    batch whatever the export size. parquet/arrow need pyarrow; gzip applies to csv
+    and arrow (Parquet pages are already zstd-compressed).
+    """
+    from fastapi import HTTPException
+    if fmt not in LOG_EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {fmt}")
+    try:
+        criteria = _log_filters(q, level, user_id, date_from, date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if fmt == "csv":
+        chunks = _csv_chunks(criteria)
+    else:
+        try:
+            import pyarrow  # noqa: F401  optional: pip install pyarrow
+        except ImportError:
+            raise HTTPException(status_code=400, detail=f"{fmt} export needs pyarrow installed on the server")
+        chunks = _arrow_chunks(criteria, fmt)
+
+    media_type, ext = LOG_EXPORT_FORMATS[fmt]
+    headers = {"Content-Disposition": f"attachment; filename=logs.{ext}"}
+    if gzip and fmt != "parquet":
+        chunks = _gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return chunks, media_type, headers
 
 def delete_log(db: Session, log_id: int) -> Dict[str, bool]:
     r = db.query(Activity).filter(Activity.id == log_id).first()
@@ -320,3 +479,24 @@ def put_agent_policies(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
         row.value = payload
     db.commit()
     return row.value
+
+# ---------- Retrieval scopes ----------
+def get_retrieval_scopes(db: Session) -> Dict[str, Any]:
+    row = db.query(Setting).filter(Setting.key == "retrieval_scopes").first()
+    if row and isinstance(row.value, dict):
+        return row.value
+    import os
+    try:
+        return json.loads(os.getenv("RETRIEVAL_SCOPES", "{}")) or {}
+    except json.JSONDecodeError:
+        return {}
+
+def put_retrieval_scopes(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    row = db.query(Setting).filter(Setting.key == "retrieval_scopes").first()
+    if not row:
+        row = Setting(key="retrieval_scopes", value=payload)
+        db.add(row)
+    else:
+        row.value = payload
+    db.commit()
+    return row.value
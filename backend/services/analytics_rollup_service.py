@@ -0,0 +1,266 @@
+# services/analytics_rollup_service.py
+"""
+Incrementally maintained daily rollups of the messages table.
+
+    analytics_daily        day -> messages, distinct users, tokens, turn-latency sketch
+    analytics_daily_users  (day, user_id) -> messages, so distinct users stay exact
+    rollup_watermarks      highest messages.id already folded in
+
+run_rollups() folds rows with id > watermark, in id order and in batches; each batch
+and its watermark advance commit together, so a crash never double counts. The
+watermark only passes rows inserted (messages.inserted_at, the server's clock) at
+least ROLLUP_LAG_SECONDS ago, leaving in-flight transactions holding lower ids time
+to commit first. Readers add the not-yet-folded tail on the fly, so results are
+current.
+"""
+import os
+import time
+import logging
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from utils.latency_sketch import LatencySketch
+from utils.models import AnalyticsDaily, AnalyticsDailyUser, RollupWatermark
+
+log = logging.getLogger(__name__)
+
+# --------------------
+# Config
+# --------------------
+ROLLUP_INTERVAL_SECONDS = int(os.getenv("ROLLUP_INTERVAL_SECONDS", "60"))  # 0 = no in-process scheduler
+ROLLUP_LAG_SECONDS = int(os.getenv("ROLLUP_LAG_SECONDS", "60"))
+ROLLUP_BATCH = int(os.getenv("ROLLUP_BATCH", "20000"))
+TAIL_LIMIT = int(os.getenv("ROLLUP_TAIL_LIMIT", "20000"))  # unfolded rows readers aggregate themselves
+
+WATERMARK = "messages_daily"
+_LOCK_KEY = 0x726F6C6C  # pg advisory lock: one rollup writer across workers/hosts
+
+# One row per message, with its chat owner and, for assistant messages, the previous
+# message of the chat (user -> assistant turn latency). Latency is attributed to the
+# assistant message's UTC day so every row contributes to exactly one day.
+_ROWS_SQL = """
+    SELECT m.id,
+           (m.created_at AT TIME ZONE 'UTC')::date AS day,
+           m.sender,
+           m.created_at,
+           m.inserted_at,
+           length(m.content) AS chars,
+           c.user_id,
+           prev.sender AS prev_sender,
+           prev.created_at AS prev_at
+    FROM messages m
+    JOIN chats c ON c.id = m.chat_id
+    LEFT JOIN LATERAL (
+        SELECT p.sender, p.created_at
+        FROM messages p
+        WHERE m.sender = 'assistant'
+          AND p.chat_id = m.chat_id
+          AND (p.created_at, p.id) < (m.created_at, m.id)
+        ORDER BY p.created_at DESC, p.id DESC
+        LIMIT 1
+    ) prev ON true
+    WHERE {where}
+    ORDER BY m.id
+    LIMIT :limit
+"""
+
+
+# --------------------
+# Aggregation
+# --------------------
+def _aggregate(rows) -> Dict[date, Dict[str, Any]]:
+    out: Dict[date, Dict[str, Any]] = {}
+    for r in rows:
+        d = out.get(r.day)
+        if d is None:
+            d = out[r.day] = {"messages": 0, "tokens": 0.0, "users": Counter(), "latency": LatencySketch()}
+        d["messages"] += 1
+        d["tokens"] += (r.chars or 0) / 4.0
+        if r.user_id is not None:
+            d["users"][r.user_id] += 1
+        if r.sender == "assistant" and r.prev_sender == "user":
+            d["latency"].add((r.created_at - r.prev_at).total_seconds() * 1000.0)
+    return out
+
+
+def _fetch(db: Session, where: str, params: Dict[str, Any], limit: int):
+    return db.execute(text(_ROWS_SQL.format(where=where)), {**params, "limit": limit}).fetchall()
+
+
+def _apply(db: Session, deltas: Dict[date, Dict[str, Any]]) -> None:
+    for day, d in deltas.items():
+        if d["users"]:
+            stmt = pg_insert(AnalyticsDailyUser).values([
+                {"day": day, "user_id": uid, "messages": n} for uid, n in d["users"].items()
+            ])
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[AnalyticsDailyUser.day, AnalyticsDailyUser.user_id],
+                set_={"messages": AnalyticsDailyUser.messages + stmt.excluded.messages},
+            ))
+        row = db.get(AnalyticsDaily, day, with_for_update=True)
+        if row is None:
+            row = AnalyticsDaily(day=day, messages=0, users=0, tokens=0.0)
+            db.add(row)
+        row.messages = (row.messages or 0) + d["messages"]
+        row.tokens = (row.tokens or 0.0) + d["tokens"]
+        row.latency = LatencySketch.from_dict(row.latency).merge(d["latency"]).to_dict()
+        db.flush()
+        row.users = db.query(func.count()).select_from(AnalyticsDailyUser).filter(AnalyticsDailyUser.day == day).scalar()
+
+
+def _watermark(db: Session, lock: bool = False) -> RollupWatermark:
+    wm = db.get(RollupWatermark, WATERMARK, with_for_update=lock)
+    if wm is None:
+        wm = RollupWatermark(name=WATERMARK, last_id=0)
+        db.add(wm)
+        db.flush()
+    return wm
+
+
+def _try_lock(db: Session) -> bool:
+    # transaction-scoped: released by the commit/rollback that ends each batch
+    return bool(db.execute(text("SELECT pg_try_advisory_xact_lock(:k)"), {"k": _LOCK_KEY}).scalar())
+
+
+# --------------------
+# Jobs
+# --------------------
+def run_rollups(db: Session, batch: int = ROLLUP_BATCH, max_batches: Optional[int] = None) -> Dict[str, Any]:
+    """Fold every settled row past the watermark. Returns rows processed and the new watermark."""
+    processed = batches = 0
+    # the database clock, the one inserted_at was stamped with
+    cutoff = db.execute(text("SELECT now() - make_interval(secs => :lag)"), {"lag": ROLLUP_LAG_SECONDS}).scalar()
+    db.rollback()
+    while max_batches is None or batches < max_batches:
+        if not _try_lock(db):
+            db.rollback()
+            return {"processed": processed, "skipped": "another rollup is running"}
+        wm = _watermark(db, lock=True)
+        fetched = _fetch(db, "m.id > :after", {"after": wm.last_id}, batch)
+        # Only the settled prefix: stop at the first row inserted within the lag. created_at
+        # can't gate this, write-behind rows carry the time they were produced.
+        rows = []
+        for r in fetched:
+            if r.inserted_at > cutoff:
+                break
+            rows.append(r)
+        if not rows:
+            db.commit()
+            break
+        _apply(db, _aggregate(rows))
+        wm.last_id = rows[-1].id
+        db.commit()
+        processed += len(rows)
+        batches += 1
+        if len(rows) < batch:
+            break
+    return {"processed": processed, "watermark": _watermark(db).last_id}
+
+
+def backfill(db: Session, start: date, end: date, batch: int = ROLLUP_BATCH) -> Dict[str, Any]:
+    """
+    Recompute [start, end] (UTC days, inclusive) from raw messages, e.g. after messages
+    were edited or deleted. Only rows up to the watermark are counted; later rows are
+    still folded by run_rollups, so nothing is counted twice.
+    """
+    if not _try_lock(db):
+        db.rollback()
+        raise RuntimeError("Another rollup is running; retry shortly")
+    last_id = _watermark(db, lock=True).last_id
+    db.query(AnalyticsDailyUser).filter(AnalyticsDailyUser.day.between(start, end)).delete(synchronize_session=False)
+    db.query(AnalyticsDaily).filter(AnalyticsDaily.day.between(start, end)).delete(synchronize_session=False)
+
+    lo = datetime.combine(start, datetime.min.time(), tzinfo=timezone.utc)
+    hi = datetime.combine(end + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    after, processed = 0, 0
+    while True:
+        rows = _fetch(
+            db,
+            "m.created_at >= :lo AND m.created_at < :hi AND m.id > :after AND m.id <= :last_id",
+            {"lo": lo, "hi": hi, "after": after, "last_id": last_id},
+            batch,
+        )
+        if not rows:
+            break
+        _apply(db, _aggregate(rows))
+        after = rows[-1].id
+        processed += len(rows)
+    # one transaction: readers never see a half-rebuilt range
+    db.commit()
+    return {"processed": processed, "days": (end - start).days + 1, "watermark": last_id}
+
+
+# --------------------
+# Reads
+# --------------------
+def _tail(db: Session) -> Dict[date, Dict[str, Any]]:
+    wm = db.get(RollupWatermark, WATERMARK)
+    rows = _fetch(db, "m.id > :after", {"after": wm.last_id if wm else 0}, TAIL_LIMIT)
+    return _aggregate(rows)
+
+
+def daily(db: Session, days: int) -> List[Dict[str, Any]]:
+    """
+    Per-day rollup rows for the last `days` UTC days (only days with messages),
+    with rows not yet folded by the job added in.
+    """
+    start = datetime.now(timezone.utc).date() - timedelta(days=max(int(days or 0), 1))
+    rows = {
+        r.day: {"messages": r.messages, "users": r.users, "tokens": r.tokens, "latency": LatencySketch.from_dict(r.latency)}
+        for r in db.query(AnalyticsDaily).filter(AnalyticsDaily.day >= start).order_by(AnalyticsDaily.day).all()
+    }
+    # Tail after the rollup rows: if the job commits in between, the tail starts past rows
+    # the rollup read missed (briefly low), never re-counting rows already folded in.
+    for day, t in _tail(db).items():
+        if day < start:
+            continue
+        cur = rows.setdefault(day, {"messages": 0, "users": 0, "tokens": 0.0, "latency": LatencySketch()})
+        cur["messages"] += t["messages"]
+        cur["tokens"] += t["tokens"]
+        cur["latency"].merge(t["latency"])
+        if t["users"]:
+            known = {
+                uid for (uid,) in db.query(AnalyticsDailyUser.user_id)
+                .filter(AnalyticsDailyUser.day == day, AnalyticsDailyUser.user_id.in_(list(t["users"])))
+            }
+            cur["users"] += len(set(t["users"]) - known)
+    return [{"day": day, **rows[day]} for day in sorted(rows)]
+
+
+# --------------------
+# Scheduler
+# --------------------
+_scheduler: Optional[threading.Thread] = None
+
+
+def _loop(interval: int) -> None:
+    from utils.db import SessionLocal
+    while True:
+        db = SessionLocal()
+        try:
+            res = run_rollups(db)
+            if res.get("processed"):
+                log.info("analytics rollup: %s", res)
+        except Exception:
+            db.rollback()
+            log.exception("analytics rollup failed")
+        finally:
+            db.close()
+        time.sleep(interval)
+
+
+def start_scheduler() -> Optional[threading.Thread]:
+    """Run run_rollups every ROLLUP_INTERVAL_SECONDS in a daemon thread (one writer wins the advisory lock)."""
+    global _scheduler
+    if ROLLUP_INTERVAL_SECONDS <= 0:
+        return None
+    if _scheduler is None or not _scheduler.is_alive():
+        _scheduler = threading.Thread(target=_loop, args=(ROLLUP_INTERVAL_SECONDS,), name="analytics-rollup", daemon=True)
+        _scheduler.start()
+    return _scheduler
@@ -1,14 +1,14 @@
 # app/services/chat_service.py
-import os, json, re, uuid
+import os, json, re, uuid, threading
+from functools import lru_cache
 from typing import List, Dict, Literal, Any, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 from sqlalchemy.exc import ProgrammingError, OperationalError
-from langchain_core.documents import Document
-from langchain_core.prompts import ChatPromptTemplate
-from langgraph.graph import StateGraph, START, END
 
-from core.ai import retriever, llm, DATA_DIR
+# langchain_core / langgraph are imported on first use (see core.warmup)
+from core.ai import retrieve, get_llm, DATA_DIR
+from utils.langchain_store import scope_filter
 from utils.db import SessionLocal
 from utils.models import User as UserModel, Chat as ChatModel, Message as MessageModel, File as FileModel, Setting
 from repositories import chat_repository as repo
@@ -24,17 +24,26 @@ DEFAULT_AGENT_POLICIES = {
 AGENT_POLICIES_CACHE: Dict[str, Dict[str, Any]] = {k: dict(v) for k, v in DEFAULT_AGENT_POLICIES.items()}
 AGENT_KEYS = list(DEFAULT_AGENT_POLICIES.keys())
 
-ROUTER_PROMPT = ChatPromptTemplate.from_messages([
+# role -> {"tags": [...], "sources": [...]}; overridden by the "retrieval_scopes" setting.
+# Mapped roles always restrict: a user searches the union of their mapped roles' scopes,
+# and roles without an entry add nothing. Only users with no mapped role (and admins)
+# search everything.
+try:
+    DEFAULT_RETRIEVAL_SCOPES: Dict[str, Dict[str, List[str]]] = json.loads(os.getenv("RETRIEVAL_SCOPES", "{}")) or {}
+except json.JSONDecodeError:
+    DEFAULT_RETRIEVAL_SCOPES = {}
+
+PROMPT_MESSAGES = {
+"router": [
     ("system",
      """You are a router. Choose ONE route for the user request.
 Available routes: rag, summarize, code, admin, llm.
 Return strict JSON as {{"route":"rag|summarize|code|admin|llm","reason":"..."}} only.
 """),
     ("human", "{question}")
-])
-
+],
 
-RAG_QA_PROMPT = ChatPromptTemplate.from_messages([
+"rag": [
     ("system",
      """You are a helpful enterprise assistant.
 Answer using only the provided context. If not in the context, say you don't have that information.
@@ -43,17 +52,28 @@ Context:
 {context}
 """),
     ("human", "{question}")
-])
+],
 
-SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+"summary": [
     ("system", "Summarize the following into 5–7 bullet points.\n\nContent:\n{context}"),
     ("human", "Summarize for: {question}")
-])
+],
 
-LLM_FALLBACK_PROMPT = ChatPromptTemplate.from_messages([
+"llm": [
     ("system", "You are a concise assistant."),
     ("human", "{question}")
-])
+],
+
+"sql": [
+    ("system", "Write a single SQLite/DuckDB SELECT query. Only output SQL."),
+    ("human",  "Task: {task}\n\nAvailable views: {views}")
+],
+}
+
+@lru_cache(maxsize=None)
+def _prompt(name: str):
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages(PROMPT_MESSAGES[name])
 
 class GraphState(dict):
     question: str
@@ -63,8 +83,9 @@ class GraphState(dict):
     route: Literal["rag", "summarize", "code", "admin", "llm"]
     context_docs: List[Any]
     answer: str
+    scope_filter: Any
 
-def _format_docs_for_context(docs: List[Document]) -> str:
+def _format_docs_for_context(docs: List[Any]) -> str:
     parts = []
     for i, d in enumerate(docs or []):
         meta = dict(getattr(d, "metadata", {}) or {})
@@ -94,6 +115,26 @@ def _get_agent_policies(db: Session) -> Dict[str, Dict[str, Any]]:
     # No row or error -> sane defaults
     return AGENT_POLICIES_CACHE
 
+def _get_retrieval_scopes(db: Session) -> Dict[str, Dict[str, List[str]]]:
+    try:
+        row = db.query(Setting).filter(Setting.key == "retrieval_scopes").first()
+        if row and isinstance(row.value, dict):
+            return row.value
+    except (ProgrammingError, OperationalError):
+        pass
+    return DEFAULT_RETRIEVAL_SCOPES
+
+def _role_scopes(db: Session, roles: List[str]) -> Optional[List[Dict[str, List[str]]]]:
+    """Scopes of the user's mapped roles (OR-ed), or None for no restriction."""
+    if "admin" in roles:
+        return None
+    scopes = _get_retrieval_scopes(db)
+    mapped = [scopes[r] for r in roles if isinstance(scopes.get(r), dict)]
+    return mapped or None
+
+def _retrieve(state: GraphState) -> List[Any]:
+    return retrieve(state["question"], state.get("scope_filter")) or []
+
 def _user_roles(db: Session, user_id: uuid.UUID) -> List[str]:
     u: UserModel = db.query(UserModel).filter(UserModel.id == user_id).first()
     roles: List[str] = []
@@ -110,7 +151,7 @@ def node_router(state: GraphState) -> GraphState:
     if not _is_allowed("router", policies, roles):
         route = "rag" if _is_allowed("rag", policies, roles) else "llm"
         return {**state, "route": route}
-    out = llm.invoke(ROUTER_PROMPT.format_messages(question=state["question"]))
+    out = get_llm().invoke(_prompt("router").format_messages(question=state["question"]))
     try:
         data = json.loads(out.content.strip().strip("`"))
         route = data.get("route", "rag")
@@ -124,7 +165,8 @@ def node_router(state: GraphState) -> GraphState:
     return {**state, "route": route}
 
 def node_rag(state: GraphState) -> GraphState:
-    raw_docs = retriever.invoke(state["question"]) or []
+    from langchain_core.documents import Document
+    raw_docs = _retrieve(state)
     docs: List[Document] = []
     for d in raw_docs:
         if isinstance(d, Document):
@@ -136,7 +178,7 @@ def node_rag(state: GraphState) -> GraphState:
     if not docs:
         return {**state, "context_docs": [], "answer": "I don’t have that in the knowledge base."}
     context_text = _format_docs_for_context(docs)
-    out = llm.invoke(RAG_QA_PROMPT.format_messages(context=context_text, question=state["question"]))
+    out = get_llm().invoke(_prompt("rag").format_messages(context=context_text, question=state["question"]))
     content = out if isinstance(out, str) else getattr(out, "content", "")
     return {**state, "context_docs": docs, "answer": content}
 
@@ -157,15 +199,12 @@ def _run_duckdb_sql(nl_or_sql: str) -> str:
                 con.execute(f"CREATE VIEW {view} AS SELECT * FROM read_csv_auto('{path}', header=true)")
     sql = nl_or_sql.strip()
     if not sql.upper().startswith("SELECT"):
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "Write a single SQLite/DuckDB SELECT query. Only output SQL."),
-            ("human",  "Task: {task}\n\nAvailable views: {views}")
-        ])
+        prompt = _prompt("sql")
         try:
             views_list = [v for v in con.execute("SHOW TABLES").fetchdf()["name"].tolist()]
         except Exception:
             views_list = []
-        sql = llm.invoke(prompt.format_messages(task=nl_or_sql, views=", ".join(views_list))).content.strip().strip("`")
+        sql = get_llm().invoke(prompt.format_messages(task=nl_or_sql, views=", ".join(views_list))).content.strip().strip("`")
     try:
         df = con.execute(sql).fetchdf()
         if len(df) > 1000:
@@ -175,7 +214,8 @@ def _run_duckdb_sql(nl_or_sql: str) -> str:
         return f"SQL error: {e}"
 
 def node_summarize(state: GraphState) -> GraphState:
-    raw_docs = retriever.invoke(state["question"]) or []
+    from langchain_core.documents import Document
+    raw_docs = _retrieve(state)
     docs: List[Document] = []
     if raw_docs:
         for d in raw_docs:
@@ -188,7 +228,7 @@ def node_summarize(state: GraphState) -> GraphState:
     else:
         docs = [Document(page_content=state["question"], metadata={"source": "input"})]
     context_text = _format_docs_for_context(docs)
-    out = llm.invoke(SUMMARY_PROMPT.format_messages(context=context_text, question=state["question"]))
+    out = get_llm().invoke(_prompt("summary").format_messages(context=context_text, question=state["question"]))
     content = out if isinstance(out, str) else getattr(out, "content", "")
     return {**state, "context_docs": docs, "answer": content}
 
@@ -210,50 +250,66 @@ def node_admin(state: GraphState) -> GraphState:
     return {**state, "answer": ans}
 
 def node_llm(state: GraphState) -> GraphState:
-    out = llm.invoke(LLM_FALLBACK_PROMPT.format_messages(question=state["question"]))
+    out = get_llm().invoke(_prompt("llm").format_messages(question=state["question"]))
     return {**state, "answer": out.content}
 
-# compile graph
-workflow = StateGraph(GraphState)
-workflow.add_node("router", node_router)
-workflow.add_node("rag", node_rag)
-workflow.add_node("summarize", node_summarize)
-workflow.add_node("code", node_code)
-workflow.add_node("admin", node_admin)
-workflow.add_node("llm", node_llm)
-workflow.add_edge(START, "router")
-
 def _route(state: GraphState):
     return state["route"]
 
-workflow.add_conditional_edges("router", _route,
-    {"rag": "rag", "summarize": "summarize", "code": "code", "admin": "admin", "llm": "llm"})
-for r in ["rag", "summarize", "code", "admin", "llm"]:
-    workflow.add_edge(r, END)
+# compiled on first use
+_graph = None
+_graph_lock = threading.Lock()
 
-app_graph = workflow.compile()
+def get_graph():
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                from langgraph.graph import StateGraph, START, END
+                workflow = StateGraph(GraphState)
+                workflow.add_node("router", node_router)
+                workflow.add_node("rag", node_rag)
+                workflow.add_node("summarize", node_summarize)
+                workflow.add_node("code", node_code)
+                workflow.add_node("admin", node_admin)
+                workflow.add_node("llm", node_llm)
+                workflow.add_edge(START, "router")
+                workflow.add_conditional_edges("router", _route,
+                    {"rag": "rag", "summarize": "summarize", "code": "code", "admin": "admin", "llm": "llm"})
+                for r in ["rag", "summarize", "code", "admin", "llm"]:
+                    workflow.add_edge(r, END)
+                _graph = workflow.compile()
+    return _graph
 
 async def init_rag_chain():
-    return {"graph": app_graph, "retriever": retriever}
+    return {"graph": get_graph(), "retriever": retrieve}
 
 # -------- service helpers used by controller --------
 def first_words(s: str, n: int = 8) -> str:
     return " ".join((s or "").strip().split()[:n]) or "New chat"
 
-def ensure_chat_for_user(db: Session, user_id, message: str, chat_id: Optional[str]) -> str:
+def start_turn(db: Session, user_id, message: str, chat_id: Optional[str]) -> str:
+    """
+    Create the chat if needed and store the user message in one transaction (one
+    commit). The assistant message follows via services.chat_writer.
+    """
     if chat_id:
         c = repo.get_chat(db, chat_id)
         if not c or c.user_id != user_id:
             from fastapi import HTTPException
             raise HTTPException(status_code=404, detail="Chat not found")
-        return chat_id
     else:
-        c = repo.create_chat(db, user_id, first_words(message, 8))
-        return str(c.id)
+        c = ChatModel(id=uuid.uuid4(), user_id=user_id, title=first_words(message, 8))
+        db.add(c)
+        db.flush()   # chat row before its first message (no ORM relationship orders them)
+    db.add(MessageModel(chat_id=c.id, sender="user", content=message))
+    db.commit()
+    return str(c.id)
 
-def run_graph_once(db: Session, user_id, message: str) -> str:
+def run_graph_once(db: Session, user_id, message: str, roles: Optional[List[str]] = None,
+                   tags: Optional[List[str]] = None, sources: Optional[List[str]] = None) -> str:
     policies = _get_agent_policies(db)
-    roles = _user_roles(db, user_id)
+    roles = roles or _user_roles(db, user_id)
     init: GraphState = {
         "question": message,
         "user_id": str(user_id),
@@ -262,6 +318,7 @@ def run_graph_once(db: Session, user_id, message: str) -> str:
         "route": "rag",
         "context_docs": [],
         "answer": "",
+        "scope_filter": scope_filter(tags, sources, _role_scopes(db, roles)),
     }
-    result: GraphState = app_graph.invoke(init)
+    result: GraphState = get_graph().invoke(init)
     return result.get("answer", "") or ""
@@ -0,0 +1,180 @@
+# services/chat_writer.py
+"""
+Write-behind persistence of assistant messages.
+
+A /chat/stream turn commits once up front (chat + user message, chat_service.start_turn).
+The assistant message is handed to submit() once it has been streamed; a daemon
+thread writes queued messages in batches, one multi-row INSERT and one commit per
+batch, so under load many turns share a commit (and its WAL flush).
+
+Transient failures are retried CHAT_WRITE_RETRIES times with backoff; a batch that
+still fails, or hits an integrity error (e.g. the chat was deleted mid-turn), is
+written row by row so only the bad rows are lost, and logged. When the queue is
+full, or the writer is not running, the row is written by a small fallback thread
+pool instead of being dropped. submit() never touches the database itself, so it is
+safe to call on the event loop.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from utils.models import Message as MessageModel
+
+log = logging.getLogger(__name__)
+
+# --------------------
+# Config
+# --------------------
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "1").lower() in {"1", "true", "yes"}
+CHAT_WRITE_QUEUE = int(os.getenv("CHAT_WRITE_QUEUE", "10000"))
+CHAT_WRITE_BATCH = int(os.getenv("CHAT_WRITE_BATCH", "200"))
+CHAT_WRITE_LINGER_MS = int(os.getenv("CHAT_WRITE_LINGER_MS", "20"))   # wait this long for more rows to batch
+CHAT_WRITE_RETRIES = int(os.getenv("CHAT_WRITE_RETRIES", "5"))
+CHAT_WRITE_FALLBACK_THREADS = int(os.getenv("CHAT_WRITE_FALLBACK_THREADS", "4"))
+CHAT_WRITE_SHUTDOWN_SECONDS = float(os.getenv("CHAT_WRITE_SHUTDOWN_SECONDS", "15"))  # wait for the writer at exit
+
+_STOP: Dict[str, Any] = {}   # queue sentinel: write what you hold and exit
+
+_queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max(CHAT_WRITE_QUEUE, 1))
+_stats: Dict[str, int] = {"queued": 0, "inline": 0, "written": 0, "retries": 0, "failed": 0}
+_stats_lock = threading.Lock()   # updated from request threads, the writer and the fallback pool
+_thread: Optional[threading.Thread] = None
+_fallback: Optional[ThreadPoolExecutor] = None
+_fallback_lock = threading.Lock()
+
+
+def _count(key: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[key] += n
+
+
+def stats() -> Dict[str, int]:
+    with _stats_lock:
+        return {**_stats, "pending": _queue.qsize()}
+
+
+def _insert(rows: List[Dict[str, Any]]) -> None:
+    from utils.db import SessionLocal
+    db = SessionLocal()
+    try:
+        db.execute(insert(MessageModel), rows)   # executemany -> multi-row INSERT
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _write(rows: List[Dict[str, Any]]) -> None:
+    for attempt in range(CHAT_WRITE_RETRIES + 1):
+        try:
+            _insert(rows)
+            _count("written", len(rows))
+            return
+        except IntegrityError:
+            break   # not transient
+        except Exception:
+            if attempt == CHAT_WRITE_RETRIES:
+                break
+            _count("retries")
+            log.warning("assistant message write failed (attempt %d), retrying", attempt + 1, exc_info=True)
+            time.sleep(min(0.2 * 2 ** attempt, 5.0))
+    # isolate the rows that cannot be written
+    for row in rows:
+        try:
+            _insert([row])
+            _count("written")
+        except Exception:
+            _count("failed")
+            log.exception("dropping assistant message for chat %s", row.get("chat_id"))
+
+
+def submit(chat_id, content: str, created_at: datetime, metrics: Optional[Dict[str, Any]] = None) -> None:
+    """Persist an assistant message, normally in the background. created_at is when it was produced."""
+    row = {"chat_id": chat_id, "sender": "assistant", "content": content, "created_at": created_at, "metrics": metrics}
+    if _thread is not None and _thread.is_alive():
+        try:
+            _queue.put_nowait(row)
+            _count("queued")
+            return
+        except queue.Full:
+            pass
+    # off the caller's thread: _write retries with time.sleep
+    global _fallback
+    with _fallback_lock:
+        if _fallback is None:
+            _fallback = ThreadPoolExecutor(max_workers=max(CHAT_WRITE_FALLBACK_THREADS, 1),
+                                           thread_name_prefix="chat-writer-fallback")
+        _fallback.submit(_write, [row])
+    _count("inline")
+
+
+def _loop() -> None:
+    stopping = False
+    while not stopping:
+        first = _queue.get()
+        if first is _STOP:
+            return
+        batch = [first]
+        deadline = time.monotonic() + CHAT_WRITE_LINGER_MS / 1000.0
+        while len(batch) < CHAT_WRITE_BATCH:
+            try:
+                row = _queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if row is _STOP:
+                stopping = True
+                break
+            batch.append(row)
+        _write(batch)
+
+
+def flush() -> int:
+    """
+    Shutdown: stop the writer after the batch it holds (waiting up to
+    CHAT_WRITE_SHUTDOWN_SECONDS), wait for fallback writes, then write whatever is
+    still queued. Returns the rows written here.
+    """
+    global _fallback
+    if _thread is not None and _thread.is_alive():
+        try:
+            _queue.put(_STOP, timeout=CHAT_WRITE_SHUTDOWN_SECONDS)
+        except queue.Full:
+            pass
+        _thread.join(CHAT_WRITE_SHUTDOWN_SECONDS)
+        if _thread.is_alive():
+            log.warning("chat writer still busy after %.0fs; its current batch may be lost", CHAT_WRITE_SHUTDOWN_SECONDS)
+    with _fallback_lock:
+        pool, _fallback = _fallback, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+    rows = []
+    while True:
+        try:
+            row = _queue.get_nowait()
+        except queue.Empty:
+            break
+        if row is not _STOP:
+            rows.append(row)
+    for i in range(0, len(rows), CHAT_WRITE_BATCH):
+        _write(rows[i:i + CHAT_WRITE_BATCH])
+    return len(rows)
+
+
+def start_background() -> Optional[threading.Thread]:
+    global _thread
+    if not CHAT_WRITE_BEHIND:
+        return None
+    if _thread is None or not _thread.is_alive():
+        _thread = threading.Thread(target=_loop, name="chat-writer", daemon=True)
+        _thread.start()
+    return _thread
@@ -1,61 +1,78 @@
-import os, hashlib, shutil
+import os, hashlib, time, uuid, logging, threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Dict, Any
 from pathlib import Path
 from datetime import datetime
 from fastapi import UploadFile, HTTPException
 from sqlalchemy.orm import Session
 
-from utils.models import Document
+from utils.models import Document, ReindexRun
 from repositories import docs_repository as repo
-from utils.utils_text import extract_text, chunk_text  # keep original paths if yours differ
-from utils.langchain_store import upsert_document, delete_document  # keep original paths
+from utils import chunking
+from utils.langchain_store import upsert_document, delete_document, sync_document, clone_document  # keep original paths
+from utils import blob_store, text_sidecar
 
-STORAGE_DIR = Path(os.getenv("DOCS_STORAGE_DIR", "storage/docs"))
-STORAGE_DIR.mkdir(parents=True, exist_ok=True)
 ALLOWED_EXTS = {".pdf", ".docx", ".txt", ".md"}
+REINDEX_CONCURRENCY = int(os.getenv("REINDEX_CONCURRENCY", "4"))
+REINDEX_PROGRESS_SECONDS = float(os.getenv("REINDEX_PROGRESS_SECONDS", "2"))  # reindex_runs update interval
 
-def _sha256_fileobj(fp) -> str:
-    h = hashlib.sha256()
-    for chunk in iter(lambda: fp.read(1024 * 1024), b""):
-        h.update(chunk)
-    return h.hexdigest()
+log = logging.getLogger(__name__)
 
-async def upload_docs(db: Session, files: List[UploadFile], source: Optional[str], tags: Optional[str], user) -> Dict[str, Any]:
+def _release_storage(db: Session, content_hash: str, storage_path: str) -> None:
+    """
+    Drop stored bytes once nothing references them. Blobs and text sidecars are shared
+    by every documents row with the same content_hash; legacy per-document files are not.
+    Counts and unlinks under the hash's lock; the caller's commit/rollback releases it.
+    """
+    repo.lock_content_hash(db, content_hash)
+    unreferenced = repo.count_by_hash(db, content_hash) == 0
+    if unreferenced:
+        text_sidecar.remove(content_hash)
+    if blob_store.is_blob(storage_path):
+        if unreferenced:
+            blob_store.remove(content_hash)
+    else:
+        Path(storage_path).unlink(missing_ok=True)
+
+def _restore_blob(uf: UploadFile, content_hash: str, dest_path) -> bool:
+    """Store the upload again if a delete of the same bytes unlinked its blob. True if it did."""
+    if not blob_store.is_blob(str(dest_path)) or blob_store.exists(content_hash):
+        return False
+    uf.file.seek(0)
+    blob_store.put_stream(uf.file)
+    return True
+
+def _profile_or_400(name: Optional[str], source: Optional[str]) -> str:
+    try:
+        return chunking.resolve_profile(name, source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def upload_docs(db: Session, files: List[UploadFile], source: Optional[str], tags: Optional[str], user,
+                      chunk_profile: Optional[str] = None) -> Dict[str, Any]:
     tags_list = [t.strip() for t in (tags or "").split(",") if t.strip()] or None
+    profile = _profile_or_400(chunk_profile, source)
+    created: List[Document] = []
 
     for uf in files:
         ext = Path(uf.filename).suffix.lower()
         if ext not in ALLOWED_EXTS:
             raise HTTPException(status_code=400, detail=f"Unsupported file type: {ext}")
 
+        # Single pass: hash while writing into the content-addressed store
         uf.file.seek(0)
-        content_hash = _sha256_fileobj(uf.file)
-        uf.file.seek(0)
-
-        doc_id = hashlib.md5((uf.filename + content_hash).encode()).hexdigest()
-        safe_name = f"{doc_id}{ext}"
-        dest_path = STORAGE_DIR / safe_name
-
         try:
-            with dest_path.open("wb") as out:
-                shutil.copyfileobj(uf.file, out)
+            content_hash, size_bytes, dest_path = blob_store.put_stream(uf.file)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to save file: {e}")
 
-        size_bytes = dest_path.stat().st_size
+        doc_id = hashlib.md5((uf.filename + content_hash).encode()).hexdigest()
 
-        # Extract & chunk
-        try:
-            text = extract_text(str(dest_path))
-            chunks = chunk_text(text)
-            if not chunks:
-                dest_path.unlink(missing_ok=True)
-                raise HTTPException(status_code=400, detail=f"No extractable text in {uf.filename}")
-        except HTTPException:
-            raise
-        except Exception as e:
-            dest_path.unlink(missing_ok=True)
-            raise HTTPException(status_code=400, detail=f"Failed to process {uf.filename}: {e}")
+        # Same filename + same bytes: already indexed, nothing to do
+        existing = repo.get(db, doc_id)
+        if existing:
+            created.append(existing)
+            continue
 
         metadata = {
             "filename": uf.filename,
@@ -66,35 +83,85 @@ async def upload_docs(db: Session, files: List[UploadFile], source: Optional[str
                             or (user.get("id") if isinstance(user, dict) else None) or "anonymous"),
             "uploaded_at": datetime.utcnow().isoformat(),
             "content_hash": content_hash,
+            "chunk_profile": profile,
         }
+
+        # Identical bytes under another name, chunked the same way: reuse the twin's vectors,
+        # skip extraction/embedding. Rows without a profile predate profiles ("legacy").
+        twin = repo.find_by_hash(db, content_hash)
+        twin_id = twin.id if twin is not None and (twin.chunk_profile or "legacy") == profile else None
+        db.commit()  # no transaction left open across extraction/embedding
         try:
-            upsert_document(doc_id, chunks, metadata)
+            reused = twin_id is not None and clone_document(twin_id, doc_id, metadata) > 0
+            if not reused:
+                try:
+                    try:
+                        text = text_sidecar.load_text(content_hash, str(dest_path), ext)
+                    except Exception:
+                        # the blob may have been unlinked under us by a delete of the same bytes
+                        if not _restore_blob(uf, content_hash, dest_path):
+                            raise
+                        text = text_sidecar.load_text(content_hash, str(dest_path), ext)
+                    chunks = chunking.chunk(text, profile)
+                except Exception as e:
+                    raise HTTPException(status_code=400, detail=f"Failed to process {uf.filename}: {e}")
+                if not chunks:
+                    raise HTTPException(status_code=400, detail=f"No extractable text in {uf.filename}")
+                upsert_document(doc_id, chunks, metadata)
+        except HTTPException:
+            _release_storage(db, content_hash, str(dest_path))
+            raise
         except Exception as e:
-            dest_path.unlink(missing_ok=True)
+            _release_storage(db, content_hash, str(dest_path))
             raise HTTPException(status_code=500, detail=f"Indexing error: {e}")
 
+        # Extraction and embedding ran unlocked. The lock is held from here until the row is
+        # committed, so a delete of the same bytes cannot count references and unlink in
+        # between; one that got it first may have unlinked the blob: store it again.
         try:
-            repo.insert_document(db, Document(
+            repo.lock_content_hash(db, content_hash)
+            _restore_blob(uf, content_hash, dest_path)
+            # a concurrent upload of the same file committed first (same doc_id, same vectors)
+            existing = repo.get(db, doc_id)
+            if existing:
+                db.commit()
+                created.append(existing)
+                continue
+            doc = Document(
                 id=doc_id, filename=uf.filename, ext=ext, size_bytes=size_bytes,
                 content_hash=content_hash, storage_path=str(dest_path),
                 source=source, tags=tags_list, uploaded_by=metadata["uploaded_by"],
-                status="ready",
-            ))
+                status="ready", chunk_profile=profile,
+            )
+            repo.insert_document(db, doc)
+            db.commit()  # the reference is visible; releases the hash lock
+            created.append(doc)
         except Exception as e:
+            db.rollback()
             try:
                 delete_document(doc_id)
             except Exception:
                 pass
-            dest_path.unlink(missing_ok=True)
+            _release_storage(db, content_hash, str(dest_path))
             raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
     db.commit()
+    return {"created": created}
 
-    items = repo.list_recent(db, count=len(files))
-    return {"created": items}
-
-def list_docs(db: Session, q: Optional[str], tag: Optional[str], skip: int, limit: int):
-    return repo.list_docs(db, q, tag, skip, limit)
+def list_docs(
+    db: Session,
+    q: Optional[str],
+    tag: Optional[str],
+    skip: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    total: str = "exact",
+):
+    try:
+        return repo.list_docs(db, q, tag, skip, limit, cursor=cursor, total=total)
+    except ValueError as e:
+        from fastapi import HTTPException
+        raise HTTPException(status_code=400, detail=str(e))
 
 def delete_doc(db: Session, doc_id: str):
     doc = repo.get(db, doc_id)
@@ -106,40 +173,145 @@ def delete_doc(db: Session, doc_id: str):
     except Exception as e:
         from fastapi import HTTPException
         raise HTTPException(status_code=500, detail=f"Failed to delete from vector DB: {e}")
-    Path(doc.storage_path).unlink(missing_ok=True)
     repo.delete(db, doc)
+    db.flush()
+    _release_storage(db, doc.content_hash, doc.storage_path)
     db.commit()
     return {"ok": True}
 
-def reindex_doc(db: Session, doc_id: str):
+def _doc_metadata(doc: Document, profile: str) -> Dict[str, Any]:
+    return {
+        "filename": doc.filename,
+        "ext": doc.ext,
+        "source": doc.source,
+        "tags": doc.tags,
+        "uploaded_by": doc.uploaded_by,
+        "uploaded_at": doc.uploaded_at.isoformat() if hasattr(doc.uploaded_at, "isoformat") else str(doc.uploaded_at),
+        "content_hash": doc.content_hash,
+        "chunk_profile": profile,
+    }
+
+def _reindex_job(doc: Document, profile_override: Optional[str]) -> tuple:
+    # Plain values only, so worker threads never touch the session.
+    # Reindexing without an override keeps the document's profile; rows without one
+    # predate profiles and stay "legacy" (as in the twin check and tools/reembed.py).
+    profile = profile_override or doc.chunk_profile or "legacy"
+    return doc.id, doc.storage_path, doc.filename, _doc_metadata(doc, profile)
+
+def _reindex(doc_id: str, storage_path: str, filename: str, metadata: Dict[str, Any]) -> Dict[str, int]:
+    # Sidecar hit after the first extraction, so reindexing never re-parses the original
+    text = text_sidecar.load_text(metadata["content_hash"], storage_path, metadata.get("ext"))
+    chunks = chunking.chunk(text, metadata["chunk_profile"])
+    if not chunks:
+        raise HTTPException(status_code=400, detail=f"No extractable text in {filename}")
+    return sync_document(doc_id, chunks, metadata)
+
+def reindex_doc(db: Session, doc_id: str, chunk_profile: Optional[str] = None):
     doc = repo.get(db, doc_id)
     if not doc:
-        from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="Document not found")
+    if chunk_profile:
+        _profile_or_400(chunk_profile, None)
     try:
-        text = extract_text(doc.storage_path)
-        chunks = chunk_text(text)
-        if not chunks:
-            from fastapi import HTTPException
-            raise HTTPException(status_code=400, detail=f"No extractable text in {doc.filename}")
-        delete_document(doc_id)
-        upsert_document(doc_id, chunks, {
-            "filename": doc.filename,
-            "ext": doc.ext,
-            "source": doc.source,
-            "tags": doc.tags,
-            "uploaded_by": doc.uploaded_by,
-            "uploaded_at": doc.uploaded_at.isoformat() if hasattr(doc.uploaded_at, "isoformat") else str(doc.uploaded_at),
-            "content_hash": doc.content_hash,
-        })
-        return {"ok": True}
+        job = _reindex_job(doc, chunk_profile)
+        stats = _reindex(*job)
+    except HTTPException:
+        raise
     except Exception as e:
-        from fastapi import HTTPException
         raise HTTPException(status_code=500, detail=f"Reindex error: {e}")
+    doc.chunk_profile = job[3]["chunk_profile"]
+    db.commit()
+    return {"ok": True, "chunk_profile": doc.chunk_profile, **stats}
+
+def _run_out(run: ReindexRun) -> Dict[str, Any]:
+    return {
+        "id": str(run.id), "status": run.status, "ok": run.status == "done" and not run.failed,
+        "chunk_profile": run.chunk_profile, "documents": run.documents, "processed": run.processed,
+        "failed": run.failed or [], **(run.totals or {}), "error": run.error,
+        "started_at": run.started_at, "updated_at": run.updated_at, "finished_at": run.finished_at,
+    }
+
+def _reindex_one(job: tuple) -> tuple:
+    try:
+        return job[0], _reindex(*job), None
+    except HTTPException as e:
+        return job[0], None, str(e.detail)
+    except Exception as e:
+        return job[0], None, str(e)
+
+def _run_reindex(run_id, jobs: List[tuple], workers: int) -> None:
+    """Background thread of one reindex_all run; progress (and profiles) saved every REINDEX_PROGRESS_SECONDS."""
+    from sqlalchemy import func
+    from utils.db import SessionLocal
+    db = SessionLocal()
+    totals = {"upserted": 0, "payload_updated": 0, "deleted": 0, "unchanged": 0}
+    failed: List[Dict[str, str]] = []
+    synced: Dict[str, str] = {}
+    processed = 0
+
+    def save(**extra):
+        repo.set_chunk_profiles(db, synced)
+        synced.clear()
+        db.query(ReindexRun).filter(ReindexRun.id == run_id).update(
+            {"processed": processed, "totals": dict(totals), "failed": list(failed), **extra},
+            synchronize_session=False,
+        )
+        db.commit()
+
+    try:
+        last = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for job, (doc_id, stats, err) in zip(jobs, pool.map(_reindex_one, jobs)):
+                processed += 1
+                if err is not None:
+                    failed.append({"id": doc_id, "error": err})
+                else:
+                    synced[doc_id] = job[3]["chunk_profile"]
+                    for k in totals:
+                        totals[k] += stats.get(k, 0)
+                if time.monotonic() - last >= REINDEX_PROGRESS_SECONDS:
+                    save()
+                    last = time.monotonic()
+        save(status="done", finished_at=func.now())
+    except Exception as e:
+        db.rollback()
+        log.exception("reindex run %s failed", run_id)
+        try:
+            save(status="error", error=str(e), finished_at=func.now())
+        except Exception:
+            db.rollback()
+    finally:
+        db.close()
+
+def reindex_all(db: Session, concurrency: Optional[int] = None, chunk_profile: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Start incrementally reindexing every document in a background thread, with at most
+    `concurrency` documents in flight, and return the run; poll reindex_status(run id).
+    Each document stays searchable while it is being synced. With `chunk_profile`
+    the whole corpus is re-chunked with that profile.
+    """
+    if chunk_profile:
+        _profile_or_400(chunk_profile, None)
+    jobs = [_reindex_job(d, chunk_profile) for d in repo.list_all(db)]
+    workers = max(1, min(int(concurrency or REINDEX_CONCURRENCY), 32))
+    run = ReindexRun(id=uuid.uuid4(), status="running", chunk_profile=chunk_profile, documents=len(jobs))
+    db.add(run)
+    db.commit()
+    threading.Thread(target=_run_reindex, args=(run.id, jobs, workers), name="reindex-all", daemon=True).start()
+    return _run_out(run)
+
+def reindex_status(db: Session, run_id: str) -> Dict[str, Any]:
+    try:
+        run = db.get(ReindexRun, uuid.UUID(run_id))
+    except ValueError:
+        run = None
+    if run is None:
+        raise HTTPException(status_code=404, detail="Reindex run not found")
+    return _run_out(run)
 
 def download_path(db: Session, doc_id: str):
     doc = repo.get(db, doc_id)
     if not doc:
         from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="Document not found")
-    return doc.storage_path, doc.filename
+    return doc.storage_path, doc.filename, doc.content_hash
@@ -0,0 +1,204 @@
+# services/latency_service.py
+"""
+Request latency as mergeable sketches (utils/latency_sketch.py) in latency_buckets.
+
+Each worker records into in-process per-minute sketches (core/latency.py) and
+writes them here once the minute is closed. Three series are kept per minute:
+
+    (route, ALL_USERS)   per route
+    ('*',   user_id)     per authenticated user
+    ('*',   ALL_USERS)   everything
+
+Minute rows older than LATENCY_MINUTE_RETENTION_HOURS are compacted into hour rows.
+Any range is answered by merging the rows inside it, so the cost depends on the
+range and resolution, never on the number of requests.
+"""
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from utils.latency_sketch import LatencySketch
+from utils.models import LatencyBucket
+
+# --------------------
+# Config
+# --------------------
+LATENCY_MINUTE_RETENTION_HOURS = int(os.getenv("LATENCY_MINUTE_RETENTION_HOURS", "48"))
+LATENCY_RETENTION_DAYS = int(os.getenv("LATENCY_RETENTION_DAYS", "180"))
+
+ALL_ROUTES = "*"
+ALL_USERS = uuid.UUID(int=0)
+MINUTE, HOUR = "m", "h"
+_LOCK_KEY = 0x6C617463  # pg advisory lock: one compactor across workers
+
+Key = Tuple[str, datetime, str, uuid.UUID]  # (granularity, bucket_start, route, user_id)
+
+
+# --------------------
+# Writes
+# --------------------
+def merge_into(db: Session, entries: Dict[Key, Tuple[LatencySketch, int]]) -> int:
+    """
+    Add sketches (and error counts) to their rows, creating missing ones. Concurrent
+    writers are safe: new keys are inserted with ON CONFLICT DO NOTHING and whatever
+    already existed is locked and merged. Caller commits.
+    """
+    if not entries:
+        return 0
+    keys = sorted(entries)   # insert and lock in one global key order (see below)
+    stmt = pg_insert(LatencyBucket).values([
+        {"granularity": g, "bucket_start": b, "route": r, "user_id": u,
+         "count": entries[(g, b, r, u)][0].count, "errors": entries[(g, b, r, u)][1],
+         "sketch": entries[(g, b, r, u)][0].to_dict()}
+        for g, b, r, u in keys
+    ]).on_conflict_do_nothing().returning(
+        LatencyBucket.granularity, LatencyBucket.bucket_start, LatencyBucket.route, LatencyBucket.user_id
+    )
+    inserted = {tuple(r) for r in db.execute(stmt)}
+    existing = [k for k in keys if k not in inserted]
+    if existing:
+        cols = tuple_(LatencyBucket.granularity, LatencyBucket.bucket_start, LatencyBucket.route, LatencyBucket.user_id)
+        # same lock order in every worker: they all flush overlapping keys at the minute boundary
+        rows = (
+            db.query(LatencyBucket).filter(cols.in_(existing))
+            .order_by(LatencyBucket.granularity, LatencyBucket.bucket_start, LatencyBucket.route, LatencyBucket.user_id)
+            .with_for_update().all()
+        )
+        for row in rows:
+            sketch, errors = entries[(row.granularity, row.bucket_start, row.route, row.user_id)]
+            row.sketch = LatencySketch.from_dict(row.sketch).merge(sketch).to_dict()
+            row.count = (row.count or 0) + sketch.count
+            row.errors = (row.errors or 0) + errors
+        db.flush()
+    return len(keys)
+
+
+def compact(db: Session, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Fold minute rows older than LATENCY_MINUTE_RETENTION_HOURS into hour rows and drop
+    hour rows past LATENCY_RETENTION_DAYS, in one transaction. Skips if another
+    worker is already compacting.
+    """
+    if not db.execute(text("SELECT pg_try_advisory_xact_lock(:k)"), {"k": _LOCK_KEY}).scalar():
+        db.rollback()
+        return {"skipped": "another compaction is running"}
+    now = now or datetime.now(timezone.utc)
+    cutoff = (now - timedelta(hours=LATENCY_MINUTE_RETENTION_HOURS)).replace(minute=0, second=0, microsecond=0)
+    old = db.query(LatencyBucket).filter(
+        LatencyBucket.granularity == MINUTE, LatencyBucket.bucket_start < cutoff
+    ).all()
+    hours: Dict[Key, Tuple[LatencySketch, int]] = {}
+    for row in old:
+        key = (HOUR, row.bucket_start.replace(minute=0, second=0, microsecond=0), row.route, row.user_id)
+        sketch, errors = hours.get(key) or (LatencySketch(), 0)
+        hours[key] = (sketch.merge(LatencySketch.from_dict(row.sketch)), errors + (row.errors or 0))
+    merge_into(db, hours)
+    db.query(LatencyBucket).filter(
+        LatencyBucket.granularity == MINUTE, LatencyBucket.bucket_start < cutoff
+    ).delete(synchronize_session=False)
+    expired = db.query(LatencyBucket).filter(
+        LatencyBucket.granularity == HOUR,
+        LatencyBucket.bucket_start < now - timedelta(days=LATENCY_RETENTION_DAYS),
+    ).delete(synchronize_session=False)
+    db.commit()
+    return {"minute_rows": len(old), "hour_rows": len(hours), "expired": expired}
+
+
+# --------------------
+# Reads
+# --------------------
+def _range(start: Optional[datetime], end: Optional[datetime], hours: int) -> Tuple[datetime, datetime]:
+    # naive datetimes from query strings are taken as UTC
+    end = end or datetime.now(timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    start = start or end - timedelta(hours=max(int(hours or 0), 1))
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise ValueError("start must be before end")
+    return start, end
+
+
+def _rows(db: Session, start: datetime, end: datetime, route: Optional[str], user_id: Optional[uuid.UUID]):
+    if route and route != ALL_ROUTES and user_id:
+        raise ValueError("Latency is kept per route or per user, not per route and user")
+    # Minute rows not yet compacted plus hour rows: a compacted hour is either wholly in
+    # the range or not, so old data resolves to the hour.
+    return db.query(LatencyBucket).filter(
+        LatencyBucket.bucket_start >= start, LatencyBucket.bucket_start < end,
+        LatencyBucket.route == (route or ALL_ROUTES),
+        LatencyBucket.user_id == (user_id or ALL_USERS),
+    ).all()
+
+
+def _summary(sketch: LatencySketch, errors: int) -> Dict[str, Any]:
+    return {**sketch.summary(), "errors": errors, "error_rate": (errors / sketch.count) if sketch.count else None}
+
+
+def summary(
+    db: Session,
+    route: Optional[str] = None,
+    user_id: Optional[uuid.UUID] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    hours: int = 24,
+) -> Dict[str, Any]:
+    """count, mean, p50/p95/p99 and errors over the range, for one route and/or user (default: everything)."""
+    start, end = _range(start, end, hours)
+    sketch, errors = LatencySketch(), 0
+    for row in _rows(db, start, end, route, user_id):
+        sketch.merge(LatencySketch.from_dict(row.sketch))
+        errors += row.errors or 0
+    return {"start": start, "end": end, "route": route or ALL_ROUTES, "user_id": user_id, **_summary(sketch, errors)}
+
+
+def by_route(
+    db: Session,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    hours: int = 24,
+) -> List[Dict[str, Any]]:
+    """One summary per route over the range, slowest p95 first."""
+    start, end = _range(start, end, hours)
+    merged: Dict[str, List[Any]] = {}
+    q = db.query(LatencyBucket).filter(
+        LatencyBucket.bucket_start >= start, LatencyBucket.bucket_start < end,
+        LatencyBucket.user_id == ALL_USERS, LatencyBucket.route != ALL_ROUTES,
+    )
+    for row in q.all():
+        acc = merged.setdefault(row.route, [LatencySketch(), 0])
+        acc[0].merge(LatencySketch.from_dict(row.sketch))
+        acc[1] += row.errors or 0
+    out = [{"route": r, **_summary(s, e)} for r, (s, e) in merged.items()]
+    out.sort(key=lambda d: -(d["p95_ms"] or 0))
+    return out
+
+
+def series(
+    db: Session,
+    route: Optional[str] = None,
+    user_id: Optional[uuid.UUID] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    hours: int = 24,
+    step_minutes: int = 60,
+) -> List[Dict[str, Any]]:
+    """Summaries per `step_minutes` bucket (aligned to the epoch); empty buckets are omitted."""
+    start, end = _range(start, end, hours)
+    step = max(int(step_minutes or 0), 1) * 60
+    merged: Dict[int, List[Any]] = {}
+    for row in _rows(db, start, end, route, user_id):
+        slot = int(row.bucket_start.timestamp()) // step * step
+        acc = merged.setdefault(slot, [LatencySketch(), 0])
+        acc[0].merge(LatencySketch.from_dict(row.sketch))
+        acc[1] += row.errors or 0
+    return [
+        {"start": datetime.fromtimestamp(slot, timezone.utc), **_summary(s, e)}
+        for slot, (s, e) in sorted(merged.items())
+    ]
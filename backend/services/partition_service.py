@@ -0,0 +1,280 @@
+# services/partition_service.py
+"""
+Monthly range partitions for the log tables (migrations/007).
+
+    activities    partitioned on occurred_at, kept LOG_RETENTION_MONTHS
+    request_logs  partitioned on created_at,  kept REQUEST_LOG_RETENTION_MONTHS
+
+Partitions are <table>_pYYYYMM and hold one UTC month. maintain() creates the next
+PARTITION_PREMAKE_MONTHS months and retires every partition whose whole month is
+past retention, by DROP (default) or DETACH (the table stays, for archiving),
+so expiring data never deletes rows, bloats or needs a long vacuum.
+
+Every DDL step runs in its own short transaction under PARTITION_LOCK_TIMEOUT_MS
+(a step that times out is retried on the next run), so the lock it needs is not
+held across the whole run. Partitions are detached CONCURRENTLY where Postgres
+allows it (not while the table has a default partition). Rows of a month that
+landed in <table>_default before its partition existed are moved into it.
+"""
+import os
+import re
+import time
+import logging
+import threading
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+log = logging.getLogger(__name__)
+
+# --------------------
+# Config
+# --------------------
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", "3"))
+PARTITION_RETENTION_MODE = os.getenv("PARTITION_RETENTION_MODE", "drop").lower()  # drop | detach
+PARTITION_MAINTENANCE_SECONDS = int(os.getenv("PARTITION_MAINTENANCE_SECONDS", "21600"))  # 0 = cron only
+PARTITION_LOCK_TIMEOUT_MS = int(os.getenv("PARTITION_LOCK_TIMEOUT_MS", "5000"))  # per DDL step
+
+# table -> retention in months (0 = keep everything)
+TABLES: Dict[str, int] = {
+    "activities": int(os.getenv("LOG_RETENTION_MONTHS", "12")),
+    "request_logs": int(os.getenv("REQUEST_LOG_RETENTION_MONTHS", "3")),
+}
+# table -> partition key
+COLUMNS: Dict[str, str] = {"activities": "occurred_at", "request_logs": "created_at"}
+
+_LOCK_KEY = 0x70617274  # pg advisory lock: one maintainer across workers
+_NAME = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def _add_months(d: date, n: int) -> date:
+    y, m = divmod(d.year * 12 + d.month - 1 + n, 12)
+    return date(y, m + 1, 1)
+
+
+def _this_month() -> date:
+    return datetime.now(timezone.utc).date().replace(day=1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def _bound(month: date) -> str:
+    return f"{month.isoformat()} 00:00:00+00"
+
+
+def is_partitioned(db: Session, table: str) -> bool:
+    kind = db.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}).scalar()
+    return kind == "p"
+
+
+def partitions(db: Session, table: str) -> List[Dict[str, Any]]:
+    """Monthly partitions of `table`, oldest first: name, month, estimated rows."""
+    rows = db.execute(text("""
+        SELECT c.relname, c.reltuples::bigint AS rows
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table AS regclass)
+    """), {"table": table}).fetchall()
+    out = []
+    for name, rows_est in rows:
+        m = _NAME.search(name)
+        if m:
+            out.append({"name": name, "month": date(int(m.group(1)), int(m.group(2)), 1), "rows": max(rows_est, 0)})
+    return sorted(out, key=lambda p: p["month"])
+
+
+def has_default(db: Session, table: str) -> bool:
+    return bool(db.execute(
+        text("SELECT partdefid <> 0 FROM pg_partitioned_table WHERE partrelid = CAST(:table AS regclass)"),
+        {"table": table},
+    ).scalar())
+
+
+def default_rows(db: Session, table: str) -> int:
+    """Rows that fell into <table>_default (outside every monthly partition); should be 0."""
+    return db.execute(text(f'SELECT count(*) FROM "{table}_default"')).scalar() or 0
+
+
+def _create_partition(conn: Connection, table: str, month: date) -> int:
+    """
+    Create one month's partition in its own transaction; returns the rows moved into it.
+    Postgres refuses a partition whose range matches rows in the default partition, so
+    those are taken out of <table>_default first and re-inserted through the parent.
+    """
+    name = partition_name(table, month)
+    col = COLUMNS[table]
+    in_range = f""""{col}" >= '{_bound(month)}' AND "{col}" < '{_bound(_add_months(month, 1))}'"""
+    moved = 0
+    if has_default(conn, table):
+        if conn.execute(text(f'SELECT EXISTS (SELECT 1 FROM "{table}_default" WHERE {in_range})')).scalar():
+            # CREATE ... PARTITION OF takes this lock anyway; taking it first keeps new strays out
+            conn.execute(text(f'LOCK TABLE "{table}_default" IN ACCESS EXCLUSIVE MODE'))
+            conn.execute(text(f'CREATE TEMP TABLE _moved ON COMMIT DROP AS SELECT * FROM "{table}_default" WHERE {in_range}'))
+            moved = conn.execute(text(f'DELETE FROM "{table}_default" WHERE {in_range}')).rowcount
+    conn.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+        f"FOR VALUES FROM ('{_bound(month)}') TO ('{_bound(_add_months(month, 1))}')"
+    ))
+    if moved:
+        conn.execute(text(f'INSERT INTO "{table}" SELECT * FROM _moved'))
+    conn.commit()
+    return moved
+
+
+def ensure_partitions(conn: Connection, table: str, ahead: int = PARTITION_PREMAKE_MONTHS) -> Dict[str, Any]:
+    """Create this month's and the next `ahead` months' partitions, one transaction each."""
+    have = {p["month"] for p in partitions(conn, table)}
+    conn.commit()
+    created, moved = [], 0
+    for i in range(ahead + 1):
+        month = _add_months(_this_month(), i)
+        if month not in have:
+            moved += _create_partition(conn, table, month)
+            created.append(partition_name(table, month))
+    return {"created": created, "moved": moved}
+
+
+def expired_partitions(db: Session, table: str, keep_months: int) -> List[str]:
+    """Partitions whose month ended more than `keep_months` months ago."""
+    if keep_months <= 0:
+        return []
+    oldest_kept = _add_months(_this_month(), -keep_months)
+    return [p["name"] for p in partitions(db, table) if p["month"] < oldest_kept]
+
+
+def _autocommit(conn: Connection, sql: str) -> None:
+    """Run a statement Postgres refuses inside a transaction block."""
+    conn.execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        conn.execute(text(sql))
+    finally:
+        conn.rollback()   # ends SQLAlchemy's transaction; nothing to undo in autocommit
+        conn.execution_options(isolation_level=conn.default_isolation_level)
+
+
+def retire(conn: Connection, table: str, name: str, mode: str = PARTITION_RETENTION_MODE) -> None:
+    """
+    Detach a partition and, unless mode is 'detach', drop it; each step commits on its own.
+    DETACH CONCURRENTLY never takes ACCESS EXCLUSIVE on the table, but Postgres only allows
+    it outside a transaction block and when the table has no default partition; otherwise
+    a plain DETACH holds that lock for its own short transaction only. One interrupted
+    earlier (left pending) is finalized.
+    """
+    pending = conn.execute(
+        text("SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = CAST(:name AS regclass)"), {"name": name}
+    ).scalar()
+    concurrently = not has_default(conn, table)
+    conn.commit()
+    detach = f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'
+    if pending:
+        _autocommit(conn, detach + " FINALIZE")
+    elif concurrently:
+        _autocommit(conn, detach + " CONCURRENTLY")
+    else:
+        conn.execute(text(detach))
+        conn.commit()
+    if mode != "detach":
+        conn.execute(text(f'DROP TABLE "{name}"'))
+        conn.commit()
+
+
+def _maintain_table(conn: Connection, table: str, keep: int) -> Dict[str, Any]:
+    if not is_partitioned(conn, table):
+        conn.commit()
+        return {"skipped": "not partitioned (apply migrations/007)"}
+    out = {**ensure_partitions(conn, table), "retired": [], "failed": [], "mode": PARTITION_RETENTION_MODE}
+    expired = expired_partitions(conn, table, keep)
+    conn.commit()
+    for name in expired:
+        try:
+            retire(conn, table, name)
+            out["retired"].append(name)
+        except OperationalError as e:   # lock_timeout: busy right now, retried next run
+            conn.rollback()
+            out["failed"].append(name)
+            log.warning("could not retire %s: %s", name, e.orig)
+    stray = default_rows(conn, table)
+    conn.commit()
+    if stray:
+        log.warning("%s_default holds %d rows outside the monthly partitions", table, stray)
+    return out
+
+
+def maintain(db: Session, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Create upcoming partitions and retire expired ones for every table. Runs on its own
+    connection, holding the maintainer lock for the session and committing step by step.
+    """
+    if dry_run:
+        report: Dict[str, Any] = {}
+        for table, keep in TABLES.items():
+            if not is_partitioned(db, table):
+                report[table] = {"skipped": "not partitioned (apply migrations/007)"}
+            else:
+                report[table] = {"would_retire": expired_partitions(db, table, keep)}
+        db.rollback()
+        return report
+
+    with db.get_bind().connect() as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": _LOCK_KEY}).scalar():
+            conn.rollback()
+            return {"skipped": "another maintenance run is active"}
+        try:
+            conn.execute(text("SELECT set_config('lock_timeout', :v, false)"), {"v": f"{PARTITION_LOCK_TIMEOUT_MS}ms"})
+            conn.commit()
+            report = {}
+            for table, keep in TABLES.items():
+                try:
+                    report[table] = _maintain_table(conn, table, keep)
+                except OperationalError as e:
+                    conn.rollback()
+                    report[table] = {"error": str(e.orig)}
+                    log.warning("log partition maintenance of %s did not finish: %s", table, e.orig)
+        finally:
+            try:
+                conn.rollback()
+                conn.execute(text("RESET lock_timeout"))
+                conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _LOCK_KEY})
+                conn.commit()
+            except Exception:
+                conn.invalidate()   # closing the connection releases the session lock
+    return report
+
+
+# --------------------
+# Scheduler
+# --------------------
+_scheduler: Optional[threading.Thread] = None
+
+
+def _loop(interval: int) -> None:
+    from utils.db import SessionLocal
+    while True:
+        db = SessionLocal()
+        try:
+            res = maintain(db)
+            if any(v.get("created") or v.get("retired") for v in res.values() if isinstance(v, dict)):
+                log.info("log partitions: %s", res)
+        except Exception:
+            db.rollback()
+            log.exception("log partition maintenance failed")
+        finally:
+            db.close()
+        time.sleep(interval)
+
+
+def start_scheduler() -> Optional[threading.Thread]:
+    """Run maintain() at startup and every PARTITION_MAINTENANCE_SECONDS in a daemon thread."""
+    global _scheduler
+    if PARTITION_MAINTENANCE_SECONDS <= 0:
+        return None
+    if _scheduler is None or not _scheduler.is_alive():
+        _scheduler = threading.Thread(target=_loop, args=(PARTITION_MAINTENANCE_SECONDS,), name="log-partitions", daemon=True)
+        _scheduler.start()
+    return _scheduler
@@ -0,0 +1,302 @@
+# services/user_import_service.py
+"""
+Bulk user provisioning (POST /admin/users/import).
+
+Rows come from CSV (header: username,email,password[,roles][,is_active]) or JSONL
+(one object per line, same keys; roles may be a list). Rows are validated up
+front, then handled in batches of USER_IMPORT_BATCH:
+
+    [process pool]  bcrypt of the next batch's passwords
+    [this thread]   one lookup of existing usernames/emails, one multi-row INSERT
+                    into users (ON CONFLICT DO NOTHING), one into user_roles, one commit
+
+Roles are resolved once for the whole file. A row that fails (invalid, duplicate in
+the file, already registered, unknown role) is reported and skipped; the others
+go in. run() yields NDJSON-ready events: "error" per bad row, "progress" per batch
+and a final "done".
+"""
+import os
+import csv
+import io
+import json
+import uuid
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from utils.models import Role, User, UserRole
+
+log = logging.getLogger(__name__)
+
+# --------------------
+# Config
+# --------------------
+USER_IMPORT_BATCH = int(os.getenv("USER_IMPORT_BATCH", "500"))
+USER_IMPORT_HASH_WORKERS = int(os.getenv("USER_IMPORT_HASH_WORKERS", "0")) or (os.cpu_count() or 2)
+USER_IMPORT_MAX_ROWS = int(os.getenv("USER_IMPORT_MAX_ROWS", "100000"))
+
+DEFAULT_ROLE = "user"
+_HASH_CHUNK = 32   # passwords per task sent to a hashing process
+
+Row = Dict[str, Any]
+
+
+# --------------------
+# Parsing / validation
+# --------------------
+def _roles(value) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.replace("|", ";").replace(",", ";").split(";")
+    return [str(r).strip() for r in value if str(r).strip()]
+
+
+def _flag(value) -> bool:
+    if value is None or value == "":
+        return True
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in {"1", "true", "yes", "y"}
+
+
+def parse(data: bytes, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """(line number, raw row dict) per record; raw is an error string when a JSONL line doesn't parse."""
+    text = data.decode("utf-8-sig")
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        for rec in reader:
+            yield reader.line_num, {(k or "").strip().lower(): v for k, v in rec.items()}
+        return
+    for n, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            rec = json.loads(line)
+        except ValueError as e:
+            yield n, f"invalid JSON: {e}"
+            continue
+        yield n, rec if isinstance(rec, dict) else "expected a JSON object"
+
+
+def _validate(raw: Dict[str, Any]) -> Row:
+    from email_validator import EmailNotValidError, validate_email
+    username = str(raw.get("username") or "").strip()
+    email = str(raw.get("email") or "").strip().lower()
+    password = raw.get("password")
+    if not username:
+        raise ValueError("username is required")
+    if not password or not isinstance(password, str):
+        raise ValueError("password is required")
+    try:
+        validate_email(email, check_deliverability=False)
+    except EmailNotValidError as e:
+        raise ValueError(f"invalid email: {e}")
+    return {"username": username, "email": email, "password": password,
+            "roles": _roles(raw.get("roles")), "is_active": _flag(raw.get("is_active"))}
+
+
+# --------------------
+# Password hashing (worker processes)
+# --------------------
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _hash_many(passwords: List[str]) -> List[str]:
+    from core.security import get_password_hash
+    return [get_password_hash(p) for p in passwords]
+
+
+def _hash_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a threaded server process can copy held locks into the child
+        _pool = ProcessPoolExecutor(max_workers=USER_IMPORT_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _submit_hashes(rows: List[Row]) -> List[Future]:
+    pool = _hash_pool()
+    pw = [r["password"] for r in rows]
+    return [pool.submit(_hash_many, pw[i:i + _HASH_CHUNK]) for i in range(0, len(pw), _HASH_CHUNK)]
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# --------------------
+# Import
+# --------------------
+def _resolve_roles(db, names: Set[str], create: bool) -> Dict[str, int]:
+    found = dict(db.execute(select(Role.name, Role.role_id).where(Role.name.in_(names))).all())
+    missing = [n for n in names if n not in found]
+    if missing and create:
+        rows = db.execute(
+            pg_insert(Role).values([{"name": n, "description": f"{n} role"} for n in missing])
+            .on_conflict_do_nothing().returning(Role.name, Role.role_id)
+        ).all()
+        found.update(dict(rows))
+        # created concurrently by someone else
+        if len(found) < len(names):
+            found.update(dict(db.execute(select(Role.name, Role.role_id).where(Role.name.in_(missing))).all()))
+        db.commit()
+    return found
+
+
+def _taken(db, rows: List[Row]) -> Tuple[Set[str], Set[str]]:
+    names = [r["username"] for r in rows]
+    emails = [r["email"] for r in rows]
+    hits = db.execute(
+        select(User.username, func.lower(User.email))
+        .where(or_(User.username.in_(names), func.lower(User.email).in_(emails)))
+    ).all()
+    return {h[0] for h in hits}, {h[1] for h in hits}
+
+
+def _insert_batch(db, rows: List[Row], hashes: List[str], role_ids: Dict[str, int]) -> Set[int]:
+    """Insert a batch in one transaction; returns the indexes (into rows) that were created."""
+    for r in rows:
+        r["id"] = uuid.uuid4()
+    created = set(db.execute(
+        pg_insert(User.__table__).values([
+            # users.hashed_pw is mapped as User.hashed_password
+            {"id": r["id"], "username": r["username"], "email": r["email"],
+             "hashed_pw": h, "is_active": r["is_active"]}
+            for r, h in zip(rows, hashes)
+        ]).on_conflict_do_nothing().returning(User.__table__.c.id)
+    ).scalars())
+    links = [
+        {"user_id": r["id"], "role_id": role_ids[name]}
+        for r in rows if r["id"] in created
+        for name in dict.fromkeys(r["roles"])
+    ]
+    if links:
+        db.execute(pg_insert(UserRole).values(links).on_conflict_do_nothing())
+    db.commit()
+    return {i for i, r in enumerate(rows) if r["id"] in created}
+
+
+def run(
+    data: bytes,
+    fmt: str,
+    default_roles: Optional[List[str]] = None,
+    create_roles: bool = False,
+    dry_run: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Import users from CSV/JSONL bytes. Raises ValueError before anything is written
+    if the file is unreadable or too large; per-row problems are yielded as events.
+    The events use their own session, so they can be streamed after the request's is closed.
+    """
+    if fmt not in {"csv", "jsonl"}:
+        raise ValueError("format must be csv or jsonl")
+    default_roles = default_roles or [DEFAULT_ROLE]
+    try:
+        records = list(parse(data, fmt))
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ValueError(f"Unreadable {fmt} file: {e}")
+    if len(records) > USER_IMPORT_MAX_ROWS:
+        raise ValueError(f"At most {USER_IMPORT_MAX_ROWS} rows per import")
+    # checks above run now, so the caller can answer 400; the rest streams
+    return _events(records, default_roles, create_roles, dry_run)
+
+
+def _events(records: List[Tuple[int, Any]], default_roles: List[str], create_roles: bool,
+            dry_run: bool) -> Iterator[Dict[str, Any]]:
+    from utils.db import SessionLocal
+    db = SessionLocal()
+    try:
+        yield from _import(db, records, default_roles, create_roles, dry_run)
+    finally:
+        db.close()
+
+
+def _import(db, records: List[Tuple[int, Any]], default_roles: List[str], create_roles: bool,
+            dry_run: bool) -> Iterator[Dict[str, Any]]:
+    counts = {"rows": len(records), "created": 0, "failed": 0}
+
+    def error(line: int, username: Optional[str], message: str) -> Dict[str, Any]:
+        counts["failed"] += 1
+        return {"event": "error", "line": line, "username": username, "error": message}
+
+    # validate, and drop duplicates inside the file (first occurrence wins)
+    valid: List[Row] = []
+    seen_names: Set[str] = set()
+    seen_emails: Set[str] = set()
+    for line, raw in records:
+        if isinstance(raw, str):
+            yield error(line, None, raw)
+            continue
+        try:
+            row = _validate(raw)
+        except ValueError as e:
+            yield error(line, raw.get("username"), str(e))
+            continue
+        if row["username"] in seen_names or row["email"] in seen_emails:
+            yield error(line, row["username"], "duplicate username or email in file")
+            continue
+        seen_names.add(row["username"])
+        seen_emails.add(row["email"])
+        row["line"] = line
+        row["roles"] = row["roles"] or list(default_roles)
+        valid.append(row)
+
+    # roles: one lookup (and, if allowed, one insert) for the whole file
+    role_ids = _resolve_roles(db, {n for r in valid for n in r["roles"]} or {DEFAULT_ROLE}, create_roles and not dry_run)
+    rows: List[Row] = []
+    for r in valid:
+        unknown = [n for n in r["roles"] if n not in role_ids]
+        if unknown and not (dry_run and create_roles):
+            yield error(r["line"], r["username"], f"unknown role(s): {', '.join(unknown)}")
+        else:
+            rows.append(r)
+
+    batches = [rows[i:i + USER_IMPORT_BATCH] for i in range(0, len(rows), USER_IMPORT_BATCH)]
+    processed = len(records) - len(rows)
+    pending = _submit_hashes(batches[0]) if batches and not dry_run else None
+    try:
+        for b, batch in enumerate(batches):
+            # hash the next batch while this one is checked and inserted
+            futures = pending
+            pending = _submit_hashes(batches[b + 1]) if futures is not None and b + 1 < len(batches) else None
+
+            taken_names, taken_emails = _taken(db, batch)
+            db.rollback()   # end the read transaction; the insert runs in its own
+            fresh = []
+            for r in batch:
+                if r["username"] in taken_names or r["email"] in taken_emails:
+                    yield error(r["line"], r["username"], "username or email already registered")
+                else:
+                    fresh.append(r)
+
+            if dry_run:
+                counts["created"] += len(fresh)
+            elif fresh:
+                by_line = dict(zip((r["line"] for r in batch), (h for f in futures for h in f.result())))
+                try:
+                    created = _insert_batch(db, fresh, [by_line[r["line"]] for r in fresh], role_ids)
+                except Exception as e:
+                    db.rollback()
+                    log.exception("user import batch failed")
+                    for r in fresh:
+                        yield error(r["line"], r["username"], f"insert failed: {type(e).__name__}")
+                else:
+                    counts["created"] += len(created)
+                    for i, r in enumerate(fresh):
+                        if i not in created:
+                            yield error(r["line"], r["username"], "username or email already registered")
+            processed += len(batch)
+            yield {"event": "progress", "processed": processed, **counts}
+    finally:
+        for f in pending or ():
+            f.cancel()
+
+    yield {"event": "done", "dry_run": dry_run, **counts}
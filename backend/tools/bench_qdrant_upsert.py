@@ -0,0 +1,75 @@
+# tools/bench_qdrant_upsert.py
+"""
+Upsert throughput against a Qdrant instance, per write mode.
+
+    docker run -d -p 6333:6333 -p 6334:6334 qdrant/qdrant:v1.14.1
+    python -m tools.bench_qdrant_upsert --url http://localhost:6333 --points 20000
+
+Each mode writes the same random vectors into a scratch collection (dropped afterwards)
+and reports points/s. wait=False modes are timed until the exact count catches up,
+so the numbers compare end-to-end durability, not just request submission.
+"""
+import argparse
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+from utils.langchain_store import upsert_batched
+
+MODES = [
+    # name, prefer_grpc, batch_size, parallel, wait
+    ("rest single-request", False, 10**9, 1, True),
+    ("rest batch=256", False, 256, 1, True),
+    ("rest batch=256 x4", False, 256, 4, True),
+    ("rest batch=256 x4 nowait", False, 256, 4, False),
+    ("grpc batch=256", True, 256, 1, True),
+    ("grpc batch=256 x4", True, 256, 4, True),
+    ("grpc batch=256 x4 nowait", True, 256, 4, False),
+]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://localhost:6333")
+    ap.add_argument("--grpc-port", type=int, default=6334)
+    ap.add_argument("--points", type=int, default=20000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--payload-bytes", type=int, default=1000, help="approx. chunk text size")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    vecs = rng.standard_normal((args.points, args.dim), dtype=np.float32)
+    text = "x" * args.payload_bytes
+    points = [
+        PointStruct(id=str(uuid.uuid4()), vector=v.tolist(),
+                    payload={"doc_id": f"d{i // 50}", "chunk_index": i % 50, "text": text})
+        for i, v in enumerate(vecs)
+    ]
+
+    print(f"{args.points} points, dim={args.dim}, ~{args.payload_bytes}B payload")
+    print(f"{'mode':<28}{'seconds':>9}{'points/s':>11}")
+    for name, grpc, batch, parallel, wait in MODES:
+        client = QdrantClient(url=args.url, prefer_grpc=grpc, grpc_port=args.grpc_port, timeout=120)
+        coll = f"bench_upsert_{uuid.uuid4().hex[:8]}"
+        client.create_collection(coll, vectors_config=VectorParams(size=args.dim, distance=Distance.COSINE))
+        try:
+            t0 = time.perf_counter()
+            try:
+                upsert_batched(client, coll, points, batch_size=batch, parallel=parallel, wait=wait)
+            except Exception as e:
+                print(f"{name:<28}{'failed':>9}  {type(e).__name__}: {str(e)[:60]}")
+                continue
+            while not wait and client.count(coll, exact=True).count < len(points):
+                time.sleep(0.05)
+            dt = time.perf_counter() - t0
+            print(f"{name:<28}{dt:>9.2f}{len(points) / dt:>11.0f}")
+        finally:
+            client.delete_collection(coll)
+            client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# tools/bench_workers.py
+"""
+Memory per worker and requests/s for each server mode, on this machine.
+
+    python -m tools.bench_workers --workers 4 --duration 20
+    python -m tools.bench_workers --modes gunicorn --method POST --path /chat/stream \
+        --body '{"message": "What is the leave policy?"}' --token $JWT
+
+Modes:
+    uvicorn            uvicorn --workers N (every worker imports and loads models itself)
+    gunicorn-nopreload gunicorn_conf.py with GUNICORN_PRELOAD=0
+    gunicorn           gunicorn_conf.py (app + embedding model loaded once, forked workers)
+
+Each server is started on a scratch port and polled until /readyz succeeds. Memory
+is read from /proc for the master and its workers: RSS counts shared pages in every
+process, PSS splits them between the sharers, so the PSS total is what the server
+really costs. Load is generated with --clients
+concurrent keep-alive connections for --duration seconds.
+"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+MODES = {
+    "uvicorn": (["uvicorn", "main:app", "--host", "127.0.0.1", "--port", "{port}", "--workers", "{workers}"], {}),
+    "gunicorn-nopreload": (["gunicorn", "-c", "gunicorn_conf.py", "main:app", "-b", "127.0.0.1:{port}"],
+                           {"GUNICORN_PRELOAD": "0"}),
+    "gunicorn": (["gunicorn", "-c", "gunicorn_conf.py", "main:app", "-b", "127.0.0.1:{port}"], {}),
+}
+
+
+def _children(pid: int) -> List[int]:
+    out = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # field 4 is the parent pid; the command name (field 2) may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            out.append(int(entry))
+    return out
+
+
+def _mem_kb(pid: int) -> Dict[str, int]:
+    mem = {"rss": 0, "pss": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key = line.split(":")[0].lower()
+                if key in mem:
+                    mem[key] = int(line.split()[1])
+    except OSError:
+        pass
+    return mem
+
+
+def _wait_ready(port: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/readyz")
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(1)
+    return False
+
+
+def _load(port: int, args) -> Dict[str, float]:
+    headers = {"Content-Type": "application/json"}
+    if args.token:
+        headers["Authorization"] = f"Bearer {args.token}"
+    body = args.body.encode() if args.body else None
+    lat: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    stop = time.monotonic() + args.duration
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        mine: List[float] = []
+        while time.monotonic() < stop:
+            t0 = time.perf_counter()
+            try:
+                conn.request(args.method, args.path, body=body, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status >= 400:
+                    raise OSError(resp.status)
+                mine.append(time.perf_counter() - t0)
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        with lock:
+            lat.extend(mine)
+
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    lat.sort()
+    return {
+        "rps": len(lat) / args.duration,
+        "p50_ms": statistics.median(lat) * 1000 if lat else float("nan"),
+        "p95_ms": lat[int(len(lat) * 0.95)] * 1000 if lat else float("nan"),
+        "errors": errors[0],
+    }
+
+
+def run_mode(name: str, args, port: int) -> Optional[Dict[str, float]]:
+    cmd, env = MODES[name]
+    cmd = [c.format(port=port, workers=args.workers) for c in cmd]
+    proc = subprocess.Popen(
+        cmd, env={**os.environ, "WEB_CONCURRENCY": str(args.workers), **env},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+    t0 = time.monotonic()
+    try:
+        if not _wait_ready(port, args.ready_timeout):
+            print(f"{name}: not ready after {args.ready_timeout:.0f}s", file=sys.stderr)
+            return None
+        ready_s = time.monotonic() - t0
+        load = _load(port, args)
+        # after load, so lazily touched pages are counted too
+        workers = _children(proc.pid)
+        master = _mem_kb(proc.pid)
+        per_worker = [_mem_kb(w) for w in workers]
+        return {
+            "ready_s": ready_s,
+            "workers": len(workers),
+            "total_pss_mb": (master["pss"] + sum(m["pss"] for m in per_worker)) / 1024,
+            "worker_pss_mb": statistics.mean(m["pss"] for m in per_worker) / 1024 if per_worker else 0.0,
+            "worker_rss_mb": statistics.mean(m["rss"] for m in per_worker) / 1024 if per_worker else 0.0,
+            **load,
+        }
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--modes", default="uvicorn,gunicorn-nopreload,gunicorn")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--path", default="/healthz")
+    ap.add_argument("--method", default="GET")
+    ap.add_argument("--body", default=None, help="JSON request body")
+    ap.add_argument("--token", default=None, help="bearer token for authenticated paths")
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=20)
+    ap.add_argument("--ready-timeout", type=float, default=300)
+    args = ap.parse_args()
+
+    results = {}
+    for i, name in enumerate(m.strip() for m in args.modes.split(",") if m.strip()):
+        results[name] = run_mode(name, args, args.port + i)
+
+    cols = ["ready_s", "workers", "total_pss_mb", "worker_pss_mb", "worker_rss_mb", "rps", "p50_ms", "p95_ms", "errors"]
+    print(f"{args.method} {args.path}, {args.clients} clients x {args.duration:.0f}s")
+    print(f"{'mode':<20}" + "".join(f"{c:>14}" for c in cols))
+    for name, r in results.items():
+        if r is None:
+            print(f"{name:<20}{'failed':>14}")
+            continue
+        print(f"{name:<20}" + "".join(f"{r[c]:>14.1f}" for c in cols))
+    print(json.dumps(results, default=str))
+
+
+if __name__ == "__main__":
+    main()
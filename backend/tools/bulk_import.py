@@ -0,0 +1,346 @@
+# tools/bulk_import.py
+"""
+Bulk corpus importer: walks a directory or a ZIP archive and indexes every
+.pdf/.docx/.txt/.md file with overlapping stages:
+
+    [process pool]  store blob + extract text (sidecar) + chunk
+    [main thread]   batched embedding (embedding cache first)
+    [thread pool]   concurrent Qdrant upserts
+    [writer thread] multi-row INSERT into documents + checkpoint
+
+    python -m tools.bulk_import /data/sharepoint_export --source sharepoint --tags hr,policies
+    python -m tools.bulk_import export.zip --checkpoint export.ckpt   # rerun to resume
+
+The checkpoint is an append-only file of finished keys (path inside the directory/ZIP),
+written only after a file's vectors and documents row are both committed.
+
+The writer takes the same per-content_hash lock as uploads and deletes, and stores a
+blob again if a concurrent delete unlinked it since extraction, so an import can run
+alongside the API.
+"""
+import argparse
+import hashlib
+import os
+import queue
+import sys
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+from utils import blob_store, chunking, text_sidecar
+
+ALLOWED_EXTS = {".pdf", ".docx", ".txt", ".md"}
+
+# --------------------
+# Stage 1: extraction (runs in worker processes)
+# --------------------
+_zip_handles: Dict[str, zipfile.ZipFile] = {}
+
+
+def _open_member(kind: str, container: str, name: str):
+    if kind == "zip":
+        # Keep one handle per worker process; reopening re-reads the central directory
+        zf = _zip_handles.get(container)
+        if zf is None:
+            zf = _zip_handles[container] = zipfile.ZipFile(container)
+        return zf.open(name)
+    return open(os.path.join(container, name), "rb")
+
+
+def _prepare(job: Tuple[str, str, str, str]) -> Dict[str, Any]:
+    kind, container, name, profile = job
+    ext = Path(name).suffix.lower()
+    try:
+        with _open_member(kind, container, name) as fp:
+            content_hash, size, path = blob_store.put_stream(fp)
+        text = text_sidecar.load_text(content_hash, str(path), ext)
+        chunks = chunking.chunk(text, profile)
+        if not chunks:
+            return {"key": name, "error": "no extractable text"}
+        filename = Path(name).name
+        return {
+            "key": name,
+            "doc_id": hashlib.md5((filename + content_hash).encode()).hexdigest(),
+            "filename": filename,
+            "ext": ext,
+            "size_bytes": size,
+            "content_hash": content_hash,
+            "storage_path": str(path),
+            "chunks": chunks,
+        }
+    except Exception as e:
+        return {"key": name, "error": str(e)}
+
+
+def _walk(src: str) -> Tuple[str, str, List[str]]:
+    if zipfile.is_zipfile(src):
+        with zipfile.ZipFile(src) as zf:
+            names = [i.filename for i in zf.infolist()
+                     if not i.is_dir() and Path(i.filename).suffix.lower() in ALLOWED_EXTS]
+        return "zip", src, names
+    root = Path(src)
+    names = [str(p.relative_to(root)) for p in root.rglob("*")
+             if p.is_file() and p.suffix.lower() in ALLOWED_EXTS]
+    return "file", str(root), sorted(names)
+
+
+def _bounded_map(pool, fn, jobs, window: int) -> Iterator[Any]:
+    """Ordered map that keeps at most `window` jobs in flight (Executor.map submits everything)."""
+    pending: deque = deque()
+    it = iter(jobs)
+    for job in it:
+        pending.append(pool.submit(fn, job))
+        if len(pending) >= window:
+            break
+    while pending:
+        yield pending.popleft().result()
+        for job in it:
+            pending.append(pool.submit(fn, job))
+            break
+
+
+# --------------------
+# Checkpoint
+# --------------------
+def _read_checkpoint(path: Path) -> set:
+    if not path.exists():
+        return set()
+    with path.open("r", encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def _uncheckpoint(path: Path, keys: set) -> None:
+    """Remove keys from the checkpoint (rewritten atomically) so a rerun imports them again."""
+    kept = [k for k in _read_checkpoint(path) if k not in keys]
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        f.write("".join(k + "\n" for k in kept))
+    os.replace(tmp, path)
+
+
+class _Stats:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.files = 0
+        self.chunks = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    def line(self) -> str:
+        dt = max(time.perf_counter() - self.t0, 1e-9)
+        return (f"files={self.files} chunks={self.chunks} failed={self.failed} "
+                f"elapsed={dt:.1f}s files/s={self.files / dt:.2f} chunks/s={self.chunks / dt:.1f}")
+
+
+# --------------------
+# Stage 4: documents rows + checkpoint (writer thread)
+# --------------------
+def _writer(done: "queue.Queue", src: Tuple[str, str], ckpt_path: Path, db_batch: int, stats: _Stats,
+            errors: List[BaseException]):
+    """Runs until the None sentinel. A failure is appended to `errors` for the producer to abort on."""
+    try:
+        _write_loop(done, src, ckpt_path, db_batch, stats)
+    except BaseException as e:
+        errors.append(e)
+
+
+def _write_loop(done: "queue.Queue", src: Tuple[str, str], ckpt_path: Path, db_batch: int, stats: _Stats):
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    from repositories import docs_repository as repo
+    from utils.db import SessionLocal
+    from utils.models import Document
+
+    kind, container = src
+
+    rows: List[Dict[str, Any]] = []
+    keys: List[str] = []
+    last_report = time.perf_counter()
+
+    def flush():
+        nonlocal rows, keys
+        if not rows:
+            return
+        db = SessionLocal()
+        try:
+            # sorted: a fixed lock order, no deadlock with another importer
+            for content_hash in sorted({r["content_hash"] for r in rows}):
+                repo.lock_content_hash(db, content_hash)
+            for r, key in zip(rows, keys):
+                # a delete of the last row sharing the blob may have unlinked it since _prepare
+                if not blob_store.exists(r["content_hash"]):
+                    with _open_member(kind, container, key) as fp:
+                        content_hash, _, _ = blob_store.put_stream(fp)
+                    if content_hash != r["content_hash"]:
+                        raise RuntimeError(f"{key} changed during the import")
+            db.execute(pg_insert(Document).on_conflict_do_nothing(index_elements=["id"]), rows)
+            db.commit()
+        finally:
+            db.close()
+        with ckpt_path.open("a", encoding="utf-8") as f:
+            f.write("".join(k + "\n" for k in keys))
+        rows, keys = [], []
+
+    while True:
+        item = done.get()
+        if item is None:
+            break
+        for rec in item:
+            rows.append(rec["row"])
+            keys.append(rec["key"])
+            with stats.lock:
+                stats.files += 1
+                stats.chunks += rec["n_chunks"]
+        if len(rows) >= db_batch:
+            flush()
+        if time.perf_counter() - last_report > 5:
+            print(stats.line(), flush=True)
+            last_report = time.perf_counter()
+    flush()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("src", help="directory or .zip")
+    ap.add_argument("--source", default=None)
+    ap.add_argument("--tags", default=None, help="comma separated")
+    ap.add_argument("--chunk-profile", default=None)
+    ap.add_argument("--uploaded-by", default="bulk-import")
+    ap.add_argument("--checkpoint", default=None, help="defaults to <src>.import.ckpt")
+    ap.add_argument("--extract-workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    ap.add_argument("--upsert-workers", type=int, default=4)
+    ap.add_argument("--embed-batch", type=int, default=256, help="chunks per embedding call")
+    ap.add_argument("--db-batch", type=int, default=500, help="documents rows per INSERT")
+    ap.add_argument("--no-wait", action="store_true",
+                    help="upsert with wait=False and verify the collection point count at the end")
+    args = ap.parse_args()
+
+    from utils.langchain_store import (
+        active_index, embed_chunks, ensure_collection, make_points, upsert_points, count_points, wait_for_count,
+    )
+
+    profile = chunking.resolve_profile(args.chunk_profile, args.source)
+    tags = [t.strip() for t in (args.tags or "").split(",") if t.strip()] or None
+    ckpt_path = Path(args.checkpoint or (args.src.rstrip("/\\") + ".import.ckpt"))
+
+    kind, container, names = _walk(args.src)
+    finished = _read_checkpoint(ckpt_path)
+    jobs = [(kind, container, n, profile) for n in names if n not in finished]
+    print(f"{len(names)} files found, {len(names) - len(jobs)} already imported, {len(jobs)} to go "
+          f"(profile={profile}, checkpoint={ckpt_path})", flush=True)
+    if not jobs:
+        return
+
+    ensure_collection()
+    # Pin the index for the whole run so a concurrent alias switch cannot mix models
+    collection, model = active_index(refresh=True)
+    sent: Dict[str, int] = {}  # doc_id -> points, for the wait=False consistency check
+    sent_keys: Dict[str, str] = {}  # doc_id -> checkpoint key
+    stats = _Stats()
+    done: "queue.Queue" = queue.Queue()
+    writer_errors: List[BaseException] = []
+    writer = threading.Thread(target=_writer,
+                              args=(done, (kind, container), ckpt_path, args.db_batch, stats, writer_errors),
+                              daemon=True)
+    writer.start()
+
+    in_flight = threading.BoundedSemaphore(args.upsert_workers * 2)
+    upserts = ThreadPoolExecutor(max_workers=args.upsert_workers)
+    now = datetime.utcnow().isoformat()
+
+    def abort_if_writer_failed():
+        if writer_errors:
+            upserts.shutdown(wait=False, cancel_futures=True)
+            print(f"aborting: writing documents rows / checkpoint failed: {writer_errors[0]!r}",
+                  file=sys.stderr, flush=True)
+            sys.exit(1)
+
+    def submit(batch: List[Dict[str, Any]]):
+        abort_if_writer_failed()
+        vectors = embed_chunks([c for rec in batch for c in rec["chunks"]], model)
+        points, pos = [], 0
+        for rec in batch:
+            n = len(rec["chunks"])
+            meta = {
+                "filename": rec["filename"], "ext": rec["ext"], "source": args.source, "tags": tags,
+                "uploaded_by": args.uploaded_by, "uploaded_at": now,
+                "content_hash": rec["content_hash"], "chunk_profile": profile,
+            }
+            points += make_points(rec["doc_id"], list(enumerate(rec["chunks"])), vectors[pos:pos + n], meta)
+            pos += n
+        done_recs = [{
+            "key": rec["key"],
+            "n_chunks": len(rec["chunks"]),
+            "row": dict(
+                id=rec["doc_id"], filename=rec["filename"], ext=rec["ext"], size_bytes=rec["size_bytes"],
+                content_hash=rec["content_hash"], storage_path=rec["storage_path"], source=args.source,
+                tags=tags, uploaded_by=args.uploaded_by, status="ready", chunk_profile=profile,
+            ),
+        } for rec in batch]
+
+        in_flight.acquire()
+
+        def run():
+            try:
+                upsert_points(points, wait=not args.no_wait, collection=collection)
+                with stats.lock:
+                    sent.update((rec["doc_id"], len(rec["chunks"])) for rec in batch)
+                    sent_keys.update((rec["doc_id"], rec["key"]) for rec in batch)
+                done.put(done_recs)
+            except Exception as e:
+                with stats.lock:
+                    stats.failed += len(batch)
+                print(f"upsert failed for {len(batch)} files: {e}", file=sys.stderr, flush=True)
+            finally:
+                in_flight.release()
+
+        upserts.submit(run)
+
+    batch: List[Dict[str, Any]] = []
+    batch_chunks = 0
+    with ProcessPoolExecutor(max_workers=args.extract_workers) as extract:
+        for rec in _bounded_map(extract, _prepare, jobs, window=args.extract_workers * 4):
+            if "error" in rec:
+                with stats.lock:
+                    stats.failed += 1
+                print(f"skip {rec['key']}: {rec['error']}", file=sys.stderr, flush=True)
+                continue
+            batch.append(rec)
+            batch_chunks += len(rec["chunks"])
+            if batch_chunks >= args.embed_batch:
+                submit(batch)
+                batch, batch_chunks = [], 0
+        if batch:
+            submit(batch)
+
+    upserts.shutdown(wait=True)
+    done.put(None)
+    writer.join()
+    abort_if_writer_failed()
+    print("done: " + stats.line(), flush=True)
+
+    if args.no_wait:
+        # Every document written with wait=False must become fully visible
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            missing = [doc_id for (doc_id, n), ok in zip(
+                sent.items(), pool.map(lambda kv: wait_for_count(kv[1], doc_id=kv[0], timeout=60, collection=collection),
+                                   sent.items())
+            ) if not ok]
+        print(f"consistency check: {len(sent) - len(missing)}/{len(sent)} documents fully visible", flush=True)
+        for doc_id in missing[:20]:
+            print(f"  incomplete: {doc_id} ({count_points(doc_id, collection)}/{sent[doc_id]} points)",
+                  file=sys.stderr)
+        if missing:
+            # checkpointed when their rows were written; take them out so a rerun retries them
+            _uncheckpoint(ckpt_path, {sent_keys[d] for d in missing})
+            print(f"{len(missing)} incomplete documents removed from the checkpoint; rerun to retry them",
+                  file=sys.stderr, flush=True)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
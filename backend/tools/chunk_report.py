@@ -0,0 +1,122 @@
+# tools/chunk_report.py
+"""
+Compare chunking profiles on real documents: chunk count, token sizes, chunking and
+embedding time, and a self-retrieval recall proxy.
+
+    python -m tools.chunk_report --profiles legacy,default,precise --limit 50
+    python -m tools.chunk_report --dir ./samples --profiles legacy,default
+
+Retrieval proxy: sentences sampled from each document are used as queries over the
+pooled chunks of every sampled document; a hit is a top-k chunk that contains the
+sentence's middle words. It rewards chunks whose embedding still represents each of
+their sentences, and penalizes sentences cut in half.
+"""
+import argparse
+import random
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from utils import chunking, text_sidecar
+from utils.utils_text import extract_text
+
+_SENT = re.compile(r"(?<=[.!?])\s+")
+
+
+def _norm(s: str) -> str:
+    return " ".join(s.split())
+
+
+def _load_texts(args) -> List[Tuple[str, str]]:
+    if args.dir:
+        files = [p for p in sorted(Path(args.dir).rglob("*"))
+                 if p.suffix.lower() in {".pdf", ".docx", ".txt", ".md"}][: args.limit]
+        return [(p.name, extract_text(str(p))) for p in files]
+
+    from utils.db import SessionLocal
+    from utils.models import Document
+    db = SessionLocal()
+    try:
+        docs = db.query(Document).order_by(Document.uploaded_at.desc()).limit(args.limit).all()
+        return [(d.filename, text_sidecar.load_text(d.content_hash, d.storage_path, d.ext)) for d in docs]
+    finally:
+        db.close()
+
+
+def _queries(texts: List[Tuple[str, str]], per_doc: int, seed: int) -> List[Tuple[str, str]]:
+    """(query sentence, key span that must appear in a retrieved chunk)"""
+    rng = random.Random(seed)
+    out = []
+    for _, text in texts:
+        sents = [_norm(s) for s in _SENT.split(text)]
+        sents = [s for s in sents if 8 <= len(s.split()) <= 40]
+        for s in rng.sample(sents, min(per_doc, len(sents))):
+            words = s.split()
+            mid = len(words) // 2
+            out.append((s, " ".join(words[max(0, mid - 4): mid + 4])))
+    return out
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    return m / np.maximum(np.linalg.norm(m, axis=1, keepdims=True), 1e-12)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--profiles", default="legacy,default")
+    ap.add_argument("--dir", help="read files from a directory instead of the documents table")
+    ap.add_argument("--limit", type=int, default=50, help="documents to sample")
+    ap.add_argument("--queries-per-doc", type=int, default=5)
+    ap.add_argument("--k", type=int, default=3, help="retriever k (matches core/ai)")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    from utils.langchain_store import get_embeddings
+    emb = get_embeddings()
+
+    texts = _load_texts(args)
+    queries = _queries(texts, args.queries_per_doc, args.seed)
+    if not texts or not queries:
+        raise SystemExit("No documents/queries to evaluate.")
+    qvec = _normalize(np.asarray(emb.embed_documents([q for q, _ in queries]), dtype=np.float32))
+    count = chunking.get_token_counter()
+
+    rows: List[Dict] = []
+    for name in [p.strip() for p in args.profiles.split(",") if p.strip()]:
+        t0 = time.perf_counter()
+        chunks = [c for _, text in texts for c in chunking.chunk(text, name)]
+        t_chunk = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        cvec = _normalize(np.asarray(emb.embed_documents(chunks), dtype=np.float32))
+        t_embed = time.perf_counter() - t0
+
+        normed = [_norm(c) for c in chunks]
+        top = np.argsort(-(qvec @ cvec.T), axis=1)[:, : args.k]
+        hits, rr = 0, 0.0
+        for (_, key), idx in zip(queries, top):
+            for rank, j in enumerate(idx, 1):
+                if key in normed[j]:
+                    hits += 1
+                    rr += 1.0 / rank
+                    break
+
+        sizes = count(chunks)
+        rows.append(dict(
+            profile=name, chunks=len(chunks), avg_tokens=float(np.mean(sizes)) if sizes else 0.0,
+            over_256=sum(1 for n in sizes if n > 256), chunk_s=t_chunk, embed_s=t_embed,
+            recall=hits / len(queries), mrr=rr / len(queries),
+        ))
+
+    print(f"{len(texts)} documents, {len(queries)} queries, k={args.k}, tokenizer={chunking.TOKENIZER_MODEL}")
+    print(f"{'profile':<12}{'chunks':>8}{'avg_tok':>9}{'>256tok':>9}{'chunk_s':>9}{'embed_s':>9}{'recall@k':>10}{'mrr':>7}")
+    for r in rows:
+        print(f"{r['profile']:<12}{r['chunks']:>8}{r['avg_tokens']:>9.1f}{r['over_256']:>9}"
+              f"{r['chunk_s']:>9.2f}{r['embed_s']:>9.2f}{r['recall']:>10.3f}{r['mrr']:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# tools/measure_runtime.py
+"""
+Cold start and memory of one backend process, measured in fresh interpreters.
+
+    python -m tools.measure_runtime --runs 3
+    git stash && python -m tools.measure_runtime --runs 3 && git stash pop   # compare revisions
+
+For each run a new Python process imports `main` (what a uvicorn worker does), runs
+one retrieval and one ingestion embedding, and reports:
+
+    import_s   time to import the app
+    query_s    first retrieval (model load + Qdrant round trip)
+    embed_s    first ingestion embedding after that
+    rss_mb     resident memory at the end, hwm_mb its peak
+    models     SentenceTransformer instances alive (one per model is the target)
+
+Needs the usual environment (.env: GROQ_API_KEY, QDRANT_URL, DATABASE_URL).
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+_PROBE = r"""
+import gc, json, time
+t0 = time.perf_counter()
+import main  # noqa: F401
+t_import = time.perf_counter() - t0
+
+from core.ai import retrieve
+t0 = time.perf_counter()
+retrieve("warm-up query")
+t_query = time.perf_counter() - t0
+
+from utils.langchain_store import get_embeddings
+t0 = time.perf_counter()
+get_embeddings().embed_documents(["warm-up chunk"])
+t_embed = time.perf_counter() - t0
+
+def _status(key):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(key + ":"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+gc.collect()
+models = sum(1 for o in gc.get_objects() if type(o).__name__ == "SentenceTransformer")
+print(json.dumps({"import_s": t_import, "query_s": t_query, "embed_s": t_embed,
+                  "rss_mb": _status("VmRSS"), "hwm_mb": _status("VmHWM"), "models": models}))
+"""
+
+_COLS = ["import_s", "query_s", "embed_s", "rss_mb", "hwm_mb", "models"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    results = []
+    for i in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", _PROBE], capture_output=True, text=True)
+        if out.returncode != 0:
+            raise SystemExit(f"run {i + 1} failed:\n{out.stderr[-2000:]}")
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"{'run':<8}" + "".join(f"{c:>10}" for c in _COLS))
+    for i, r in enumerate(results, 1):
+        print(f"{i:<8}" + "".join(f"{r[c]:>10.2f}" for c in _COLS))
+    print(f"{'median':<8}" + "".join(f"{statistics.median(r[c] for r in results):>10.2f}" for c in _COLS))
+
+
+if __name__ == "__main__":
+    main()
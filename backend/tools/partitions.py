@@ -0,0 +1,59 @@
+# tools/partitions.py
+"""
+Monthly partitions of activities and request_logs (services/partition_service.py).
+
+    python -m tools.partitions status
+    python -m tools.partitions maintain --dry-run     # what would be retired
+    python -m tools.partitions maintain               # create upcoming months, retire expired ones
+
+`maintain` is what the in-process scheduler runs every PARTITION_MAINTENANCE_SECONDS;
+run it from cron instead when the scheduler is disabled. Retention is
+LOG_RETENTION_MONTHS / REQUEST_LOG_RETENTION_MONTHS; PARTITION_RETENTION_MODE=detach
+keeps expired months as standalone tables (pg_dump them, then DROP).
+"""
+import argparse
+import json
+
+from utils.db import SessionLocal
+from services import partition_service as ps
+
+
+def cmd_status(db, args):
+    out = {}
+    for table, keep in ps.TABLES.items():
+        if not ps.is_partitioned(db, table):
+            out[table] = {"partitioned": False}
+            continue
+        parts = ps.partitions(db, table)
+        out[table] = {
+            "partitioned": True,
+            "retention_months": keep,
+            "default_rows": ps.default_rows(db, table),
+            "expired": ps.expired_partitions(db, table, keep),
+            "partitions": [{"name": p["name"], "month": p["month"].isoformat(), "rows_est": p["rows"]} for p in parts],
+        }
+    return out
+
+
+def cmd_maintain(db, args):
+    return ps.maintain(db, dry_run=args.dry_run)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status")
+    p = sub.add_parser("maintain")
+    p.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    db = SessionLocal()
+    try:
+        res = {"status": cmd_status, "maintain": cmd_maintain}[args.cmd](db, args)
+    finally:
+        db.close()
+    print(json.dumps(res, default=str, indent=2))
+
+
+if __name__ == "__main__":
+    main()
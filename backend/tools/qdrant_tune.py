@@ -0,0 +1,141 @@
+# tools/qdrant_tune.py
+"""
+Manage Qdrant collection tuning.
+
+    python -m tools.qdrant_tune show      # current config, payload indexes, memory estimate
+    python -m tools.qdrant_tune apply     # migrate the collection to the QDRANT_* settings
+    python -m tools.qdrant_tune report --queries 200 --ef 32,64,128,256
+
+`apply` uses the same settings as ensure_collection (QDRANT_QUANTIZATION, QDRANT_ON_DISK_VECTORS,
+QDRANT_HNSW_M, QDRANT_HNSW_EF_CONSTRUCT, QDRANT_PAYLOAD_INDEXES). Qdrant re-optimizes
+segments in the background; searches keep working.
+
+`report` samples stored vectors as queries and prints, per search setting, latency
+(p50/p95) and recall@k against exact (brute-force) search, plus a filtered query on doc_id
+to show the payload index at work.
+"""
+import argparse
+import json
+import random
+import time
+from typing import List, Optional
+
+import numpy as np
+from qdrant_client.models import FieldCondition, Filter, MatchValue, QuantizationSearchParams, SearchParams
+
+from utils.langchain_store import (
+    active_collection,
+    apply_collection_config,
+    get_client,
+)
+
+
+def _memory_estimate(points: int, dim: int, quantized: bool, on_disk: bool) -> str:
+    f32 = points * dim * 4
+    i8 = points * dim if quantized else 0
+    ram = i8 + (0 if on_disk else f32)
+    return (f"float32={f32 / 2**20:.1f} MiB ({'disk' if on_disk else 'RAM'}), "
+            f"int8={i8 / 2**20:.1f} MiB (RAM), vectors in RAM≈{ram / 2**20:.1f} MiB")
+
+
+def cmd_show(args):
+    collection = args.collection or active_collection()
+    info = get_client().get_collection(collection)
+    params = info.config.params.vectors
+    dim = getattr(params, "size", None)
+    on_disk = bool(getattr(params, "on_disk", False))
+    quantized = info.config.quantization_config is not None
+    print(json.dumps({
+        "collection": collection,
+        "status": str(info.status),
+        "points": info.points_count,
+        "indexed_vectors": info.indexed_vectors_count,
+        "segments": info.segments_count,
+        "vector": {"size": dim, "distance": str(getattr(params, "distance", "")), "on_disk": on_disk},
+        "hnsw": info.config.hnsw_config.model_dump() if info.config.hnsw_config else None,
+        "quantization": info.config.quantization_config.model_dump() if quantized else None,
+        "payload_indexes": {k: str(v.data_type) for k, v in (info.payload_schema or {}).items()},
+    }, indent=2, default=str))
+    if dim and info.points_count:
+        print("memory:", _memory_estimate(info.points_count, dim, quantized, on_disk))
+
+
+def cmd_apply(args):
+    print(json.dumps(apply_collection_config(args.collection), indent=2))
+    print("Segments are re-optimized in the background; run `show` until status is green.")
+
+
+def _sample(collection: str, n: int, seed: int):
+    client = get_client()
+    records, _ = client.scroll(collection, limit=max(n * 5, 100), with_vectors=True,
+                               with_payload=["doc_id"])
+    random.Random(seed).shuffle(records)
+    return records[:n]
+
+
+def _timed(collection: str, vectors, k: int, params: Optional[SearchParams], flt=None):
+    client = get_client()
+    lat: List[float] = []
+    ids: List[List] = []
+    for v in vectors:
+        t0 = time.perf_counter()
+        res = client.query_points(collection, query=v, limit=k, search_params=params,
+                                  query_filter=flt, with_payload=False)
+        lat.append((time.perf_counter() - t0) * 1000)
+        ids.append([p.id for p in res.points])
+    return np.array(lat), ids
+
+
+def cmd_report(args):
+    collection = args.collection = args.collection or active_collection()
+    sample = _sample(collection, args.queries, args.seed)
+    if not sample:
+        raise SystemExit("Collection is empty.")
+    vectors = [r.vector for r in sample]
+
+    _, truth = _timed(collection, vectors, args.k, SearchParams(exact=True))
+    rows = []
+    for ef in [int(x) for x in args.ef.split(",") if x.strip()]:
+        variants = [("float", SearchParams(hnsw_ef=ef, quantization=QuantizationSearchParams(ignore=True)))]
+        if get_client().get_collection(collection).config.quantization_config is not None:
+            variants += [
+                ("int8", SearchParams(hnsw_ef=ef, quantization=QuantizationSearchParams(rescore=False))),
+                ("int8+rescore", SearchParams(hnsw_ef=ef, quantization=QuantizationSearchParams(
+                    rescore=True, oversampling=args.oversampling))),
+            ]
+        for name, params in variants:
+            lat, got = _timed(collection, vectors, args.k, params)
+            recall = np.mean([len(set(g) & set(t)) / max(len(t), 1) for g, t in zip(got, truth)])
+            rows.append((f"ef={ef} {name}", np.percentile(lat, 50), np.percentile(lat, 95), recall))
+
+    doc_id = (sample[0].payload or {}).get("doc_id")
+    if doc_id:
+        flt = Filter(must=[FieldCondition(key="doc_id", match=MatchValue(value=doc_id))])
+        lat, _ = _timed(collection, vectors, args.k, None, flt=flt)
+        rows.append(("filter doc_id", np.percentile(lat, 50), np.percentile(lat, 95), float("nan")))
+
+    print(f"{len(vectors)} queries, k={args.k}, collection={collection}")
+    print(f"{'setting':<26}{'p50_ms':>9}{'p95_ms':>9}{'recall@k':>10}")
+    for name, p50, p95, recall in rows:
+        print(f"{name:<26}{p50:>9.2f}{p95:>9.2f}{recall:>10.3f}")
+    cmd_show(args)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--collection", default=None, help="defaults to the active (aliased) collection")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("show")
+    sub.add_parser("apply")
+    rep = sub.add_parser("report")
+    rep.add_argument("--queries", type=int, default=200)
+    rep.add_argument("--k", type=int, default=3)
+    rep.add_argument("--ef", default="32,64,128,256")
+    rep.add_argument("--oversampling", type=float, default=2.0)
+    rep.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+    {"show": cmd_show, "apply": cmd_apply, "report": cmd_report}[args.cmd](args)
+
+
+if __name__ == "__main__":
+    main()
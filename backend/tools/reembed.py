@@ -0,0 +1,391 @@
+# tools/reembed.py
+"""
+Blue/green re-embedding: build a versioned collection with another embedding model
+while the current one keeps serving, then move the serving alias (QDRANT_ALIAS)
+to it in one atomic alias operation.
+
+    python -m tools.reembed status
+    python -m tools.reembed build --model BAAI/bge-small-en-v1.5 --rate 200 --threads 2 --nice 10
+    python -m tools.reembed switch jesa_docs__bge-small-en-v1-5__202610191200
+    python -m tools.reembed rollback                 # back to the previous collection
+    python -m tools.reembed drop <collection>        # once the rollback window is over
+
+`build` copies every point of the active collection (same ids and payload) and
+re-embeds its stored `text`; points indexed without text are rebuilt from the
+document's extracted-text sidecar. The HNSW graph is built once at the end rather
+than during the copy. Rerunning `build --name <collection>` resumes. `--rate`
+(chunks/s), `--threads` (torch threads) and `--nice` keep it off live traffic's CPU.
+
+`switch` catches the target up with writes made since the build, moves the alias,
+waits QDRANT_ALIAS_REFRESH for every worker to re-resolve it, then copies chunks
+that were still written to the old collection in that window. The old collection
+is left untouched for `rollback`, which runs the same steps in reverse (documents
+added after the switch are embedded with the old model).
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from qdrant_client.models import (
+    CollectionStatus,
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    HnswConfigDiff,
+    MatchAny,
+    PointIdsList,
+    PointStruct,
+)
+
+from utils.langchain_store import (
+    QDRANT_ALIAS,
+    QDRANT_ALIAS_REFRESH,
+    QDRANT_COLLECTION,
+    active_index,
+    alias_target,
+    create_collection,
+    embed_chunks,
+    embedding_dim,
+    ensure_payload_indexes,
+    get_client,
+    hnsw_config,
+    load_registry,
+    make_points,
+    save_registry,
+    upsert_points,
+)
+
+# Payload keys written by make_points itself; everything else is document metadata
+_POINT_KEYS = {"doc_id", "chunk_index", "chunk_hash", "text"}
+
+
+class _Progress:
+    """Caps throughput at `rate` chunks/s (0 = unthrottled) and reports every few seconds."""
+
+    def __init__(self, rate: float, label: str):
+        self.rate = rate
+        self.label = label
+        self.t0 = time.monotonic()
+        self.last = self.t0
+        self.done = 0
+
+    def add(self, n: int) -> None:
+        self.done += n
+        now = time.monotonic()
+        if self.rate > 0:
+            ahead = self.done / self.rate - (now - self.t0)
+            if ahead > 0:
+                time.sleep(ahead)
+        if now - self.last > 5:
+            dt = max(now - self.t0, 1e-9)
+            print(f"{self.label}: {self.done} chunks, {self.done / dt:.1f} chunks/s", flush=True)
+            self.last = now
+
+
+def _slug(model: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", model.split("/")[-1].lower()).strip("-")
+
+
+def _scan(collection: str, keys: List[str], batch: int = 1024) -> Iterator[List[Any]]:
+    offset = None
+    while True:
+        records, offset = get_client().scroll(
+            collection_name=collection, limit=batch, offset=offset, with_payload=keys, with_vectors=False,
+        )
+        yield records
+        if offset is None:
+            return
+
+
+def _hashes(collection: str) -> Dict[str, Optional[str]]:
+    """point id -> chunk_hash (None for points written before chunk hashes existed)."""
+    return {
+        str(r.id): (r.payload or {}).get("chunk_hash")
+        for records in _scan(collection, ["chunk_hash"])
+        for r in records
+    }
+
+
+def _from_sidecars(docs: Dict[str, Dict[str, Any]], dst: str, model: str, progress: _Progress) -> int:
+    """Re-chunk documents whose points carry no text, from their extracted-text sidecar."""
+    if not docs:
+        return 0
+    from utils import chunking, text_sidecar
+    from utils.db import SessionLocal
+    from utils.models import Document
+
+    written = 0
+    db = SessionLocal()
+    try:
+        for doc_id, meta in docs.items():
+            doc = db.get(Document, doc_id)
+            if doc is None:
+                print(f"skip {doc_id}: no documents row and no stored text", file=sys.stderr, flush=True)
+                continue
+            text = text_sidecar.load_text(doc.content_hash, doc.storage_path, doc.ext)
+            # NULL profile = chunks made before profiles existed
+            chunks = chunking.chunk(text, doc.chunk_profile or "legacy")
+            if not chunks:
+                continue
+            points = make_points(doc_id, list(enumerate(chunks)), embed_chunks(chunks, model), meta)
+            upsert_points(points, collection=dst)
+            written += len(points)
+            progress.add(len(points))
+    finally:
+        db.close()
+    return written
+
+
+def _copy(src: str, dst: str, ids: List[str], model: str, progress: _Progress, batch: int) -> int:
+    """Re-embed the given points of `src` into `dst`, keeping ids and payload."""
+    client = get_client()
+    copied = 0
+    textless: Dict[str, Dict[str, Any]] = {}
+    for i in range(0, len(ids), batch):
+        records = client.retrieve(src, ids=ids[i:i + batch], with_payload=True, with_vectors=False)
+        with_text = []
+        for r in records:
+            payload = r.payload or {}
+            if payload.get("text"):
+                with_text.append(r)
+            elif payload.get("doc_id"):
+                textless.setdefault(payload["doc_id"], {k: v for k, v in payload.items() if k not in _POINT_KEYS})
+        if not with_text:
+            continue
+        vectors = embed_chunks([r.payload["text"] for r in with_text], model)
+        upsert_points(
+            [PointStruct(id=r.id, vector=v, payload=r.payload) for r, v in zip(with_text, vectors)],
+            collection=dst,
+        )
+        copied += len(with_text)
+        progress.add(len(with_text))
+    return copied + _from_sidecars(textless, dst, model, progress)
+
+
+def _catch_up(src: str, dst: str, model: str, progress: _Progress, batch: int, missing_only: bool = False) -> Dict[str, int]:
+    """
+    Make `dst` mirror `src`: copy points that are missing or whose chunk changed, and
+    delete points `src` no longer has. With missing_only, only copy absent points
+    (after a switch `dst` is live and may hold newer chunks than `src`).
+    """
+    src_h, dst_h = _hashes(src), _hashes(dst)
+    if missing_only:
+        todo = [pid for pid in src_h if pid not in dst_h]
+    else:
+        todo = [pid for pid, h in src_h.items() if pid not in dst_h or dst_h[pid] != h]
+    copied = _copy(src, dst, todo, model, progress, batch)
+    stale = [] if missing_only else [pid for pid in dst_h if pid not in src_h]
+    for i in range(0, len(stale), batch):
+        get_client().delete(collection_name=dst, points_selector=PointIdsList(points=stale[i:i + batch]))
+    return {"copied": copied, "deleted": len(stale)}
+
+
+def _prune_deleted_docs(collection: str) -> int:
+    """Drop points of documents deleted (in Postgres) while some workers still wrote elsewhere."""
+    from utils.db import SessionLocal
+    from utils.models import Document
+
+    doc_ids = {(r.payload or {}).get("doc_id") for records in _scan(collection, ["doc_id"]) for r in records}
+    doc_ids.discard(None)
+    if not doc_ids:
+        return 0
+    db = SessionLocal()
+    try:
+        live = {row[0] for row in db.query(Document.id).filter(Document.id.in_(list(doc_ids))).all()}
+    finally:
+        db.close()
+    gone = sorted(doc_ids - live)
+    if gone:
+        get_client().delete(
+            collection_name=collection,
+            points_selector=FilterSelector(filter=Filter(must=[FieldCondition(key="doc_id", match=MatchAny(any=gone))])),
+        )
+    return len(gone)
+
+
+def _wait_green(collection: str, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while get_client().get_collection(collection).status != CollectionStatus.GREEN:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(2)
+    return True
+
+
+def _throttle_process(args) -> None:
+    if args.nice:
+        os.nice(args.nice)
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+
+# --------------------
+# Commands
+# --------------------
+def cmd_status(_args):
+    collection, model = active_index(refresh=True)
+    registry = load_registry()
+    models = registry.get("models") or {}
+    client = get_client()
+    rows = []
+    for c in sorted(c.name for c in client.get_collections().collections):
+        if c != QDRANT_COLLECTION and not c.startswith(f"{QDRANT_COLLECTION}__"):
+            continue
+        info = client.get_collection(c)
+        rows.append({
+            "collection": c,
+            "model": models.get(c),
+            "points": info.points_count,
+            "status": str(info.status),
+            "active": c == collection,
+        })
+    print(json.dumps({
+        "alias": QDRANT_ALIAS,
+        "alias_target": alias_target(),
+        "active": {"collection": collection, "model": model},
+        "previous": registry.get("previous"),
+        "collections": rows,
+    }, indent=2, default=str))
+
+
+def cmd_build(args):
+    _throttle_process(args)
+    src, src_model = active_index(refresh=True)
+    name = args.name or f"{QDRANT_COLLECTION}__{_slug(args.model)}__{datetime.utcnow():%Y%m%d%H%M}"
+    if name == src:
+        raise SystemExit(f"{name} is the active collection")
+
+    registry = load_registry()
+    models = registry.setdefault("models", {})
+    models.setdefault(src, src_model)
+    if models.get(name) not in (None, args.model):
+        raise SystemExit(f"{name} was built with {models[name]}, not {args.model}")
+    # Recorded before anything can point at the collection, so workers always pair it with its model
+    models[name] = args.model
+    save_registry(registry)
+
+    client = get_client()
+    if not client.collection_exists(name):
+        create_collection(name, embedding_dim(args.model), hnsw=HnswConfigDiff(m=0))
+    else:
+        client.update_collection(collection_name=name, hnsw_config=HnswConfigDiff(m=0))
+    ensure_payload_indexes(name)
+    print(f"building {name} ({args.model}) from {src} ({src_model})", flush=True)
+
+    progress = _Progress(args.rate, "build")
+    stats = _catch_up(src, name, args.model, progress, args.batch)
+
+    # No graph was maintained during the copy; build it once now
+    client.update_collection(collection_name=name, hnsw_config=hnsw_config())
+    green = _wait_green(name, args.timeout)
+    print(json.dumps({"collection": name, **stats, "indexed": green}, indent=2), flush=True)
+    print(f"next: python -m tools.reembed switch {name}")
+
+
+def cmd_switch(args, target: Optional[str] = None):
+    target = target or args.collection
+    src, src_model = active_index(refresh=True)
+    if target == src:
+        raise SystemExit(f"{target} is already active")
+    registry = load_registry()
+    models = registry.setdefault("models", {})
+    models.setdefault(src, src_model)
+    model = models.get(target)
+    if not model or not get_client().collection_exists(target):
+        raise SystemExit(f"Unknown collection {target}; run `build` first")
+
+    _throttle_process(args)
+    progress = _Progress(args.rate, "catch-up")
+    for _ in range(3):
+        stats = _catch_up(src, target, model, progress, args.batch)
+        print(f"catch-up: {stats}", flush=True)
+        if stats["copied"] + stats["deleted"] <= args.max_lag:
+            break
+    else:
+        raise SystemExit("Target keeps falling behind; retry with a higher --rate or off-peak")
+    if not _wait_green(target, args.timeout):
+        raise SystemExit(f"{target} is still optimizing; retry when `status` shows green")
+
+    registry["previous"] = src
+    save_registry(registry)
+
+    ops = []
+    if alias_target() is not None:
+        ops.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=QDRANT_ALIAS)))
+    ops.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=QDRANT_ALIAS)))
+    get_client().update_collection_aliases(change_aliases_operations=ops)
+    print(f"{QDRANT_ALIAS} -> {target} ({model}); previous: {src} ({src_model})", flush=True)
+
+    # Workers re-resolve the alias every QDRANT_ALIAS_REFRESH seconds; replay what they wrote meanwhile
+    time.sleep(QDRANT_ALIAS_REFRESH + 2)
+    stats = _catch_up(src, target, model, progress, args.batch, missing_only=True)
+    stats["pruned_docs"] = _prune_deleted_docs(target)
+    print(f"final catch-up: {stats}", flush=True)
+
+
+def cmd_rollback(args):
+    previous = load_registry().get("previous")
+    if not previous:
+        raise SystemExit("No previous collection recorded")
+    cmd_switch(args, target=previous)
+
+
+def cmd_drop(args):
+    collection, _ = active_index(refresh=True)
+    if args.collection == collection:
+        raise SystemExit(f"{args.collection} is active")
+    get_client().delete_collection(args.collection)
+    registry = load_registry()
+    (registry.get("models") or {}).pop(args.collection, None)
+    if registry.get("previous") == args.collection:
+        registry["previous"] = None
+    save_registry(registry)
+    print(f"dropped {args.collection}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status")
+
+    def throttled(p):
+        p.add_argument("--rate", type=float, default=0, help="max chunks/s to embed (0 = unthrottled)")
+        p.add_argument("--batch", type=int, default=128, help="chunks per embedding call")
+        p.add_argument("--threads", type=int, default=0, help="torch threads (0 = library default)")
+        p.add_argument("--nice", type=int, default=0, help="lower this process' CPU priority")
+        p.add_argument("--timeout", type=float, default=3600, help="seconds to wait for indexing")
+        return p
+
+    build = throttled(sub.add_parser("build"))
+    build.add_argument("--model", required=True)
+    build.add_argument("--name", default=None, help="collection name (reuse to resume)")
+    switch = throttled(sub.add_parser("switch"))
+    switch.add_argument("collection")
+    switch.add_argument("--max-lag", type=int, default=1000,
+                        help="switch once a catch-up pass has at most this many changes")
+    rollback = throttled(sub.add_parser("rollback"))
+    rollback.add_argument("--max-lag", type=int, default=1000)
+    drop = sub.add_parser("drop")
+    drop.add_argument("collection")
+    args = ap.parse_args()
+    {
+        "status": cmd_status,
+        "build": cmd_build,
+        "switch": cmd_switch,
+        "rollback": cmd_rollback,
+        "drop": cmd_drop,
+    }[args.cmd](args)
+
+
+if __name__ == "__main__":
+    main()
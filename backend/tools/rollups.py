@@ -0,0 +1,79 @@
+# tools/rollups.py
+"""
+Maintain the daily analytics rollups (services/analytics_rollup_service.py).
+
+    python -m tools.rollups status
+    python -m tools.rollups run                                  # fold everything past the watermark
+    python -m tools.rollups backfill --from 2025-01-01 --to 2025-03-31
+
+`run` is what the in-process scheduler does every ROLLUP_INTERVAL_SECONDS; use it
+from cron instead when the scheduler is disabled (ROLLUP_INTERVAL_SECONDS=0).
+`backfill` recomputes a day range from raw messages: run it once after applying
+migrations/004 (after `run` has caught up) and after bulk edits or deletes of
+old messages, which the incremental job does not see.
+"""
+import argparse
+import json
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import func
+
+from utils.db import SessionLocal
+from utils.models import AnalyticsDaily, Message, RollupWatermark
+from services import analytics_rollup_service as rollups
+
+
+def _date(s: str) -> date:
+    return datetime.strptime(s, "%Y-%m-%d").date()
+
+
+def cmd_status(db, args):
+    wm = db.get(RollupWatermark, rollups.WATERMARK)
+    last_id = wm.last_id if wm else 0
+    pending = db.query(func.count(Message.id)).filter(Message.id > last_id).scalar()
+    first, last = db.query(func.min(AnalyticsDaily.day), func.max(AnalyticsDaily.day)).one()
+    return {
+        "watermark": last_id,
+        "watermark_updated_at": wm.updated_at.isoformat() if wm and wm.updated_at else None,
+        "pending_rows": pending,
+        "days": db.query(func.count(AnalyticsDaily.day)).scalar(),
+        "first_day": first.isoformat() if first else None,
+        "last_day": last.isoformat() if last else None,
+    }
+
+
+def cmd_run(db, args):
+    return rollups.run_rollups(db, batch=args.batch)
+
+
+def cmd_backfill(db, args):
+    end = args.to or datetime.now(timezone.utc).date()
+    start = args.start or (end - timedelta(days=args.days - 1))
+    if start > end:
+        raise SystemExit("--from must not be after --to")
+    return rollups.backfill(db, start, end, batch=args.batch)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status")
+    p = sub.add_parser("run")
+    p.add_argument("--batch", type=int, default=rollups.ROLLUP_BATCH)
+    p = sub.add_parser("backfill")
+    p.add_argument("--from", dest="start", type=_date, default=None, help="first UTC day (YYYY-MM-DD)")
+    p.add_argument("--to", type=_date, default=None, help="last UTC day, inclusive (default: today)")
+    p.add_argument("--days", type=int, default=30, help="range length when --from is omitted")
+    p.add_argument("--batch", type=int, default=rollups.ROLLUP_BATCH)
+    args = ap.parse_args()
+
+    db = SessionLocal()
+    try:
+        res = {"status": cmd_status, "run": cmd_run, "backfill": cmd_backfill}[args.cmd](db, args)
+    finally:
+        db.close()
+    print(json.dumps(res, default=str, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# tools/startup_profile.py
+"""
+Where does startup time go?
+
+    python -m tools.startup_profile               # import times of `main`
+    python -m tools.startup_profile --warmup      # plus each warm-up step
+    python -m tools.startup_profile --module services.chat_service --top 40
+
+Imports are measured with `python -X importtime` in a fresh interpreter, so the
+numbers match a cold uvicorn worker. The report lists the slowest top-level
+packages (self time of all their modules) and the slowest individual imports
+(cumulative, i.e. including what they pulled in).
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def import_times(module: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self_us, cumulative_us, depth) in import order."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), (len(m.group(3)) - 1) // 2))
+    if out.returncode != 0:
+        tail = "\n".join(l for l in out.stderr.splitlines() if not l.startswith("import time:"))[-2000:]
+        raise SystemExit(f"`import {module}` failed:\n{tail}")
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--module", default="main")
+    ap.add_argument("--top", type=int, default=25)
+    ap.add_argument("--warmup", action="store_true", help="also time core.warmup steps in-process")
+    args = ap.parse_args()
+
+    rows = import_times(args.module)
+    total_us = sum(r[1] for r in rows)
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, self_us, _cum, _depth in rows:
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"import {args.module}: {total_us / 1e6:.2f}s, {len(rows)} modules")
+    print(f"\n{'package':<32}{'self_s':>9}{'share':>8}")
+    for pkg, us in sorted(by_package.items(), key=lambda kv: -kv[1])[: args.top]:
+        print(f"{pkg:<32}{us / 1e6:>9.3f}{us / max(total_us, 1):>8.1%}")
+
+    print(f"\n{'module':<48}{'cumulative_s':>13}{'self_s':>9}")
+    for name, self_us, cum_us, _depth in sorted(rows, key=lambda r: -r[2])[: args.top]:
+        print(f"{name:<48}{cum_us / 1e6:>13.3f}{self_us / 1e6:>9.3f}")
+
+    if args.warmup:
+        __import__(args.module)
+        from core import warmup
+        report = warmup.run()
+        print("\nwarm-up steps:")
+        for step, res in report["steps"].items():
+            status = "ok" if res["ok"] else res.get("error", "failed")
+            print(f"  {step:<14}{res['seconds']:>8.2f}s  {status}")
+        print(json.dumps({"warmed": warmup.warmed()}))
+
+
+if __name__ == "__main__":
+    main()
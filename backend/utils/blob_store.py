@@ -0,0 +1,69 @@
+# utils/blob_store.py
+import os
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Tuple
+
+# --------------------
+# Config
+# --------------------
+# Content-addressed layout: <DOCS_STORAGE_DIR>/blobs/<sha[:2]>/<sha>
+# Identical bytes are stored once; documents rows sharing a content_hash are the references.
+DOCS_STORAGE_DIR = Path(os.getenv("DOCS_STORAGE_DIR", "storage/docs"))
+BLOB_DIR = DOCS_STORAGE_DIR / "blobs"
+_TMP_DIR = BLOB_DIR / ".tmp"
+_TMP_DIR.mkdir(parents=True, exist_ok=True)
+
+_COPY_BUFSIZE = 1024 * 1024
+
+
+def blob_path(content_hash: str) -> Path:
+    return BLOB_DIR / content_hash[:2] / content_hash
+
+
+def is_blob(path: str) -> bool:
+    try:
+        return Path(path).resolve().parent.parent == BLOB_DIR.resolve()
+    except OSError:
+        return False
+
+
+def exists(content_hash: str) -> bool:
+    return blob_path(content_hash).is_file()
+
+
+def put_stream(fp: BinaryIO) -> Tuple[str, int, Path]:
+    """
+    Copy `fp` into the store, hashing while writing (single pass over the upload).
+    The temp file is fsync'ed and atomically renamed into place; if the blob already
+    exists the temp copy is discarded. Returns (sha256 hex, size in bytes, blob path).
+    """
+    h = hashlib.sha256()
+    size = 0
+    fd, tmp_name = tempfile.mkstemp(dir=_TMP_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: fp.read(_COPY_BUFSIZE), b""):
+                h.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+
+        content_hash = h.hexdigest()
+        dest = blob_path(content_hash)
+        if dest.exists():
+            os.unlink(tmp_name)
+        else:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_name, dest)
+        return content_hash, size, dest
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def remove(content_hash: str) -> None:
+    """Drop a blob. Callers check the reference count first."""
+    blob_path(content_hash).unlink(missing_ok=True)
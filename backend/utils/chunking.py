@@ -0,0 +1,211 @@
+# utils/chunking.py
+import os
+import re
+import json
+import threading
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+from utils.utils_text import chunk_text
+
+# --------------------
+# Config
+# --------------------
+# Tokens are counted with the embedding model's tokenizer so chunk sizes line up with
+# what the embedder actually sees (MiniLM truncates at 256 word pieces).
+TOKENIZER_MODEL = (
+    os.getenv("CHUNK_TOKENIZER")
+    or os.getenv("EMBEDDING_MODEL")
+    or os.getenv("EMBEDDINGS_MODEL")
+    or "sentence-transformers/all-MiniLM-L6-v2"
+)
+DEFAULT_PROFILE = os.getenv("CHUNK_PROFILE_DEFAULT", "default")
+
+# Built-in profiles; CHUNK_PROFILES (JSON object) adds or overrides entries.
+#   splitter "tokens": structure-aware, sizes in tokens
+#   splitter "chars":  the original fixed-offset character splitter
+BUILTIN_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {"splitter": "tokens", "max_tokens": 256, "overlap_tokens": 32},
+    "precise": {"splitter": "tokens", "max_tokens": 128, "overlap_tokens": 24},
+    "long":    {"splitter": "tokens", "max_tokens": 512, "overlap_tokens": 64},
+    "legacy":  {"splitter": "chars", "chunk_size": 1200, "overlap": 200},
+}
+
+
+def _json_env(key: str) -> Dict[str, Any]:
+    try:
+        val = json.loads(os.getenv(key) or "{}")
+        return val if isinstance(val, dict) else {}
+    except json.JSONDecodeError:
+        return {}
+
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    **BUILTIN_PROFILES,
+    **{k: {**BUILTIN_PROFILES.get(k, {}), **v} for k, v in _json_env("CHUNK_PROFILES").items() if isinstance(v, dict)},
+}
+# e.g. {"sharepoint": "long", "hr-policies": "precise"}
+PROFILE_BY_SOURCE: Dict[str, str] = {k: str(v) for k, v in _json_env("CHUNK_PROFILE_BY_SOURCE").items()}
+
+
+def resolve_profile(name: Optional[str] = None, source: Optional[str] = None) -> str:
+    """
+    Explicit name (per upload) > per-source mapping > CHUNK_PROFILE_DEFAULT.
+    """
+    if name:
+        if name not in PROFILES:
+            raise ValueError(f"Unknown chunk profile: {name}")
+        return name
+    if source and PROFILE_BY_SOURCE.get(source) in PROFILES:
+        return PROFILE_BY_SOURCE[source]
+    return DEFAULT_PROFILE if DEFAULT_PROFILE in PROFILES else "default"
+
+
+# --------------------
+# Token counting
+# --------------------
+_counter: Optional[Callable[[List[str]], List[int]]] = None
+_counter_lock = threading.Lock()
+_WORDISH = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def _approx_counts(texts: List[str]) -> List[int]:
+    # Word pieces run slightly above words+punctuation; good enough without a tokenizer
+    return [int(len(_WORDISH.findall(t)) * 1.2) + 1 for t in texts]
+
+
+def get_token_counter() -> Callable[[List[str]], List[int]]:
+    """Batch token counter for TOKENIZER_MODEL; falls back to a regex estimate."""
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                try:
+                    from transformers import AutoTokenizer
+                    tok = AutoTokenizer.from_pretrained(TOKENIZER_MODEL)
+
+                    def count(texts: List[str]) -> List[int]:
+                        if not texts:
+                            return []
+                        ids = tok(texts, add_special_tokens=False)["input_ids"]
+                        return [len(x) for x in ids]
+
+                    _counter = count
+                except Exception:
+                    _counter = _approx_counts
+    return _counter
+
+
+# --------------------
+# Structure-aware splitter
+# --------------------
+_PARA_SPLIT = re.compile(r"\n[ \t]*\n+")
+_SENT_SPLIT = re.compile(r"(?<=[.!?…])[\"')\]]?\s+(?=\S)")
+_HEADING = re.compile(
+    r"^(#{1,6}\s+\S.*"                      # markdown heading
+    r"|\d+(\.\d+)*\.?\s+[A-Z][^.!?]{0,78}"  # 1.2 Numbered heading
+    r"|[A-Z0-9][A-Z0-9 \-–:,&/()]{2,78})$"  # ALL CAPS HEADING
+)
+
+# boundary kinds, strongest first
+HEADING, PARAGRAPH, SENTENCE = 0, 1, 2
+
+
+def _units(text: str) -> Iterator[Tuple[str, int]]:
+    """Yield (unit text, boundary kind before it) in a single left-to-right pass."""
+    for para in _PARA_SPLIT.split(text):
+        lines = [ln.strip() for ln in para.split("\n") if ln.strip()]
+        if not lines:
+            continue
+        if _HEADING.match(lines[0]):
+            yield lines[0], HEADING
+            lines = lines[1:]
+        kind = PARAGRAPH
+        for sent in _SENT_SPLIT.split(" ".join(lines)):
+            sent = sent.strip()
+            if sent:
+                yield sent, kind
+                kind = SENTENCE
+
+
+def _split_long(unit: str, n_tokens: int, max_tokens: int) -> List[str]:
+    # A single sentence over budget: cut on word boundaries, proportional to its token density
+    words = unit.split()
+    per_piece = max(1, int(len(words) * max_tokens / max(n_tokens, 1)))
+    return [" ".join(words[i:i + per_piece]) for i in range(0, len(words), per_piece)]
+
+
+def _overlap_tail(cur: List[Tuple[str, int, int]], overlap_tokens: int) -> List[Tuple[str, int, int]]:
+    carry: List[Tuple[str, int, int]] = []
+    acc = 0
+    for u, kind, n in reversed(cur):
+        if acc + n > overlap_tokens or kind == HEADING:
+            break
+        carry.insert(0, (u, SENTENCE, n))
+        acc += n
+    return carry
+
+
+def chunk_tokens(text: str, max_tokens: int = 256, overlap_tokens: int = 32, **_) -> List[str]:
+    """
+    Pack sentences into chunks of at most `max_tokens`, breaking preferably at headings
+    and paragraphs, never mid-word. Each unit is tokenized once, so this is linear in
+    the input size. Consecutive chunks share up to `overlap_tokens` of trailing sentences
+    (not across headings).
+    """
+    if not text or not text.strip():
+        return []
+    count = get_token_counter()
+    raw = list(_units(text))
+    sizes = count([u for u, _ in raw])
+
+    units: List[Tuple[str, int, int]] = []
+    for (u, kind), n in zip(raw, sizes):
+        if n <= max_tokens:
+            units.append((u, kind, n))
+            continue
+        pieces = _split_long(u, n, max_tokens)
+        for j, (piece, pn) in enumerate(zip(pieces, count(pieces))):
+            units.append((piece, kind if j == 0 else SENTENCE, pn))
+
+    soft_limit = int(max_tokens * 0.75)
+    chunks: List[str] = []
+    cur: List[Tuple[str, int, int]] = []
+    cur_tokens = 0
+
+    def emit():
+        parts = []
+        for i, (u, kind, _n) in enumerate(cur):
+            if i:
+                parts.append("\n" if cur[i - 1][1] == HEADING else ("\n\n" if kind != SENTENCE else " "))
+            parts.append(u)
+        chunks.append("".join(parts))
+
+    for unit in units:
+        u, kind, n = unit
+        full = cur_tokens + n > max_tokens
+        section = kind == HEADING and cur
+        early = kind == PARAGRAPH and cur_tokens >= soft_limit
+        if cur and (full or section or early):
+            emit()
+            carry = [] if section else _overlap_tail(cur, overlap_tokens)
+            carry_tokens = sum(c[2] for c in carry)
+            if carry_tokens + n > max_tokens:
+                carry, carry_tokens = [], 0
+            cur, cur_tokens = carry, carry_tokens
+        cur.append(unit)
+        cur_tokens += n
+    if cur:
+        emit()
+    return chunks
+
+
+def chunk(text: str, profile: Optional[str] = None) -> List[str]:
+    """Chunk `text` with a named profile (see PROFILES)."""
+    cfg = PROFILES[profile or resolve_profile()]
+    if cfg.get("splitter") == "chars":
+        return chunk_text(text, int(cfg.get("chunk_size", 1200)), int(cfg.get("overlap", 200)))
+    return chunk_tokens(
+        text,
+        max_tokens=int(cfg.get("max_tokens", 256)),
+        overlap_tokens=int(cfg.get("overlap_tokens", 32)),
+    )
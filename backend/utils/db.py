@@ -3,12 +3,43 @@ import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True)
+# --------------------
+# Pool config (per process: with N workers the server opens up to
+# N * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections per engine)
+# --------------------
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))        # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))        # reconnect connections older than this
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 = server default
+# async engine used by async routes; defaults to DATABASE_URL with the asyncpg driver
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or (
+    DATABASE_URL.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+    .replace("postgresql://", "postgresql+asyncpg://", 1)
+    if DATABASE_URL else None
+)
+
+_pool_kwargs = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"} if DB_STATEMENT_TIMEOUT_MS else {},
+    future=True,
+    **_pool_kwargs,
+)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 Base = declarative_base()
 
@@ -18,3 +49,70 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# --------------------
+# Async engine (asyncpg), created on first use
+# --------------------
+_async_engine = None
+_AsyncSessionLocal = None
+
+def get_async_engine():
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        connect_args = {}
+        if DB_STATEMENT_TIMEOUT_MS:
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+        _async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args=connect_args, **_pool_kwargs)
+        # expire_on_commit=False: attributes stay readable after commit without a lazy (sync) reload
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+def AsyncSessionLocal():
+    get_async_engine()
+    return _AsyncSessionLocal()
+
+async def get_async_db():
+    """FastAPI dependency for `async def` routes: the query awaits instead of blocking the loop."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = _AsyncSessionLocal = None
+
+class _Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) <statement>, compiled like the statement itself so bind processors run."""
+    inherit_cache = False
+
+    def __init__(self, stmt):
+        self.stmt = stmt
+
+@compiles(_Explain)
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.stmt, **kw)
+
+def estimate_count(db, query) -> int:
+    """
+    Planner row estimate for a query (EXPLAIN, nothing is scanned). Good enough for
+    "about N results" on large tables where COUNT(*) would be a full scan.
+    """
+    stmt = getattr(query, "statement", query)
+    # executed through the session, not exec_driver_sql: parameters go through their
+    # types' bind processors (e.g. a JSONB list is serialized, not sent as an ARRAY)
+    plan = db.execute(_Explain(stmt)).scalar()
+    if isinstance(plan, str):
+        import json
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def pool_stats() -> dict:
+    """Checked-out / idle / overflow connections of each engine in this process."""
+    def one(pool):
+        return {"size": pool.size(), "checked_out": pool.checkedout(), "idle": pool.checkedin(), "overflow": pool.overflow()}
+    out = {"sync": one(engine.pool)}
+    if _async_engine is not None:
+        out["async"] = one(_async_engine.pool)
+    return out
@@ -0,0 +1,133 @@
+# utils/embedding_cache.py
+import os
+import sqlite3
+import hashlib
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+# --------------------
+# Config
+# --------------------
+# Persistent (model, sha256(chunk text)) -> float32 vector cache.
+# SQLite keeps it a single local file; vectors are stored as packed float32 blobs.
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "storage/embed_cache.sqlite3")
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "1").lower() not in {"0", "false", "no"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    text_hash BLOB NOT NULL,
+    dim INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (model, text_hash)
+) WITHOUT ROWID
+"""
+
+# SQLite caps bound parameters per statement; stay well below the limit
+_LOOKUP_BATCH = 500
+
+
+def text_digest(text: str) -> bytes:
+    """sha256 of the chunk text, raw 32 bytes (hex is twice the size on disk)."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def _pack(vec: Sequence[float]) -> bytes:
+    return array("f", vec).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    a = array("f")
+    a.frombytes(blob)
+    return a.tolist()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+
+    def get_many(self, model: str, digests: List[bytes]) -> Dict[bytes, List[float]]:
+        found: Dict[bytes, List[float]] = {}
+        unique = list(dict.fromkeys(digests))
+        with self._lock:
+            for i in range(0, len(unique), _LOOKUP_BATCH):
+                part = unique[i:i + _LOOKUP_BATCH]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    [model, *part],
+                ).fetchall()
+                for h, blob in rows:
+                    found[bytes(h)] = _unpack(blob)
+        return found
+
+    def put_many(self, model: str, items: Dict[bytes, Sequence[float]]) -> None:
+        if not items:
+            return
+        rows = [(model, h, len(v), _pack(v)) for h, v in items.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+# --------------------
+# Lazy singleton
+# --------------------
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[EmbeddingCache]:
+    global _cache
+    if not EMBED_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(EMBED_CACHE_PATH)
+    return _cache
+
+
+def embed_with_cache(model: str, texts: List[str], embed_fn) -> List[List[float]]:
+    """
+    Return one vector per text, calling embed_fn only for texts not already cached
+    under `model`. Duplicate texts inside the batch are embedded once.
+    """
+    if not texts:
+        return []
+    cache = get_cache()
+    if cache is None:
+        return embed_fn(texts)
+
+    digests = [text_digest(t) for t in texts]
+    hits = cache.get_many(model, digests)
+
+    missing: Dict[bytes, str] = {}
+    for h, t in zip(digests, texts):
+        if h not in hits and h not in missing:
+            missing[h] = t
+
+    if missing:
+        fresh = embed_fn(list(missing.values()))
+        if len(fresh) != len(missing):
+            raise ValueError("embed_documents returned a different length than chunks")
+        new_items = dict(zip(missing.keys(), fresh))
+        cache.put_many(model, new_items)
+        hits.update(new_items)
+
+    return [hits[h] for h in digests]
@@ -1,8 +1,12 @@
 # utils/langchain_store.py
 import os
+import json
 import time
 import uuid
-from typing import List, Dict, Optional
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Any, Tuple
 
 from qdrant_client import QdrantClient
 from qdrant_client.models import (
@@ -12,14 +16,21 @@ from qdrant_client.models import (
     Filter,
     FieldCondition,
     MatchValue,
+    MatchAny,
     FilterSelector,
+    PointIdsList,
+    PayloadSchemaType,
+    HnswConfigDiff,
+    VectorParamsDiff,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    QuantizationSearchParams,
+    SearchParams,
+    Disabled,
 )
 
-# LangChain embeddings — support old/new import paths
-try:
-    from langchain_huggingface import HuggingFaceEmbeddings
-except Exception:
-    from langchain.embeddings import HuggingFaceEmbeddings  # older LC
+from utils.embedding_cache import embed_with_cache
 
 # --------------------
 # Config
@@ -27,44 +38,204 @@ except Exception:
 QDRANT_URL = os.getenv("QDRANT_URL", "http://qdrant:6333")  # <- use compose service name by default
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")  # optional
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "jesa_docs")
-EMBED_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# Serving alias for blue/green re-embedding (tools/reembed). While it does not exist,
+# QDRANT_COLLECTION itself is served with EMBEDDING_MODEL.
+QDRANT_ALIAS = os.getenv("QDRANT_ALIAS", f"{QDRANT_COLLECTION}_live")
+QDRANT_ALIAS_REFRESH = float(os.getenv("QDRANT_ALIAS_REFRESH", "15"))  # seconds between alias lookups
+# EMBEDDINGS_MODEL is the name core/ai used to read; accepted so old .env files keep working
+EMBED_MODEL = os.getenv("EMBEDDING_MODEL") or os.getenv("EMBEDDINGS_MODEL") or "sentence-transformers/all-MiniLM-L6-v2"
 DISTANCE = os.getenv("EMBED_DISTANCE", "COSINE").upper()  # COSINE | DOT | EUCLID
 
 # Optional embeddings device (cpu/cuda)
 EMBED_DEVICE = os.getenv("EMBED_DEVICE", "cpu")
 
+
+def _env_flag(key: str, default: str) -> bool:
+    return os.getenv(key, default).lower() in {"1", "true", "yes"}
+
+
+# Transport / write path
+QDRANT_PREFER_GRPC = _env_flag("QDRANT_PREFER_GRPC", "0")
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_UPSERT_BATCH = int(os.getenv("QDRANT_UPSERT_BATCH", "256"))      # points per request
+QDRANT_UPSERT_PARALLEL = int(os.getenv("QDRANT_UPSERT_PARALLEL", "2"))  # concurrent requests per upsert
+QDRANT_UPSERT_WAIT = _env_flag("QDRANT_UPSERT_WAIT", "1")               # 0 = async ack, verify later
+
+# Collection tuning (applied on create; `python -m tools.qdrant_tune apply` for existing collections)
+QDRANT_PAYLOAD_INDEXES = [f.strip() for f in os.getenv("QDRANT_PAYLOAD_INDEXES", "doc_id,tags,source,ext").split(",") if f.strip()]
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()  # none | int8
+QDRANT_QUANTILE = float(os.getenv("QDRANT_QUANTILE", "0.99"))
+QDRANT_QUANTIZATION_ALWAYS_RAM = _env_flag("QDRANT_QUANTIZATION_ALWAYS_RAM", "1")
+QDRANT_ON_DISK_VECTORS = _env_flag("QDRANT_ON_DISK_VECTORS", "0")  # originals on disk, int8 copy in RAM
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+QDRANT_SEARCH_EF = int(os.getenv("QDRANT_SEARCH_EF", "0")) or None   # None = server default
+QDRANT_RESCORE = _env_flag("QDRANT_RESCORE", "1")
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+
 # --------------------
 # Lazy singletons
 # --------------------
 _client: Optional[QdrantClient] = None
-_embeddings: Optional[HuggingFaceEmbeddings] = None
+_embeddings: Dict[str, Any] = {}  # model name -> HuggingFaceEmbeddings
+_embeddings_lock = threading.Lock()
 
 
 def get_client() -> QdrantClient:
     global _client
     if _client is None:
-        _client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, timeout=30.0)
+        _client = QdrantClient(
+            url=QDRANT_URL,
+            api_key=QDRANT_API_KEY,
+            timeout=30.0,
+            prefer_grpc=QDRANT_PREFER_GRPC,
+            grpc_port=QDRANT_GRPC_PORT,
+        )
     return _client
 
 
-def get_embeddings() -> HuggingFaceEmbeddings:
-    global _embeddings
-    if _embeddings is None:
-        # Avoid heavy downloads at import-time; create on first use
-        # For langchain_huggingface>=0.0.3: use model_kwargs to set device
+def reset_client(close: bool = True) -> None:
+    """
+    Forget the Qdrant client and the resolved active index. The pre-fork master calls
+    this with close=True once models are loaded; forked workers call it with close=False,
+    since HTTP/gRPC connections inherited from the parent must not be reused or closed.
+    """
+    global _client, _active, _active_at
+    client, _client = _client, None
+    _active, _active_at = None, 0.0
+    if client is not None and close:
         try:
-            _embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL, model_kwargs={"device": EMBED_DEVICE})
-        except TypeError:
-            # Older LC fallback
-            _embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-    return _embeddings
+            client.close()
+        except Exception:
+            pass
+
+
+def _embeddings_cls():
+    # Imported on first use: pulls in torch / sentence-transformers
+    # LangChain embeddings — support old/new import paths
+    try:
+        from langchain_huggingface import HuggingFaceEmbeddings
+    except Exception:
+        from langchain.embeddings import HuggingFaceEmbeddings  # older LC
+    return HuggingFaceEmbeddings
+
+
+def get_embeddings(model: Optional[str] = None):
+    """Embeddings for `model` (default: the model of the active index), loaded on first use."""
+    model = model or active_model()
+    emb = _embeddings.get(model)
+    if emb is None:
+        # Concurrent first requests must not load the weights twice
+        with _embeddings_lock:
+            emb = _embeddings.get(model)
+            if emb is None:
+                # Avoid heavy downloads at import-time; create on first use
+                # For langchain_huggingface>=0.0.3: use model_kwargs to set device
+                HuggingFaceEmbeddings = _embeddings_cls()
+                try:
+                    emb = HuggingFaceEmbeddings(model_name=model, model_kwargs={"device": EMBED_DEVICE})
+                except TypeError:
+                    # Older LC fallback
+                    emb = HuggingFaceEmbeddings(model_name=model)
+                _embeddings[model] = emb
+    return emb
+
+
+# --------------------
+# Active index: alias -> collection -> embedding model
+# --------------------
+# The model each versioned collection was built with lives in Postgres (config_kv),
+# written by tools/reembed before the alias is ever pointed at the collection.
+VECTOR_INDEX_KEY = "vector_index"
+
+_active: Optional[Tuple[str, str]] = None
+_active_at = 0.0
+_active_lock = threading.Lock()
+
+
+def load_registry() -> Dict[str, Any]:
+    """{"models": {collection: model}, "previous": collection} (empty when never re-embedded)."""
+    from utils.db import SessionLocal
+    from utils.models import ConfigKV
+
+    db = SessionLocal()
+    try:
+        row = db.query(ConfigKV).filter(ConfigKV.k == VECTOR_INDEX_KEY).first()
+        return json.loads(row.v) if row else {}
+    finally:
+        db.close()
+
+
+def save_registry(registry: Dict[str, Any]) -> None:
+    from utils.db import SessionLocal
+    from utils.models import ConfigKV
 
+    db = SessionLocal()
+    try:
+        row = db.query(ConfigKV).filter(ConfigKV.k == VECTOR_INDEX_KEY).first()
+        if row:
+            row.v = json.dumps(registry)
+        else:
+            db.add(ConfigKV(k=VECTOR_INDEX_KEY, v=json.dumps(registry)))
+        db.commit()
+    finally:
+        db.close()
 
-def _embedding_dim() -> int:
+
+def alias_target(alias: Optional[str] = None) -> Optional[str]:
+    alias = alias or QDRANT_ALIAS
+    for a in get_client().get_aliases().aliases:
+        if a.alias_name == alias:
+            return a.collection_name
+    return None
+
+
+def active_index(refresh: bool = False) -> Tuple[str, str]:
+    """
+    (collection, embedding model) currently serving, re-resolved every QDRANT_ALIAS_REFRESH
+    seconds. Both come from one lookup so queries and writes never pair a collection
+    with the wrong model; resolve once per operation and pass the pair along.
+    """
+    global _active, _active_at
+    if not refresh and _active is not None and time.monotonic() - _active_at < QDRANT_ALIAS_REFRESH:
+        return _active
+    with _active_lock:
+        if not refresh and _active is not None and time.monotonic() - _active_at < QDRANT_ALIAS_REFRESH:
+            return _active
+        try:
+            collection = alias_target()
+            model = EMBED_MODEL
+            if collection:
+                model = (load_registry().get("models") or {}).get(collection, EMBED_MODEL)
+            else:
+                collection = QDRANT_COLLECTION
+        except Exception:
+            # Qdrant/Postgres unreachable: keep serving the last known index and cache that
+            # answer like a successful one, so calls don't each wait on the failing lookup
+            _active, _active_at = _active or (QDRANT_COLLECTION, EMBED_MODEL), time.monotonic()
+            return _active
+        if _active is not None and _active[1] != model:
+            # Switched models: drop the old weights
+            with _embeddings_lock:
+                for name in [m for m in _embeddings if m != model]:
+                    _embeddings.pop(name, None)
+        _active, _active_at = (collection, model), time.monotonic()
+        return _active
+
+
+def active_collection() -> str:
+    return active_index()[0]
+
+
+def active_model() -> str:
+    return active_index()[1]
+
+
+def embedding_dim(model: Optional[str] = None) -> int:
     """
     Robustly get the sentence embedding dimension from the embeddings object.
     """
-    embeddings = get_embeddings()
+    embeddings = get_embeddings(model)
     for attr in ("client", "model"):
         try:
             st = getattr(embeddings, attr)
@@ -75,32 +246,121 @@ def _embedding_dim() -> int:
     return len(embeddings.embed_query("dimension probe"))
 
 
+def _distance() -> Distance:
+    dist_map = {"COSINE": Distance.COSINE, "DOT": Distance.DOT, "EUCLID": Distance.EUCLID}
+    return dist_map.get(DISTANCE, Distance.COSINE)
+
+
+def hnsw_config() -> HnswConfigDiff:
+    return HnswConfigDiff(m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT)
+
+
+def quantization_config() -> Optional[ScalarQuantization]:
+    if QDRANT_QUANTIZATION != "int8":
+        return None
+    return ScalarQuantization(
+        scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8,
+            quantile=QDRANT_QUANTILE,
+            always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM,
+        )
+    )
+
+
+def search_params(hnsw_ef: Optional[int] = None) -> Optional[SearchParams]:
+    """
+    Query-time knobs: HNSW ef and, with int8 quantization, rescoring on the original
+    vectors over an oversampled candidate set.
+    """
+    ef = hnsw_ef or QDRANT_SEARCH_EF
+    quant = None
+    if QDRANT_QUANTIZATION == "int8":
+        quant = QuantizationSearchParams(rescore=QDRANT_RESCORE, oversampling=QDRANT_OVERSAMPLING)
+    if ef is None and quant is None:
+        return None
+    return SearchParams(hnsw_ef=ef, quantization=quant)
+
+
+def ensure_payload_indexes(collection: Optional[str] = None) -> List[str]:
+    """
+    Keyword payload indexes for filtered deletes/searches. Idempotent; returns the
+    fields that had to be created.
+    """
+    client = get_client()
+    collection = collection or active_collection()
+    existing = set((client.get_collection(collection).payload_schema or {}).keys())
+    created = []
+    for field in QDRANT_PAYLOAD_INDEXES:
+        if field in existing:
+            continue
+        client.create_payload_index(
+            collection_name=collection,
+            field_name=field,
+            field_schema=PayloadSchemaType.KEYWORD,
+            wait=True,
+        )
+        created.append(field)
+    return created
+
+
+def apply_collection_config(collection: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Bring an existing collection in line with the configured tuning: on-disk vectors,
+    HNSW parameters, int8 quantization (or none) and payload indexes. Qdrant rebuilds
+    affected segments in the background; search keeps working meanwhile.
+    """
+    client = get_client()
+    collection = collection or active_collection()
+    quant = quantization_config()
+    client.update_collection(
+        collection_name=collection,
+        vectors_config={"": VectorParamsDiff(on_disk=QDRANT_ON_DISK_VECTORS)},
+        hnsw_config=hnsw_config(),
+        quantization_config=quant if quant is not None else Disabled.DISABLED,
+    )
+    created = ensure_payload_indexes(collection)
+    return {
+        "collection": collection,
+        "on_disk_vectors": QDRANT_ON_DISK_VECTORS,
+        "hnsw": {"m": QDRANT_HNSW_M, "ef_construct": QDRANT_HNSW_EF_CONSTRUCT},
+        "quantization": QDRANT_QUANTIZATION,
+        "payload_indexes_created": created,
+    }
+
+
+def create_collection(collection: str, dim: int, hnsw: Optional[HnswConfigDiff] = None) -> None:
+    get_client().create_collection(
+        collection_name=collection,
+        vectors_config=VectorParams(size=dim, distance=_distance(), on_disk=QDRANT_ON_DISK_VECTORS),
+        hnsw_config=hnsw or hnsw_config(),
+        quantization_config=quantization_config(),
+    )
+
+
 def ensure_collection(retries: int = 60, delay: float = 1.0) -> None:
     """
-    Ensure the target collection exists. Retry while Qdrant is booting.
-    Call this from FastAPI startup.
+    Ensure the active collection exists (with configured tuning) and has its payload
+    indexes. Retry while Qdrant is booting. Call this from FastAPI startup.
     """
     client = get_client()
-    dist_map = {"COSINE": Distance.COSINE, "DOT": Distance.DOT, "EUCLID": Distance.EUCLID}
     dim = None
 
     for attempt in range(1, retries + 1):
         try:
+            collection, model = active_index(refresh=True)
             # Quick readiness probe
             try:
-                client.get_collection(QDRANT_COLLECTION)
-                return  # already exists
+                client.get_collection(collection)
+                exists = True
             except Exception:
-                pass
+                exists = False
 
-            # Lazily compute dim only when Qdrant seems reachable to save time
-            if dim is None:
-                dim = _embedding_dim()
-
-            client.create_collection(
-                collection_name=QDRANT_COLLECTION,
-                vectors_config=VectorParams(size=dim, distance=dist_map.get(DISTANCE, Distance.COSINE)),
-            )
+            if not exists:
+                # Lazily compute dim only when Qdrant seems reachable to save time
+                if dim is None:
+                    dim = embedding_dim(model)
+                create_collection(collection, dim)
+            ensure_payload_indexes(collection)
             return
         except Exception as e:
             if attempt == retries:
@@ -111,40 +371,263 @@ def ensure_collection(retries: int = 60, delay: float = 1.0) -> None:
 # --------------------
 # Public API
 # --------------------
+def embed_chunks(chunks: List[str], model: Optional[str] = None) -> List[List[float]]:
+    """
+    Embed chunk texts, consulting the (model, sha256(text)) cache first.
+    """
+    model = model or active_model()
+    return embed_with_cache(model, chunks, get_embeddings(model).embed_documents)
+
+
+def _point_id(doc_id: str, chunk_index: int) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{doc_id}:{chunk_index}"))
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_points(doc_id: str, items: List[tuple], vectors: List[List[float]], metadata: Dict) -> List[PointStruct]:
+    """
+    items: (chunk_index, text) pairs, vectors aligned with items.
+    """
+    if len(vectors) != len(items):
+        raise ValueError("embed_documents returned a different length than chunks")
+    return [
+        PointStruct(
+            id=_point_id(doc_id, i),  # send as string
+            vector=vec,
+            payload={
+                **(metadata or {}),
+                "doc_id": doc_id,
+                "chunk_index": i,
+                "chunk_hash": chunk_hash(text),
+                "text": text,
+            },
+        )
+        for (i, text), vec in zip(items, vectors)
+    ]
+
+
+def _build_points(doc_id: str, items: List[tuple], metadata: Dict, model: Optional[str] = None) -> List[PointStruct]:
+    # embeds only what is not cached
+    return make_points(doc_id, items, embed_chunks([text for _, text in items], model), metadata)
+
+
+def upsert_batched(
+    client: QdrantClient,
+    collection: str,
+    points: List[PointStruct],
+    batch_size: int,
+    parallel: int,
+    wait: bool,
+) -> None:
+    """
+    Split `points` into requests of at most `batch_size` and send up to `parallel` at once.
+    Keeps huge documents under request size limits; wait=False returns on receipt
+    (use count_points / wait_for_count to confirm later).
+    """
+    batch_size = max(1, batch_size)
+    batches = [points[i:i + batch_size] for i in range(0, len(points), batch_size)]
+    if len(batches) <= 1 or parallel <= 1:
+        for b in batches:
+            client.upsert(collection_name=collection, points=b, wait=wait)
+        return
+    with ThreadPoolExecutor(max_workers=min(parallel, len(batches))) as pool:
+        # list() re-raises the first failed batch
+        list(pool.map(lambda b: client.upsert(collection_name=collection, points=b, wait=wait), batches))
+
+
+def upsert_points(points: List[PointStruct], wait: Optional[bool] = None, collection: Optional[str] = None) -> None:
+    if points:
+        upsert_batched(
+            get_client(), collection or active_collection(), points,
+            batch_size=QDRANT_UPSERT_BATCH,
+            parallel=QDRANT_UPSERT_PARALLEL,
+            wait=QDRANT_UPSERT_WAIT if wait is None else wait,
+        )
+
+
+def count_points(doc_id: Optional[str] = None, collection: Optional[str] = None) -> int:
+    """Exact point count, for the whole collection or one document."""
+    return get_client().count(
+        collection_name=collection or active_collection(),
+        count_filter=_doc_filter(doc_id) if doc_id else None,
+        exact=True,
+    ).count
+
+
+def wait_for_count(
+    expected: int,
+    doc_id: Optional[str] = None,
+    timeout: float = 120.0,
+    interval: float = 0.5,
+    collection: Optional[str] = None,
+) -> bool:
+    """
+    Consistency check after wait=False writes: poll until at least `expected` points
+    are visible. Returns False on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if count_points(doc_id, collection) >= expected:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+
+
 def upsert_document(doc_id: str, chunks: List[str], metadata: Dict):
     """
     Embed chunks and upsert to Qdrant. Uses deterministic UUIDv5 per (doc_id, chunk_index).
+    Chunks already embedded with the active model are served from the local embedding cache.
     """
     if not chunks:
         return
 
-    vectors = get_embeddings().embed_documents(chunks)
-    if len(vectors) != len(chunks):
-        raise ValueError("embed_documents returned a different length than chunks")
+    collection, model = active_index()
+    upsert_points(_build_points(doc_id, list(enumerate(chunks)), metadata, model), collection=collection)
 
-    points: List[PointStruct] = []
-    for i, (vec, text) in enumerate(zip(vectors, chunks)):
-        pid = uuid.uuid5(uuid.NAMESPACE_URL, f"{doc_id}:{i}")
-        points.append(
-            PointStruct(
-                id=str(pid),  # send as string
-                vector=vec,
-                payload={
-                    **(metadata or {}),
-                    "doc_id": doc_id,
-                    "chunk_index": i,
-                    "text": text,
-                },
-            )
+
+def _scope_condition(tags: Optional[List[str]], sources: Optional[List[str]]) -> Optional[Filter]:
+    must = []
+    if tags:
+        must.append(FieldCondition(key="tags", match=MatchAny(any=list(tags))))
+    if sources:
+        must.append(FieldCondition(key="source", match=MatchAny(any=list(sources))))
+    return Filter(must=must) if must else None
+
+
+def scope_filter(
+    tags: Optional[List[str]] = None,
+    sources: Optional[List[str]] = None,
+    role_scopes: Optional[List[Dict[str, List[str]]]] = None,
+) -> Optional[Filter]:
+    """
+    Payload filter applied inside the ANN search (backed by the tags/source keyword indexes).
+    An explicit scope (tags AND sources, any-of within each) narrows the role-derived scope;
+    role scopes are OR-ed together. None means unscoped.
+    """
+    must = []
+    explicit = _scope_condition(tags, sources)
+    if explicit is not None:
+        must.append(explicit)
+    if role_scopes:
+        allowed = [c for c in (_scope_condition(r.get("tags"), r.get("sources")) for r in role_scopes) if c is not None]
+        if allowed:
+            must.append(Filter(should=allowed))
+    return Filter(must=must) if must else None
+
+
+def _doc_filter(doc_id: str) -> Filter:
+    return Filter(must=[FieldCondition(key="doc_id", match=MatchValue(value=doc_id))])
+
+
+def stored_chunks(
+    doc_id: str,
+    payload_keys: Optional[List[str]] = None,
+    collection: Optional[str] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Map point id -> payload (restricted to payload_keys) for every point of a document.
+    """
+    keys = list(payload_keys or []) + ["chunk_index", "chunk_hash"]
+    collection = collection or active_collection()
+    out: Dict[str, Dict[str, Any]] = {}
+    offset = None
+    while True:
+        records, offset = get_client().scroll(
+            collection_name=collection,
+            scroll_filter=_doc_filter(doc_id),
+            limit=256,
+            offset=offset,
+            with_payload=keys,
+            with_vectors=False,
         )
+        for r in records:
+            out[str(r.id)] = r.payload or {}
+        if offset is None:
+            return out
+
 
-    get_client().upsert(collection_name=QDRANT_COLLECTION, points=points)
+def sync_document(doc_id: str, chunks: List[str], metadata: Dict) -> Dict[str, int]:
+    """
+    Incrementally bring a document's points in line with `chunks`:
+    upsert only new/changed chunks, patch payload of unchanged chunks whose metadata
+    drifted, then delete stale chunk ids. The document stays searchable throughout
+    because nothing is removed before its replacement is written.
+    """
+    metadata = metadata or {}
+    collection, model = active_index()
+    existing = stored_chunks(doc_id, payload_keys=list(metadata.keys()), collection=collection)
+
+    wanted: Dict[str, int] = {}
+    changed: List[tuple] = []
+    unchanged_stale_meta: List[str] = []
+    for i, text in enumerate(chunks):
+        pid = _point_id(doc_id, i)
+        wanted[pid] = i
+        prev = existing.get(pid)
+        if prev is None or prev.get("chunk_hash") != chunk_hash(text):
+            changed.append((i, text))
+        elif any(prev.get(k) != v for k, v in metadata.items()):
+            unchanged_stale_meta.append(pid)
+
+    client = get_client()
+    if changed:
+        upsert_points(_build_points(doc_id, changed, metadata, model), collection=collection)
+    if unchanged_stale_meta:
+        client.set_payload(collection_name=collection, payload=metadata, points=unchanged_stale_meta)
+
+    stale = [pid for pid in existing if pid not in wanted]
+    if stale:
+        client.delete(collection_name=collection, points_selector=PointIdsList(points=stale))
+
+    return {
+        "upserted": len(changed),
+        "payload_updated": len(unchanged_stale_meta),
+        "deleted": len(stale),
+        "unchanged": len(chunks) - len(changed),
+    }
+
+
+def clone_document(src_doc_id: str, dst_doc_id: str, metadata: Dict) -> int:
+    """
+    Copy an already-indexed document's points (vectors included) under a new doc_id,
+    overriding per-upload metadata. Used when identical bytes are uploaded again,
+    so nothing is extracted or embedded. Returns the number of points written.
+    """
+    client = get_client()
+    collection = active_collection()
+    written = 0
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection,
+            scroll_filter=_doc_filter(src_doc_id),
+            limit=256,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        points = [
+            PointStruct(
+                id=_point_id(dst_doc_id, (r.payload or {}).get("chunk_index", 0)),
+                vector=r.vector,
+                payload={**(r.payload or {}), **(metadata or {}), "doc_id": dst_doc_id},
+            )
+            for r in records
+        ]
+        if points:
+            upsert_points(points, collection=collection)
+            written += len(points)
+        if offset is None:
+            return written
 
 
 def delete_document(doc_id: str):
     """
     Delete all vectors for a given document by payload filter.
     """
-    cond = Filter(must=[FieldCondition(key="doc_id", match=MatchValue(value=doc_id))])
-    selector = FilterSelector(filter=cond)
-    get_client().delete(collection_name=QDRANT_COLLECTION, points_selector=selector)
+    selector = FilterSelector(filter=_doc_filter(doc_id))
+    get_client().delete(collection_name=active_collection(), points_selector=selector)
@@ -0,0 +1,98 @@
+# utils/latency_sketch.py
+import math
+from typing import Any, Dict, Iterable, Optional
+
+# --------------------
+# Mergeable quantile sketch
+# --------------------
+# Log-bucketed histogram (DDSketch-style): a value v lands in bucket ceil(log_gamma(v)),
+# so every quantile is answered within DEFAULT_ALPHA relative error. Merging two sketches
+# is adding bucket counts, which makes per-minute / per-day / per-worker sketches
+# combinable into any range. ~1% error keeps a full 1ms..10min range under ~700 buckets.
+DEFAULT_ALPHA = 0.01
+MIN_MS = 0.01  # values below are clamped (bucket for ~0ms)
+
+
+class LatencySketch:
+    def __init__(self, alpha: float = DEFAULT_ALPHA):
+        self.alpha = alpha
+        self._gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, ms: float, n: int = 1) -> None:
+        v = max(float(ms), MIN_MS)
+        idx = math.ceil(math.log(v) / self._log_gamma)
+        self.buckets[idx] = self.buckets.get(idx, 0) + n
+        self.count += n
+        self.sum += float(ms) * n
+        self.min = ms if self.min is None else min(self.min, ms)
+        self.max = ms if self.max is None else max(self.max, ms)
+
+    def merge(self, other: "LatencySketch") -> "LatencySketch":
+        if other.count == 0:
+            return self
+        if abs(other.alpha - self.alpha) > 1e-12:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for idx, n in other.buckets.items():
+            self.buckets[idx] = self.buckets.get(idx, 0) + n
+        self.count += other.count
+        self.sum += other.sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if seen > rank:
+                # bucket midpoint in relative terms; exact at the extremes
+                value = 2 * self._gamma ** idx / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self, quantiles: Iterable[float] = (0.5, 0.95, 0.99)) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"count": self.count, "mean_ms": (self.sum / self.count) if self.count else None}
+        for q in quantiles:
+            out[f"p{round(q * 100):g}_ms"] = self.quantile(q)
+        return out
+
+    # ---- (de)serialization: compact JSON for JSONB columns
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "a": self.alpha,
+            "n": self.count,
+            "s": self.sum,
+            "mn": self.min,
+            "mx": self.max,
+            "b": {str(k): v for k, v in self.buckets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "LatencySketch":
+        sk = cls((data or {}).get("a", DEFAULT_ALPHA))
+        if not data:
+            return sk
+        sk.buckets = {int(k): int(v) for k, v in (data.get("b") or {}).items()}
+        sk.count = int(data.get("n") or 0)
+        sk.sum = float(data.get("s") or 0.0)
+        sk.min = data.get("mn")
+        sk.max = data.get("mx")
+        return sk
+
+
+def merge_all(items: Iterable[Optional[Dict[str, Any]]]) -> LatencySketch:
+    """Merge serialized sketches (None entries are skipped)."""
+    out = LatencySketch()
+    for d in items:
+        if d:
+            out.merge(LatencySketch.from_dict(d))
+    return out
@@ -1,7 +1,7 @@
 # models.py
 import uuid
 from sqlalchemy import (
-    Column, String, Boolean, DateTime, ForeignKey, Integer, Text, JSON, BigInteger
+    Column, String, Boolean, DateTime, ForeignKey, Integer, Text, JSON, BigInteger, Index, Date, Float, Computed
 )
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.sql import func
@@ -10,7 +10,7 @@ from utils.db import Base
 import uuid
 from sqlalchemy.dialects.postgresql import UUID as PGUUID
 from sqlalchemy import Column, String
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 
 class User(Base):
     __tablename__ = "users"
@@ -46,6 +46,10 @@ class Chat(Base):
     title = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
+    __table_args__ = (
+        Index("ix_chats_user_id_created_at_id", "user_id", created_at.desc(), id.desc()),   # chat list pages
+    )
+
 class Message(Base):
     __tablename__ = "messages"
     id = Column(BigInteger, primary_key=True, autoincrement=True)
@@ -53,6 +57,13 @@ class Message(Base):
     sender = Column(String, nullable=False)  # 'user' | 'assistant'
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    metrics = Column(JSONB)  # assistant turns: {"latency_ms", "chars"}
+    inserted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)  # always set by the server
+
+    __table_args__ = (
+        Index("ix_messages_chat_id_created_at_id", "chat_id", "created_at", "id"),   # history pages, last message
+        Index("ix_messages_created_at", "created_at"),
+    )
 
 class File(Base):
     __tablename__ = "files"
@@ -69,8 +80,22 @@ class Activity(Base):
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     user_id = Column(PGUUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"))
     activity = Column(Text, nullable=False)
+    level = Column(String(16))                                   # info | warning | error ...
     meta = Column("metadata", JSON)  # python attr 'meta', DB column 'metadata'
-    occurred_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # partition key (monthly, migrations/007), hence part of the primary key
+    occurred_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), nullable=False)
+    # maintained by Postgres; 'simple' config so ids, emails and paths are not stemmed
+    search = Column(TSVECTOR, Computed(
+        "to_tsvector('simple', activity || ' ' || coalesce(metadata::text, ''))", persisted=True
+    ))
+
+    __table_args__ = (
+        Index("ix_activities_search", search, postgresql_using="gin"),
+        Index("ix_activities_occurred_at_id", occurred_at.desc(), id.desc()),           # keyset pagination
+        Index("ix_activities_level_occurred_at_id", level, occurred_at.desc(), id.desc()),
+        Index("ix_activities_user_occurred_at_id", user_id, occurred_at.desc(), id.desc()),
+        {"postgresql_partition_by": "RANGE (occurred_at)"},
+    )
 
 class RequestLog(Base):
     __tablename__ = "request_logs"
@@ -83,7 +108,16 @@ class RequestLog(Base):
     user_agent = Column(Text)
     query_params = Column(Text)
     body = Column(JSON)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    duration_ms = Column(Float)
+    # partition key (monthly, migrations/007), hence part of the primary key
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_request_logs_created_at_id", created_at.desc(), id.desc()),
+        Index("ix_request_logs_user_created_at", user_id, created_at.desc()),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
 class Document(Base):
     __tablename__ = "documents"
 
@@ -93,17 +127,25 @@ class Document(Base):
     filename = Column(Text, nullable=False)
     ext = Column(String(16), nullable=False)
     size_bytes = Column(BigInteger, nullable=False)
-    content_hash = Column(String(64), nullable=False)
+    content_hash = Column(String(64), nullable=False, index=True)  # sha256; blobs are shared per hash
 
     storage_path = Column(Text, nullable=False)
 
     source = Column(Text)                      # optional
-    tags = Column(JSON)                        # list[str] (JSON works on SQLite & Postgres)
+    tags = Column(JSONB)                       # list[str]; GIN-indexed for @> containment
     uploaded_by = Column(Text)                 # user id / email
     status = Column(String(32), nullable=False, default="ready")
+    chunk_profile = Column(String(64))         # utils.chunking profile; NULL = pre-profile (legacy) chunks
 
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
+    __table_args__ = (
+        Index("ix_documents_uploaded_at_id", uploaded_at.desc(), id.desc()),   # keyset pagination
+        Index("ix_documents_tags_gin", tags, postgresql_using="gin", postgresql_ops={"tags": "jsonb_path_ops"}),
+        Index("ix_documents_filename_trgm", filename, postgresql_using="gin",
+              postgresql_ops={"filename": "gin_trgm_ops"}),                       # ILIKE '%q%'
+    )
+
 class VerificationCode(Base):
     __tablename__ = "verification_codes"
 
@@ -128,4 +170,56 @@ class ConfigKV(Base):
 class Setting(Base):
     __tablename__ = "settings"
     key = Column(String, primary_key=True, index=True)
-    value = Column(JSONB, nullable=True)   
\ No newline at end of file
+    value = Column(JSONB, nullable=True)   
+
+# ---------- Analytics rollups (services/analytics_rollup_service.py) ----------
+class AnalyticsDaily(Base):
+    __tablename__ = "analytics_daily"
+    day = Column(Date, primary_key=True)                 # UTC day
+    messages = Column(Integer, nullable=False, default=0)
+    users = Column(Integer, nullable=False, default=0)   # distinct chat owners (count of analytics_daily_users rows)
+    tokens = Column(Float, nullable=False, default=0)    # length(content) / 4 estimate
+    latency = Column(JSONB)                              # utils.latency_sketch: user -> assistant turn latency
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class AnalyticsDailyUser(Base):
+    __tablename__ = "analytics_daily_users"
+    day = Column(Date, primary_key=True)
+    user_id = Column(PGUUID(as_uuid=True), primary_key=True)
+    messages = Column(Integer, nullable=False, default=0)
+
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermarks"
+    name = Column(String(64), primary_key=True)
+    last_id = Column(BigInteger, nullable=False, default=0)   # highest messages.id folded in
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+# ---------- Request latency sketches (services/latency_service.py) ----------
+class LatencyBucket(Base):
+    __tablename__ = "latency_buckets"
+    granularity = Column(String(1), primary_key=True)                 # 'm' minute | 'h' hour (compacted)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    route = Column(String(255), primary_key=True)                     # "GET /chat/{chat_id}"; '*' = all routes
+    user_id = Column(PGUUID(as_uuid=True), primary_key=True)          # nil uuid = all users
+    count = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)               # 5xx responses
+    sketch = Column(JSONB, nullable=False)                            # utils.latency_sketch, milliseconds
+
+    __table_args__ = (
+        Index("ix_latency_buckets_route_user_start", "route", "user_id", "bucket_start"),
+    )
+
+# ---------- POST /docs/reindex-all runs (services/docs_service.py) ----------
+class ReindexRun(Base):
+    __tablename__ = "reindex_runs"
+    id = Column(PGUUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    status = Column(String(16), nullable=False, default="running")   # running | done | error
+    chunk_profile = Column(String(64))                                # override; None = each document's own
+    documents = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    totals = Column(JSONB)                                            # upserted / payload_updated / deleted / unchanged
+    failed = Column(JSONB)                                            # [{"id", "error"}]
+    error = Column(Text)                                              # the run itself failed
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True))
@@ -0,0 +1,114 @@
+# utils/text_sidecar.py
+import os
+import io
+import json
+import gzip
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from utils import blob_store
+from utils.utils_text import extract_pages
+
+# --------------------
+# Config
+# --------------------
+# Extracted text is stored once per content_hash next to the blob:
+#   blobs/<sha[:2]>/<sha>.text.json.zst  (or .gz when zstandard is not installed)
+# Payload: {"v": 1, "text": "...", "pages": [start offset of each page in text]}
+TEXT_SIDECAR_CODEC = os.getenv("TEXT_SIDECAR_CODEC", "zstd").lower()  # zstd | gzip
+
+try:
+    import zstandard as _zstd  # optional: pip install zstandard
+except Exception:
+    _zstd = None
+
+_SUFFIXES = {"zstd": ".text.json.zst", "gzip": ".text.json.gz"}
+_VERSION = 1
+
+
+def _codec() -> str:
+    return "zstd" if TEXT_SIDECAR_CODEC == "zstd" and _zstd is not None else "gzip"
+
+
+def sidecar_path(content_hash: str, codec: Optional[str] = None) -> Path:
+    blob = blob_store.blob_path(content_hash)
+    return blob.with_name(blob.name + _SUFFIXES[codec or _codec()])
+
+
+def _encode(raw: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return _zstd.ZstdCompressor(level=6).compress(raw)
+    return gzip.compress(raw, compresslevel=6)
+
+
+def _decode(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return _zstd.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def read(content_hash: str) -> Optional[Tuple[str, List[int]]]:
+    """(text, page offsets) from the sidecar, or None when missing/unreadable."""
+    for codec in ("zstd", "gzip"):
+        if codec == "zstd" and _zstd is None:
+            continue
+        p = sidecar_path(content_hash, codec)
+        if not p.is_file():
+            continue
+        try:
+            obj = json.loads(_decode(p.read_bytes(), codec))
+            if obj.get("v") == _VERSION:
+                return obj["text"], list(obj.get("pages") or [0])
+        except Exception:
+            pass
+    return None
+
+
+def write(content_hash: str, pages: List[str]) -> Tuple[str, List[int]]:
+    """Join pages, record their offsets and persist atomically. Returns (text, offsets)."""
+    offsets: List[int] = []
+    buf = io.StringIO()
+    pos = 0
+    for i, page in enumerate(pages):
+        if i:
+            buf.write("\n")
+            pos += 1
+        offsets.append(pos)
+        buf.write(page)
+        pos += len(page)
+    text = buf.getvalue()
+
+    codec = _codec()
+    dest = sidecar_path(content_hash, codec)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    raw = json.dumps({"v": _VERSION, "text": text, "pages": offsets}, ensure_ascii=False).encode("utf-8")
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=".sidecar-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(_encode(raw, codec))
+        os.replace(tmp, dest)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return text, offsets
+
+
+def load(content_hash: str, source_path: str, ext: Optional[str] = None) -> Tuple[str, List[int]]:
+    """
+    Extracted (text, page offsets) for a content hash. Parses the original file only
+    on a sidecar miss, then stores the result for every later caller.
+    """
+    hit = read(content_hash)
+    if hit is not None:
+        return hit
+    return write(content_hash, extract_pages(source_path, ext))
+
+
+def load_text(content_hash: str, source_path: str, ext: Optional[str] = None) -> str:
+    return load(content_hash, source_path, ext)[0]
+
+
+def remove(content_hash: str) -> None:
+    for codec in _SUFFIXES:
+        sidecar_path(content_hash, codec).unlink(missing_ok=True)
@@ -1,30 +1,31 @@
 # utils_text.py
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
-def extract_text(path: str) -> str:
-    """Extract plain text from .txt/.md/.pdf/.docx with graceful fallbacks."""
+def extract_pages(path: str, ext: Optional[str] = None) -> List[str]:
+    """
+    Extract plain text per page from .txt/.md/.pdf/.docx with graceful fallbacks.
+    Formats without pages (.txt/.md/.docx) come back as a single page.
+    Pass `ext` when the path carries no suffix (content-addressed blobs).
+    """
     p = Path(path)
-    ext = p.suffix.lower()
+    ext = (ext or p.suffix).lower()
 
     if ext in {".txt", ".md"}:
         # Simple read
-        return p.read_text(encoding="utf-8", errors="ignore")
+        return [p.read_text(encoding="utf-8", errors="ignore")]
 
     if ext == ".pdf":
         # Try PyPDF first, then fallback to PyMuPDF if available
         try:
             from pypdf import PdfReader  # pip install pypdf
             reader = PdfReader(str(p))
-            return "\n".join((page.extract_text() or "") for page in reader.pages)
+            return [(page.extract_text() or "") for page in reader.pages]
         except Exception:
             try:
                 import fitz  # PyMuPDF  # pip install pymupdf
-                text = []
                 with fitz.open(str(p)) as doc:
-                    for page in doc:
-                        text.append(page.get_text() or "")
-                return "\n".join(text)
+                    return [(page.get_text() or "") for page in doc]
             except Exception as e:
                 raise RuntimeError(
                     "PDF extraction requires 'pypdf' or 'pymupdf' to be installed."
@@ -34,12 +35,16 @@ def extract_text(path: str) -> str:
         try:
             import docx  # python-docx  # pip install python-docx
             d = docx.Document(str(p))
-            return "\n".join(para.text for para in d.paragraphs)
+            return ["\n".join(para.text for para in d.paragraphs)]
         except Exception as e:
             raise RuntimeError("DOCX extraction requires 'python-docx' to be installed.") from e
 
     raise RuntimeError(f"Unsupported file type for extraction: {ext}")
 
+def extract_text(path: str, ext: Optional[str] = None) -> str:
+    """Extract plain text from .txt/.md/.pdf/.docx (pages joined by newlines)."""
+    return "\n".join(extract_pages(path, ext))
+
 def chunk_text(text: str, chunk_size: int = 1200, overlap: int = 200) -> List[str]:
     """
     Naive character-based chunking (works fine for most RAG pipelines).